@@ -0,0 +1,124 @@
+import threading
+import time
+
+import pandas as pd
+
+# Séries da página de análise de um ano, calculadas a partir dos totais por dia e categoria.
+# O tamanho é limitado pelo ano (no máximo 366 dias x categorias), e não pela quantidade de despesas.
+# Os totais são centavos em int64: as somas por mês e categoria são exatas.
+class YearAnalytics:
+    def __init__(self, daily, monthly=None, categories=None):
+        self.daily = daily
+        self.monthly = daily.sum(axis=1).groupby(daily.index.month).sum() if monthly is None else monthly
+        self.categories = daily.sum().sort_values(ascending=False) if categories is None else categories
+
+    @classmethod
+    def from_rollups(cls, rollups):
+        df = pd.DataFrame(rollups, columns=["day", "category", "total_cents"]).astype({"total_cents": "int64"})
+        daily = df.pivot_table(index="day", columns="category", values="total_cents", aggfunc="sum", fill_value=0)
+        daily.index = pd.DatetimeIndex(daily.index)
+        return cls(daily.sort_index())
+
+    # Variação do total de cada mês em relação ao anterior, em % e em valor
+    @property
+    def monthly_pct_change(self):
+        return self.monthly.pct_change().fillna(0) * 100
+
+    @property
+    def monthly_change(self):
+        return self.monthly.diff().fillna(0)
+
+    # Totais por dia sem uma categoria (ex.: aluguel), apenas nos dias com outras despesas
+    def daily_without(self, category):
+        daily = self.daily.drop(columns=[category], errors="ignore")
+        return daily[(daily != 0).any(axis=1)]
+
+    def is_empty(self):
+        return self.daily.empty
+
+    # Função para gerar uma nova versão com algumas células (dia, categoria) substituídas pelo total atual.
+    # Só os meses e categorias dessas células são recalculados; o objeto atual não é alterado,
+    # então uma página que ainda o esteja exibindo não vê um estado intermediário.
+    def with_cells(self, cells):
+        daily = self.daily.copy()
+        monthly = self.monthly.copy()
+        categories = self.categories.copy()
+
+        for (day, category), total in cells.items():
+            day = pd.Timestamp(day)
+            if category not in daily.columns:
+                if not total:
+                    continue
+                daily[category] = 0
+            if day not in daily.index:
+                if not total:
+                    continue
+                daily.loc[day] = 0
+            daily.at[day, category] = total
+
+            # O dia ou a categoria que ficaram sem despesas deixam de aparecer, como em um cálculo do zero
+            if not daily.loc[day].any():
+                daily = daily.drop(index=day)
+            if daily[category].any():
+                categories[category] = daily[category].sum()
+            else:
+                daily = daily.drop(columns=category)
+                categories = categories.drop(category, errors="ignore")
+
+            month_rows = daily.index.month == day.month
+            if month_rows.any():
+                monthly[day.month] = daily.values[month_rows].sum()
+            else:
+                monthly = monthly.drop(day.month, errors="ignore")
+
+        return YearAnalytics(daily.sort_index(), monthly.sort_index(), categories.sort_values(ascending=False))
+
+# Memória das análises por ano, válida para uma versão dos dados. Após uma escrita, a próxima leitura
+# busca apenas as células (dia, categoria) alteradas; sem essa informação, ou após o TTL, recalcula o ano.
+class AnalyticsStore:
+    def __init__(self, ttl_seconds):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._pending = {}
+
+    # Registra as células alteradas por uma escrita (deve ser chamada antes de incrementar a versão)
+    def mark_changed(self, keys):
+        with self._lock:
+            for day, category in keys:
+                self._pending.setdefault(day.year, set()).add((day, category))
+
+    # Descarta os anos informados: a próxima leitura recalcula tudo
+    def discard(self, years):
+        with self._lock:
+            for year in years:
+                self._entries.pop(year, None)
+                self._pending.pop(year, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._pending.clear()
+
+    # Devolve a análise do ano na versão atual. As leituras do banco acontecem com o lock,
+    # para que duas sessões nunca apliquem células de momentos diferentes fora de ordem.
+    def get(self, year, get_version, load_year, load_cells):
+        with self._lock:
+            version = get_version()
+            entry = self._entries.get(year)
+            if entry is not None and time.monotonic() - entry[1] > self.ttl_seconds:
+                entry = None
+
+            if entry is None:
+                self._pending.pop(year, None)
+                entry = (version, time.monotonic(), YearAnalytics.from_rollups(load_year(year)))
+            elif entry[0] != version:
+                # Células buscadas de novo (valor absoluto): reaplicar uma célula nunca duplica valores
+                pending = self._pending.pop(year, set())
+                analytics = entry[2].with_cells(load_cells(pending)) if pending else entry[2]
+                entry = (version, entry[1], analytics)
+            else:
+                return entry[2]
+
+            self._entries[year] = entry
+            return entry[2]
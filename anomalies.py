@@ -0,0 +1,135 @@
+import argparse
+from urllib.parse import urlencode
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from categories import RENT_CATEGORY, category_label
+from local_store import DEFAULT_LOCAL_STORE_PATH, LocalStore
+from money import format_brl
+
+# Cada dia é comparado com os últimos ANOMALY_WINDOW dias em que houve gasto na mesma categoria
+# (ou no total do dia), e só é avaliado com pelo menos MIN_HISTORY dias anteriores
+ANOMALY_WINDOW = 30
+MIN_HISTORY = 8
+DEFAULT_METHOD = "mad"
+
+# Limites do escore acima dos quais o gasto é considerado fora do padrão: para a mediana/MAD, o
+# escore z robusto (3,5 é o corte usual); para a média/desvio padrão, o escore z comum
+METHODS = {"mad": 3.5, "zscore": 3.0}
+
+# Dispersão mínima, para que categorias de valor fixo (aluguel, internet) não acusem qualquer centavo:
+# pelo menos 10% do valor esperado e R$ 1,00 (os totais estão em centavos)
+MIN_SCALE_RATIO = 0.1
+MIN_SCALE = 100
+
+# Limite de células (dia, categoria) cujas despesas são buscadas para a tabela, das mais recentes,
+# e de dias com total fora do padrão exibidos na página
+MAX_ANOMALY_CELLS = 200
+MAX_ANOMALY_DAYS = 20
+ANOMALY_FIELDS = ("name", "amount_cents", "date", "category")
+EDIT_PAGE = "Editar Despesas"
+
+# Função para calcular, para cada posição de uma série, o valor esperado e o escore em relação
+# às `window` posições anteriores. As janelas são vistas (sem cópia) da própria série.
+def rolling_scores(values, method=DEFAULT_METHOD, window=ANOMALY_WINDOW, min_history=MIN_HISTORY):
+    values = np.asarray(values, dtype=float)
+    expected = np.full(len(values), np.nan)
+    scores = np.full(len(values), np.nan)
+    if len(values) <= min_history:
+        return expected, scores
+
+    # A janela da posição i são os valores [i - window, i); o início é completado com NaN
+    windows = sliding_window_view(np.concatenate([np.full(window, np.nan), values[:-1]]), window)[min_history:]
+    complete = max(window - min_history, 0)
+    if method == "mad":
+        center = np.concatenate([np.nanmedian(windows[:complete], axis=1), np.median(windows[complete:], axis=1)])
+        deviation = np.abs(windows - center[:, None])
+        scale = 1.4826 * np.concatenate([np.nanmedian(deviation[:complete], axis=1), np.median(deviation[complete:], axis=1)])
+    elif method == "zscore":
+        center = np.nanmean(windows, axis=1)
+        scale = np.nanstd(windows, axis=1)
+    else:
+        raise ValueError(f"Método de detecção inválido: {method}")
+
+    scale = np.maximum(scale, np.maximum(MIN_SCALE_RATIO * np.abs(center), MIN_SCALE))
+    expected[min_history:] = center
+    scores[min_history:] = (values[min_history:] - center) / scale
+    return expected, scores
+
+# Função para detectar os picos de gasto em todo o histórico, a partir dos totais por dia e categoria (day, category, total_cents).
+# Devolve dois DataFrames ordenados do mais recente para o mais antigo, com valores em centavos:
+# - cells: dias em que uma categoria ficou acima do padrão dela (day, category, total_cents, expected_cents, score)
+# - days: dias em que o total gasto ficou acima do padrão (day, total_cents, expected_cents, score). O total do dia
+#   não inclui uma categoria (por padrão o aluguel), que de outro modo tornaria todo dia de pagamento um pico.
+def detect_anomalies(totals, method=DEFAULT_METHOD, window=ANOMALY_WINDOW, threshold=None, exclude=RENT_CATEGORY):
+    threshold = METHODS[method] if threshold is None else threshold
+    df = pd.DataFrame(totals, columns=["day", "category", "total_cents"]).astype({"total_cents": "int64"})
+    df = df[df["total_cents"] > 0].sort_values(["category", "day"], kind="stable").reset_index(drop=True)
+
+    # Com as linhas agrupadas por categoria, cada categoria é uma fatia contínua dos arrays
+    totals = df["total_cents"].to_numpy(dtype=float)
+    expected = np.full(len(df), np.nan)
+    scores = np.full(len(df), np.nan)
+    codes = df["category"].astype(str).to_numpy()
+    bounds = np.flatnonzero(codes[1:] != codes[:-1]) + 1
+    for start, end in zip(np.r_[0, bounds], np.r_[bounds, len(df)]):
+        expected[start:end], scores[start:end] = rolling_scores(totals[start:end], method, window)
+    df["expected_cents"] = expected
+    df["score"] = scores
+    cells = df[df["score"] > threshold]
+
+    days = df[df["category"] != exclude].groupby("day", sort=True)["total_cents"].sum().reset_index()
+    days["expected_cents"], days["score"] = rolling_scores(days["total_cents"].to_numpy(), method, window)
+    days = days[days["score"] > threshold]
+
+    return (
+        cells.sort_values("day", ascending=False).reset_index(drop=True),
+        days.sort_values("day", ascending=False).reset_index(drop=True)
+    )
+
+# Função para listar as células (dia, categoria) cujas despesas aparecem na tabela, das mais recentes
+def get_anomaly_cells(cells):
+    cells = cells.head(MAX_ANOMALY_CELLS)
+    return list(zip([day.to_pydatetime() for day in cells["day"]], cells["category"]))
+
+# Função para montar o link que abre uma despesa na página de edição
+def edit_link(expense_id):
+    return "?" + urlencode({"pagina": EDIT_PAGE, "despesa": str(expense_id)})
+
+# Função para montar a tabela de despesas fora do padrão: cada despesa com o total do dia na categoria,
+# o valor esperado e o escore, das mais recentes para as mais antigas
+def build_anomaly_table(cells, expenses):
+    columns = ["_id", "date", "name", "category", "amount_cents", "total_cents", "expected_cents", "score", "link"]
+    if cells.empty or not expenses:
+        # Tabela vazia com a coluna de data já em datetime, para que a página possa filtrar por ano
+        return pd.DataFrame(columns=columns).astype({"date": "datetime64[ns]"})
+    df = pd.DataFrame(expenses)
+    df["day"] = df["date"].dt.normalize()
+    df = df.merge(cells, on=["day", "category"], how="inner")
+    df["link"] = [edit_link(expense_id) for expense_id in df["_id"]]
+    return df.sort_values(["date", "amount_cents"], ascending=[False, False])[columns].reset_index(drop=True)
+
+# Uso: python anomalies.py [--method mad|zscore] [--threshold 3.5] [--window 30] [--store .cache/expenses.sqlite3]
+def main():
+    parser = argparse.ArgumentParser(description="Lista os dias com gastos fora do padrão de cada categoria")
+    parser.add_argument("--method", choices=list(METHODS), default=DEFAULT_METHOD)
+    parser.add_argument("--threshold", type=float, help="Escore mínimo (padrão: 3,5 para mad e 3 para zscore)")
+    parser.add_argument("--window", type=int, default=ANOMALY_WINDOW, help="Dias anteriores comparados")
+    parser.add_argument("--store", default=DEFAULT_LOCAL_STORE_PATH, help="Cópia local (python local_store.py sync)")
+    args = parser.parse_args()
+
+    totals = LocalStore(args.store).totals_by_day_and_category()
+    cells, days = detect_anomalies(totals, args.method, args.window, args.threshold)
+    for cell in cells.itertuples():
+        print(f"{cell.day:%d/%m/%Y}  {category_label(cell.category):<15} {format_brl(cell.total_cents):>14}  "
+              f"(esperado {format_brl(round(cell.expected_cents))}, escore {cell.score:.1f})")
+    for day in days.itertuples():
+        print(f"{day.day:%d/%m/%Y}  {'Total do dia':<15} {format_brl(day.total_cents):>14}  "
+              f"(esperado {format_brl(round(day.expected_cents))}, escore {day.score:.1f})")
+    print(f"{len(cells)} picos por categoria e {len(days)} dias com total fora do padrão.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,96 +1,79 @@
+import io
 import streamlit as st
-from pymongo import MongoClient
+from bson import ObjectId
 from datetime import datetime, date
 import pandas as pd
 import plotly.express as px
-import certifi
-import base64
 import numpy as np
-
-MONGODB_URI = st.secrets["MONGODB_URI"]
-
-# Usando certifi para garantir o CA SSL correto e adicionando parâmetros para TLS
-client = MongoClient(
-    MONGODB_URI, 
-    tls=True, 
-    tlsCAFile=certifi.where(), 
-    tlsAllowInvalidCertificates=False,
-    serverSelectionTimeoutMS=30000  # Timeout de 30 segundos
+from pymongo import DeleteOne
+from pymongo.errors import ConfigurationError, PyMongoError
+
+from anomalies import MAX_ANOMALY_DAYS, edit_link
+from attachments import save_attachment, load_attachment, delete_attachments
+from budgets import OVER_BUDGET, PROJECTED_OVER, WARNING
+from categories import (
+    CATEGORY_KEYS,
+    RENT_CATEGORY,
+    category_label,
+    category_option,
+    normalize_category,
 )
-
-# Verificar conexão com MongoDB
-try:
-    client.admin.command('ping')  # Verificar se a conexão é bem-sucedida
-    db = client['PersonalFinances']
-    expenses_collection = db['expenses']
-    print("Conexão com o MongoDB estabelecida com sucesso!!")
-except Exception as e:
-    print(f"Erro de conexão com o MongoDB: {e}")
-    
-
-# Função para agrupar despesas por mês
-def group_expenses_by_month():
-    pipeline = [
-        {
-            "$group": {
-                "_id": {
-                    "month": {"$month": "$date"},
-                    "year": {"$year": "$date"},
-                },
-                "totalAmount": {"$sum": "$amount"},
-            }
-        },
-        {"$sort": {"_id.year": 1, "_id.month": 1}},
-    ]
-    result = expenses_collection.aggregate(pipeline)
-    return {f'{item["_id"]["month"]}/{item["_id"]["year"]}': item["totalAmount"] for item in result}
-
-# Função para obter despesas por categoria
-def group_expenses_by_category(month, year):
-    pipeline = [
-        {
-            "$match": {
-                "$expr": {
-                    "$and": [
-                        {"$eq": [{"$month": "$date"}, month]},
-                        {"$eq": [{"$year": "$date"}, year]}
-                    ]
-                }
-            }
-        },
-        {
-            "$group": {
-                "_id": "$category",
-                "totalAmount": {"$sum": "$amount"}
-            }
-        }
-    ]
-    result = expenses_collection.aggregate(pipeline)
-    return {item["_id"]: item["totalAmount"] for item in result}
-
-# Função para obter despesas diárias
-def group_expenses_by_day(month, year):
-    pipeline = [
-        {
-            "$match": {
-                "$expr": {
-                    "$and": [
-                        {"$eq": [{"$month": "$date"}, month]},
-                        {"$eq": [{"$year": "$date"}, year]}
-                    ]
-                }
-            }
-        },
-        {
-            "$group": {
-                "_id": {"$dayOfMonth": "$date"},
-                "totalAmount": {"$sum": "$amount"}
-            }
-        },
-        {"$sort": {"_id": 1}}
-    ]
-    result = expenses_collection.aggregate(pipeline)
-    return {item["_id"]: item["totalAmount"] for item in result}
+from data_access import (
+    ensure_recurring_expenses,
+    get_anomalies,
+    get_budget_status,
+    get_expense,
+    get_expense_sync,
+    get_expenses,
+    get_expenses_page,
+    get_expenses_total,
+    group_expenses_by_category,
+    group_expenses_by_day,
+    group_expenses_by_month,
+    get_forecast,
+    get_multi_year_report,
+    get_year_analytics,
+    invalidate_months,
+    record_expense_changes,
+    record_expense_conflicts,
+    run_queries,
+    save_budget,
+    search_expenses,
+)
+from database import get_database, get_expenses_collection, get_setting, get_write_time
+from forecasting import BACKTEST_MONTHS, MODELS
+from frames import (
+    DATE_FORMAT,
+    DELETE_COLUMNS,
+    DELETE_FIELDS,
+    DISPLAY_COLUMN_CONFIG,
+    DISPLAY_COLUMNS,
+    EDIT_FIELDS,
+    EDITOR_COLUMNS,
+    PAGE_SIZE_OPTIONS,
+    PAID_FILTER_OPTIONS,
+    SUMMARY_FIELDS,
+    SUMMARY_SORT_OPTIONS,
+    VIEW_FILES_FIELDS,
+    prepare_expenses_frame,
+    to_display_frame,
+    to_editor_frame,
+)
+from export import EXPORT_FORMATS, export_expenses
+from importer import ImportFormatError, import_expenses, read_expenses_file
+from instrumentation import LARGE_REPLY_BYTES, finish_recording, start_recording, timed_section
+from money import cents_to_reais, format_brl, to_cents
+from search import SEARCH_FIELDS, SEARCH_PAGE_SIZE
+from previews import PreviewCache, can_preview, generate_preview
+from writes import update_expenses, version_filter
+
+# Meses previstos na página de análise (o mês atual e o próximo)
+FORECAST_MONTHS = 2
+
+# Cache de miniaturas dos anexos, compartilhado por todas as sessões do processo
+@st.cache_resource
+def get_preview_cache():
+    return PreviewCache()
 
 # Função para converter datetime.date para datetime.datetime
 def convert_to_datetime(d):
@@ -101,42 +84,67 @@ def convert_to_datetime(d):
 # Função para adicionar uma nova despesa com o campo Observações e anexos
 def add_expense(name, amount, date, category, notes, attachment=None):
     try:
-        # Tratamento direto para remover emojis e caracteres especiais do campo categoria
-        category = category.replace('💧 ', '').replace('⚡ ', '').replace('🏠 ', '').replace('🌐 ', '') \
-                           .replace('🍔 ', '').replace('🚌 ', '').replace('🏥 ', '').replace('📚 ', '') \
-                           .replace('🎉 ', '').replace('👗 ', '').replace('💼 ', '').replace('🏖️ ', '')
+        db = get_database()
+        # Remove o emoji exibido no formulário antes de gravar a categoria
+        category = normalize_category(category)
 
         new_expense = {
+            "_id": ObjectId(),
             "name": name,
-            "amount": amount,
+            "amount_cents": to_cents(amount),  # Valor do formulário (reais) gravado em centavos inteiros
             "date": convert_to_datetime(date),
             "category": category,  # Categoria sem emojis
             "notes": notes,  # Observações podem conter emojis
             "is_paid": False,
-            "payment_date": None
+            "payment_date": None,
+            "updated_at": get_write_time()
         }
 
-        # Processar o arquivo de anexo
+        # Processar o arquivo de anexo: o binário vai para o GridFS e a despesa guarda só a referência
         if attachment is not None:
-            new_expense["attachment_name"] = attachment.name
-            new_expense["attachment_type"] = attachment.type
-            new_expense["attachment_data"] = attachment.getvalue()  # Armazena o arquivo como binário
+            attachment_data = attachment.getvalue()
+            new_expense.update(save_attachment(db, new_expense["_id"], attachment.name, attachment.type, attachment_data))
+            # A miniatura é gerada uma única vez, no momento do upload
+            get_preview_cache().put(str(new_expense["attachment_id"]), generate_preview(attachment_data, attachment.type))
 
-        expenses_collection.insert_one(new_expense)
+        db['expenses'].insert_one(new_expense)
+        record_expense_changes(new_expenses=[new_expense])
         return True
     except Exception as e:
         st.error(f"Erro ao adicionar despesa: {e}")
         return False
 
+# Função para converter um valor do st.data_editor (Timestamp, NaT, tipos do NumPy) no tipo gravado no MongoDB
+def to_document_value(value):
+    if pd.isna(value):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+# Função para gravar várias edições em um único bulk_write (writes.update_expenses); despesas alteradas
+# por outra sessão desde a leitura não são gravadas
+def bulk_update_expenses(updates):
+    try:
+        applied, stale = update_expenses(get_database()['expenses'], updates)
+        record_expense_changes([expense for expense, _ in applied], [{**expense, **changes} for expense, changes in applied])
+        record_expense_conflicts(stale)
+        return len(applied), len(stale)
+    except Exception as e:
+        st.error(f"Erro ao editar as despesas: {e}")
+        return 0, 0
+
 # Função para editar uma despesa existente, incluindo o campo Observações e anexos
-def edit_expense(expense_id, name, amount, date, category, is_paid, payment_date, notes, attachment=None):
+def edit_expense(expense_id, name, amount, date, category, is_paid, payment_date, notes, attachment=None, expected_version=0):
     try:
-        # Tratamento direto para remover emojis e caracteres especiais do campo categoria
-        category = category.replace('💧 ', '').replace('⚡ ', '').replace('🏠 ', '').replace('🌐 ', '')
+        # Remove o emoji exibido no formulário antes de gravar a categoria
+        category = normalize_category(category)
 
         update_fields = {
             "name": name,
-            "amount": amount,
+            "amount_cents": to_cents(amount),
             "date": convert_to_datetime(date),
             "category": category,  # Categoria sem emojis
             "is_paid": is_paid,
@@ -148,53 +156,76 @@ def edit_expense(expense_id, name, amount, date, category, is_paid, payment_date
         else:
             update_fields["payment_date"] = None
 
-        # Processar o arquivo de anexo
-        if attachment is not None:
-            update_fields["attachment_name"] = attachment.name
-            update_fields["attachment_type"] = attachment.type
-            update_fields["attachment_data"] = attachment.getvalue()  # Armazena o arquivo como binário
+        # A despesa anterior indica o valor que sai dos totais e o anexo a substituir
+        db = get_database()
+        previous = db['expenses'].find_one({"_id": expense_id}, {"date": 1, "amount_cents": 1, "category": 1, "attachment_id": 1}) or {}
 
-        expenses_collection.update_one({"_id": expense_id}, {"$set": update_fields})
+        # Processar o arquivo de anexo: o binário vai para o GridFS e a despesa guarda só a referência
+        update = {"$set": update_fields}
+        old_attachment_id = None
+        if attachment is not None:
+            old_attachment_id = previous.get("attachment_id")
+            attachment_data = attachment.getvalue()
+            update_fields.update(save_attachment(db, expense_id, attachment.name, attachment.type, attachment_data))
+            update["$unset"] = {"attachment_data": ""}  # Remove o binário antigo gravado na despesa, se houver
+            # A miniatura é gerada uma única vez, no momento do upload
+            get_preview_cache().put(str(update_fields["attachment_id"]), generate_preview(attachment_data, attachment.type))
+
+        # A gravação só acontece se ninguém alterou a despesa desde que o formulário foi aberto
+        update["$inc"] = {"version": 1}
+        update["$currentDate"] = {"updated_at": True}
+        result = db['expenses'].update_one({"_id": expense_id, **version_filter(expected_version)}, update)
+        if result.matched_count == 0:
+            if attachment is not None:
+                delete_attachments(db, [update_fields["attachment_id"]])
+            record_expense_conflicts([{"_id": expense_id, **previous}])
+            st.error("A despesa foi alterada em outra sessão. Recarregue a página e tente novamente.")
+            return False
+        record_expense_changes([previous], [update_fields])
+        if attachment is not None:
+            get_preview_cache().discard(str(old_attachment_id or expense_id))
+        if old_attachment_id is not None:
+            delete_attachments(db, [old_attachment_id])
         return True
     except Exception as e:
         st.error(f"Erro ao editar a despesa: {e}")
         return False
 
 
-
-# Função para listar todas as despesas
-def get_all_expenses():
-    return list(expenses_collection.find().sort("date", -1))
-
 # Página principal - Despesas por Mês com Formulário de Adição
 def show_home_page():
     st.title("Despesas por Ano e Mês")
 
     # Gráfico de despesas mensais
     st.header("Gráfico de Despesas por Mês")
-    monthly_expenses = group_expenses_by_month()
+    with timed_section("group_expenses_by_month", "consulta"):
+        monthly_expenses = group_expenses_by_month()
 
     if monthly_expenses:
-        months = list(monthly_expenses.keys())
-        amounts = list(monthly_expenses.values())
-
-        # Definindo cores para o gráfico
-        colors = px.colors.qualitative.Plotly  # Usando uma paleta de cores variada
-
-        # Criando o gráfico de barras com diferentes cores
-        fig = px.bar(
-            x=months, 
-            y=amounts, 
-            labels={'x': 'Mês', 'y': 'Total (R$)'}, 
-            title="Despesas por Mês", 
-            color=months, 
-            color_discrete_sequence=colors
-        )
+        with timed_section("Gráfico de despesas por mês", "plotly"):
+            months = list(monthly_expenses.keys())
+            amounts = cents_to_reais(np.array(list(monthly_expenses.values())))
+
+            # Definindo cores para o gráfico
+            colors = px.colors.qualitative.Plotly  # Usando uma paleta de cores variada
+
+            # Criando o gráfico de barras com diferentes cores
+            fig = px.bar(
+                x=months, 
+                y=amounts, 
+                labels={'x': 'Mês', 'y': 'Total (R$)'}, 
+                title="Despesas por Mês", 
+                color=months, 
+                color_discrete_sequence=colors
+            )
 
-        st.plotly_chart(fig)
+            st.plotly_chart(fig)
     else:
         st.write("Nenhuma despesa registrada ainda.")
 
+    # O orçamento é preenchido no fim da página, depois dos formulários, para já incluir a despesa recém-adicionada
+    budget_section = st.container()
+
     # Formulário para adicionar nova despesa
     st.header("Adicionar Nova Despesa")
     with st.form(key="add_expense_form"):
@@ -203,12 +234,7 @@ def show_home_page():
         date_input = st.date_input("Data", value=datetime.today().date())  # Renomeado para evitar conflito com o módulo datetime
         
         # Adicionando novas opções de categorias com emojis
-        category = st.selectbox(
-            "Categoria", 
-            ["💧 Água", "⚡ Energia", "🏠 Aluguel", "🌐 Internet", "🍔 Alimentação", "🚌 Transporte", 
-             "🏥 Saúde", "📚 Educação", "🎉 Lazer", "👗 Roupas", "💼 Trabalho", "🏖️ Viagem", "Outros"], 
-            key='category_display'
-        )
+        category = st.selectbox("Categoria", CATEGORY_KEYS, format_func=category_option, key='category_display')
         notes = st.text_area("Observações", key='notes')  # Campo de texto para observações
 
         # Campo para anexar arquivos (imagem ou PDF)
@@ -225,10 +251,81 @@ def show_home_page():
             else:
                 # Chamada da função add_expense para salvar no MongoDB
                 if add_expense(name, amount, date_input, category, notes, attachment):
-                    st.success(f"Despesa adicionada com sucesso: {name} - R$ {amount}")
+                    st.success(f"Despesa adicionada com sucesso: {name} - {format_brl(to_cents(amount))}")
                 else:
                     st.error("Erro ao adicionar a despesa.")
-                    
+
+    # Importação de extratos bancários em lote
+    st.header("Importar Extrato Bancário")
+    with st.form(key="import_form"):
+        statement = st.file_uploader("Arquivo CSV ou OFX", type=["csv", "ofx"])
+        encoding = st.selectbox("Codificação", ["utf-8-sig", "latin-1"])
+        # Sem marcar, o CSV é tratado como extrato: só os débitos (valores negativos) viram despesas
+        expense_list = st.checkbox("CSV com as despesas em valores positivos (ex.: exportado pelo app)")
+        import_button = st.form_submit_button("Importar")
+
+        if import_button and statement is not None:
+            import_statement(statement, encoding, expense_list)
+
+    show_budget_section(budget_section)
+
+# Função para exibir o orçamento do mês atual: quanto cada categoria já usou do limite, o ritmo de gasto
+# e a projeção até o fim do mês. Os totais do mês vêm prontos da cópia local (budgets.py, local_store.py).
+def show_budget_section(container):
+    today = datetime.today()
+    with container:
+        st.header(f"Orçamento de {today.month:02d}/{today.year}")
+        with timed_section("get_budget_status", "consulta"):
+            statuses = get_budget_status(today.year, today.month)
+        if not statuses:
+            st.write("Nenhum limite definido. Defina o limite mensal de uma categoria abaixo.")
+
+        for item in statuses:
+            label = category_option(item["category"])
+            st.progress(min(item["used"], 1.0), text=f"{label}: {format_brl(item['spent_cents'])} de "
+                                                    f"{format_brl(item['limit_cents'])} ({item['used']:.0%})")
+            if item["status"] == OVER_BUDGET:
+                st.error(f"{label}: limite ultrapassado em {format_brl(item['spent_cents'] - item['limit_cents'])}.")
+            elif item["status"] == PROJECTED_OVER:
+                st.warning(f"{label}: no ritmo atual ({format_brl(item['daily_rate_cents'])} por dia), o mês deve fechar em "
+                           f"{format_brl(item['projected_cents'])}. Para ficar no limite, gaste até "
+                           f"{format_brl(item['daily_allowance_cents'])} por dia.")
+            elif item["status"] == WARNING:
+                st.caption(f"{label}: restam {format_brl(item['limit_cents'] - item['spent_cents'])} "
+                           f"({format_brl(item['daily_allowance_cents'])} por dia até o fim do mês).")
+
+        with st.expander("Definir limites"):
+            with st.form(key="budget_form"):
+                category = st.selectbox("Categoria", CATEGORY_KEYS, format_func=category_option, key="budget_category")
+                amount = st.number_input("Limite mensal (R$)", min_value=0.0, step=50.0, key="budget_amount",
+                                         help="Use zero para remover o limite da categoria")
+                if st.form_submit_button("Salvar limite"):
+                    save_budget(category, amount)
+                    st.rerun()
+
+# Função para importar um extrato enviado pela página, mostrando o progresso a cada lote
+def import_statement(statement, encoding, expense_list):
+    progress_bar = st.progress(0.0, text="Importando...")
+
+    def report(result):
+        fraction = min(statement.tell() / max(statement.size, 1), 1.0)
+        progress_bar.progress(fraction, text=f"{result['inserted']} despesas importadas, {result['duplicates']} já existentes...")
+
+    try:
+        stream = io.TextIOWrapper(statement, encoding=encoding, newline="")
+        result = import_expenses(get_database(), read_expenses_file(stream, statement.name, expense_list), progress=report)
+    except (ImportFormatError, UnicodeDecodeError) as e:
+        st.error(f"Erro ao importar o extrato: {e}")
+        return
+    finally:
+        progress_bar.empty()
+
+    # A cópia local busca as despesas importadas (updated_at recente) e o cache dos meses importados é invalidado
+    invalidate_months(result["months"])
+    st.success(f"{result['inserted']} despesas importadas, {result['duplicates']} já existentes ignoradas.")
+    if result["errors"]:
+        st.warning(f"{len(result['errors'])} linhas ignoradas: " + "; ".join(result["errors"][:5]))
+
 # Página de resumo de despesas
 def show_summary_page():
     st.title("Resumo de Despesas do Período")
@@ -238,129 +335,185 @@ def show_summary_page():
     month = st.selectbox("Mês", list(range(1, 13)), index=datetime.today().month - 1)
     year = st.number_input("Ano", min_value=2000, max_value=2100, value=datetime.today().year)
 
-    # Exibir todas as despesas em uma tabela
+    # Exibir as despesas do período em uma tabela paginada: filtros, ordenação e total calculados na cópia local (SQLite)
     st.header("Todas as Despesas")
-    expenses = get_all_expenses()
+    # Totais por categoria e por dia não dependem dos filtros: são buscados juntos, em paralelo
+    period_totals = run_queries({
+        "group_expenses_by_category": lambda: group_expenses_by_category(month, year),
+        "group_expenses_by_day": lambda: group_expenses_by_day(month, year)
+    })
+    category_expenses = period_totals["group_expenses_by_category"]
+
+    with st.expander("Filtros e Ordenação"):
+        selected_categories = st.multiselect("Categorias", sorted(category_expenses.keys(), key=str.lower), format_func=category_label)
+        paid_filter = st.selectbox("Situação", list(PAID_FILTER_OPTIONS.keys()))
+        name_contains = st.text_input("Descrição contém").strip()
+        sort_label = st.selectbox("Ordenar por", list(SUMMARY_SORT_OPTIONS.keys()))
+        descending = st.radio("Ordem", ["Decrescente", "Crescente"], horizontal=True) == "Decrescente"
+        page_size = st.selectbox("Linhas por página", PAGE_SIZE_OPTIONS, index=1)
+
+    filters = (tuple(selected_categories), PAID_FILTER_OPTIONS[paid_filter], name_contains)
+    sort_field = SUMMARY_SORT_OPTIONS[sort_label]
+
+    # Pilha com o cursor de início de cada página visitada; volta para a primeira página quando os filtros mudam
+    signature = (int(year), int(month), filters, sort_field, descending, page_size)
+    if st.session_state.get('summary_signature') != signature:
+        st.session_state['summary_signature'] = signature
+        st.session_state['summary_cursors'] = [None]
+    cursors = st.session_state['summary_cursors']
+
+    # Total filtrado e página da tabela, também em paralelo
+    page_results = run_queries({
+        "get_expenses_total": lambda: get_expenses_total(year, month, filters),
+        "get_expenses_page": lambda: get_expenses_page(
+            year, month, SUMMARY_FIELDS, filters, sort_field, descending, cursors[-1], page_size
+        )
+    })
+    total_expenses, expense_count = page_results["get_expenses_total"]
 
-    if expenses:
-        df = pd.DataFrame(expenses)
-        df['date'] = pd.to_datetime(df['date']).dt.strftime('%d/%m/%Y')  # Formato brasileiro DD/MM/AAAA
-        df['payment_date'] = pd.to_datetime(df['payment_date'], errors='coerce')  # Corrigir valores nulos
-        df['payment_date'] = df['payment_date'].dt.strftime('%d/%m/%Y')  # Formato DD/MM/AAAA
-
-        # Adicionando a coluna 'Observações' com valor padrão caso não exista
-        if 'notes' not in df.columns:
-            df['notes'] = ""  # Se a coluna 'notes' não existir, adicionar com valores vazios
-
-        df.rename(columns={
-            "name": "Descrição", 
-            "amount": "Valor (R$)", 
-            "category": "Categoria", 
-            "date": "Data", 
-            "is_paid": "Paga", 
-            "payment_date": "Data de Pagamento",
-            "notes": "Observações"  # Incluindo Observações na tabela
-        }, inplace=True)
-
-        # Filtrando as despesas com base no mês e ano selecionados
-        df['Mês'] = pd.to_datetime(df['Data'], format='%d/%m/%Y').dt.month
-        df['Ano'] = pd.to_datetime(df['Data'], format='%d/%m/%Y').dt.year
-        filtered_df = df[(df['Mês'] == month) & (df['Ano'] == year)]
-        filtered_df['Valor (R$)'] = filtered_df['Valor (R$)'].apply(lambda x: float(str(x).replace(',', '.')))
-        total_expenses = filtered_df['Valor (R$)'].sum()
-
-        # Exibindo todas as colunas, incluindo o novo campo 'Observações'
-        st.dataframe(filtered_df[['Descrição', 'Valor (R$)', 'Categoria', 'Data', 'Paga', 'Data de Pagamento', 'Observações']])
-        st.write(f"**Total de Despesas: R$ {total_expenses:,.2f}".replace('.', ',').replace(',', '.', 1))
+    if expense_count:
+        expenses, next_cursor = page_results["get_expenses_page"]
+        with timed_section("Tabela de despesas", "pandas"):
+            filtered_df = prepare_expenses_frame(expenses, SUMMARY_FIELDS)
+
+            # Exibindo todas as colunas, incluindo o campo 'Observações'
+            st.dataframe(to_display_frame(filtered_df, SUMMARY_FIELDS), column_config=DISPLAY_COLUMN_CONFIG)
+
+        previous_col, page_col, next_col = st.columns([1, 2, 1])
+        if previous_col.button("Anterior", disabled=len(cursors) == 1):
+            cursors.pop()
+            st.rerun()
+        page_col.write(f"Página {len(cursors)} de {max(1, -(-expense_count // page_size))} ({expense_count} despesas)")
+        if next_col.button("Próxima", disabled=next_cursor is None):
+            cursors.append(next_cursor)
+            st.rerun()
+
+        st.write(f"**Total de Despesas: {format_brl(total_expenses)}**")
+
+        show_export_section(year, month, filters)
 
         # Gráfico de despesas por categoria - Aplicar o filtro corretamente
         st.subheader("Gráfico de Despesas por Categoria")
-        category_expenses = group_expenses_by_category(month, year)  # Passar o filtro corretamente
         if category_expenses:
-            categories = list(category_expenses.keys())
-            totals = list(category_expenses.values())
-            category_fig = px.pie(
-                values=totals, 
-                names=categories, 
-                title="Despesas por Categoria"
-            )
-            st.plotly_chart(category_fig)
+            with timed_section("Gráfico por categoria", "plotly"):
+                categories = [category_label(category) for category in category_expenses.keys()]
+                totals = cents_to_reais(np.array(list(category_expenses.values())))
+                category_fig = px.pie(
+                    values=totals, 
+                    names=categories, 
+                    title="Despesas por Categoria"
+                )
+                st.plotly_chart(category_fig)
 
         # Gráfico de despesas diárias
         st.subheader("Total de Despesas por Dia")
-        daily_expenses = group_expenses_by_day(month, year)
+        daily_expenses = period_totals["group_expenses_by_day"]
         if daily_expenses:
-            days = list(daily_expenses.keys())
-            amounts = list(daily_expenses.values())
-            daily_fig = px.line(
-                x=days, 
-                y=amounts, 
-                labels={'x': 'Dia', 'y': 'Total (R$)'}, 
-                title="Total de Despesas Diárias"
-            )
-            st.plotly_chart(daily_fig)
+            with timed_section("Gráfico por dia", "plotly"):
+                days = list(daily_expenses.keys())
+                amounts = cents_to_reais(np.array(list(daily_expenses.values())))
+                daily_fig = px.line(
+                    x=days, 
+                    y=amounts, 
+                    labels={'x': 'Dia', 'y': 'Total (R$)'}, 
+                    title="Total de Despesas Diárias"
+                )
+                st.plotly_chart(daily_fig)
         else:
             st.write(f"Nenhuma despesa registrada para {month}/{year}.")
     else:
-        st.write("Nenhuma despesa registrada ainda.")
+        st.write(f"Nenhuma despesa registrada para {month}/{year}.")
+
+
+# Exportação das despesas com os mesmos filtros da tabela do resumo
+def show_export_section(year, month, filters):
+    with st.expander("Exportar Despesas"):
+        period = st.radio("Período", ["Mês selecionado", "Ano inteiro", "Todo o histórico"], horizontal=True)
+        file_format = st.selectbox("Formato", list(EXPORT_FORMATS.keys()), format_func=str.upper)
+        if st.button("Gerar Arquivo"):
+            export_year = None if period == "Todo o histórico" else year
+            export_month = month if period == "Mês selecionado" else None
+            chunks = export_expenses(get_expenses_collection(), file_format, export_year, export_month, filters)
+            # O st.download_button desta versão do Streamlit recebe o conteúdo inteiro: os lotes gerados
+            # em fluxo são juntados só aqui, ao clicar, e não a cada rerun da página
+            st.download_button(
+                "Baixar Arquivo",
+                data=b"".join(chunks),
+                file_name=f"despesas.{file_format}",
+                mime=EXPORT_FORMATS[file_format]
+            )
 
+# Função para obter a despesa indicada no link que abriu a página de edição (id e data), se houver
+def get_linked_expense():
+    expense_id = st.session_state.get("linked_expense")
+    if not expense_id or not ObjectId.is_valid(expense_id):
+        return None
+    return get_expense(ObjectId(expense_id), ("date",))
 
-# Página de edição de despesas
 # Página de edição de despesas
 def show_edit_page():
     st.title("Editar Despesas")
 
+    # Despesa aberta por um link (ver PAGES): o filtro começa no mês dela e ela já vem selecionada
+    linked_expense = get_linked_expense()
+    initial_date = linked_expense["date"] if linked_expense else datetime.today()
+
     # Filtro por mês e ano
     st.subheader("Filtrar por Mês e Ano para Edição")
-    month = st.selectbox("Mês", list(range(1, 13)), index=datetime.today().month - 1, key='edit_month')
-    year = st.number_input("Ano", min_value=2000, max_value=2100, value=datetime.today().year, key='edit_year')
+    month = st.selectbox("Mês", list(range(1, 13)), index=initial_date.month - 1, key='edit_month')
+    year = st.number_input("Ano", min_value=2000, max_value=2100, value=initial_date.year, key='edit_year')
 
     # Exibir todas as despesas em uma tabela e permitir edição
     st.header("Editar Despesas")
-    expenses = get_all_expenses()
+    with timed_section("get_expenses", "consulta"):
+        expenses = get_expenses(year, month, EDIT_FIELDS)
 
     if expenses:
-        df = pd.DataFrame(expenses)
-        df['date'] = pd.to_datetime(df['date']).dt.strftime('%d/%m/%Y')  # Formato brasileiro
-        df['payment_date'] = pd.to_datetime(df['payment_date'], errors='coerce')  # Corrigir valores nulos
-        df['payment_date'] = df['payment_date'].dt.strftime('%d/%m/%Y')  # Formato DD/MM/AAAA
-
-        df.rename(columns={
-            "name": "Descrição", 
-            "amount": "Valor (R$)", 
-            "category": "Categoria", 
-            "date": "Data", 
-            "is_paid": "Paga", 
-            "payment_date": "Data de Pagamento",
-            "notes": "Observações"  # Incluindo Observações na tabela de edição
-        }, inplace=True)
-
-        # Filtrando as despesas com base no mês e ano selecionados
-        df['Mês'] = pd.to_datetime(df['Data'], format='%d/%m/%Y').dt.month
-        df['Ano'] = pd.to_datetime(df['Data'], format='%d/%m/%Y').dt.year
-        filtered_df = df[(df['Mês'] == month) & (df['Ano'] == year)]
+        # As despesas já chegam filtradas pelo mês e ano selecionados
+        with timed_section("Preparo das despesas", "pandas"):
+            filtered_df = prepare_expenses_frame(expenses, EDIT_FIELDS)
+        mode = st.radio("Modo de Edição", ["Uma despesa", "Em lote"], horizontal=True)
 
-        if not filtered_df.empty:
-            expense_options = filtered_df['Descrição'].unique().tolist()
-            expense_to_edit = st.selectbox("Selecione a Despesa para Editar", expense_options)
+        if mode == "Em lote":
+            show_bulk_edit(expenses, filtered_df, year, month)
+        else:
+            # A seleção é feita pelo _id: despesas com a mesma descrição continuam distintas
+            labels = {
+                expense_id: f"{name} - {format_brl(amount_cents)} - {expense_date:%d/%m/%Y}"
+                for expense_id, name, amount_cents, expense_date in zip(
+                    filtered_df['_id'], filtered_df['name'], filtered_df['amount_cents'], filtered_df['date']
+                )
+            }
+            options = list(labels)
+            linked_id = linked_expense["_id"] if linked_expense else None
+            expense_to_edit = st.selectbox(
+                "Selecione a Despesa para Editar",
+                options,
+                index=options.index(linked_id) if linked_id in labels else 0,
+                format_func=labels.get
+            )
             if expense_to_edit:
-                expense_data = expenses_collection.find_one({"name": expense_to_edit})
+                expense_data = get_expense(expense_to_edit)
                 if expense_data:
+                    # Versão lida quando o formulário foi aberto: é ela que a gravação confere
+                    version_key = f"edit_version_{expense_to_edit}"
+                    expected_version = st.session_state.setdefault(version_key, expense_data.get("version", 0))
                     with st.form(key="edit_expense_form"):
                         new_name = st.text_input("Descrição", value=expense_data.get("name", ""))
-                        new_amount = st.number_input("Valor (R$)", min_value=0.0, value=expense_data.get("amount", 0.0))
+                        new_amount = st.number_input("Valor (R$)", min_value=0.0, value=cents_to_reais(expense_data.get("amount_cents", 0)))
                         new_date = st.date_input(
                             "Data", 
                             value=pd.to_datetime(expense_data.get("date")).date() if expense_data.get("date") else datetime.today().date()
                         )
-                        category_options = ["Água", "Energia", "Aluguel", "Internet", "Alimentação", "Transporte", "Saúde", "Educação", "Lazer", "Roupas", "Trabalho", "Viagem", "Outros"]
-                        current_category = expense_data.get('category', 'Outros')
+                        category_options = list(CATEGORY_KEYS)
+                        current_category = normalize_category(expense_data.get('category'))
                         if current_category not in category_options:
                             category_options.append(current_category)
                         new_category = st.selectbox(
                             "Categoria", 
                             category_options, 
-                            index=category_options.index(current_category) if current_category in category_options else 0
+                            index=category_options.index(current_category),
+                            format_func=category_label
                         )
                         is_paid = st.checkbox("Pago", value=expense_data.get("is_paid", False))
                         notes = st.text_area("Observações", value=expense_data.get("notes", ""))  # Campo para editar as observações
@@ -385,22 +538,100 @@ def show_edit_page():
                                 is_paid, 
                                 payment_date, 
                                 notes,
-                                attachment
+                                attachment,
+                                expected_version
                             ):
                                 st.success(f"Despesa '{new_name}' editada com sucesso!")
                             else:
                                 st.error("Erro ao editar a despesa.")
-        else:
-            st.write(f"Nenhuma despesa registrada para {month}/{year}.")
+                            del st.session_state[version_key]
     else:
-        st.write("Nenhuma despesa registrada ainda.")
+        st.write(f"Nenhuma despesa registrada para {month}/{year}.")
+
+# Edição em lote: as alterações de todas as linhas vão para o MongoDB em um único bulk_write
+def show_bulk_edit(expenses, filtered_df, year, month):
+    expenses_by_id = {str(expense["_id"]): expense for expense in expenses}
+    editor_df = to_editor_frame(filtered_df, EDITOR_COLUMNS)
+    editor_df.insert(0, "Selecionar", False)
+    category_names = sorted(set(map(category_label, CATEGORY_KEYS)) | set(editor_df[DISPLAY_COLUMNS["category"]]))
+
+    edited_df = st.data_editor(
+        editor_df,
+        hide_index=True,
+        column_config={
+            **DISPLAY_COLUMN_CONFIG,
+            DISPLAY_COLUMNS["amount_cents"]: st.column_config.NumberColumn(min_value=0.0, format="%.2f"),
+            DISPLAY_COLUMNS["category"]: st.column_config.SelectboxColumn(options=category_names, required=True)
+        },
+        key=f"bulk_editor_{year}_{month}_{st.session_state.get('bulk_editor_round', 0)}"
+    )
+
+    # Ações aplicadas a todas as linhas marcadas em "Selecionar"
+    selected = edited_df["Selecionar"]
+    action_category = st.selectbox("Nova categoria para as selecionadas", ["(manter)"] + category_names)
+    mark_as_paid = st.checkbox("Marcar as selecionadas como pagas (pagamento hoje, se não informado)")
+    if action_category != "(manter)":
+        edited_df.loc[selected, DISPLAY_COLUMNS["category"]] = action_category
+    if mark_as_paid:
+        edited_df.loc[selected, DISPLAY_COLUMNS["is_paid"]] = True
+
+    updates = []
+    for expense_id, row in edited_df.iterrows():
+        original = editor_df.loc[expense_id]
+        changes = {}
+        for field in EDITOR_COLUMNS:
+            column = DISPLAY_COLUMNS[field]
+            if not (row[column] == original[column] or (pd.isna(row[column]) and pd.isna(original[column]))):
+                changes[field] = to_document_value(row[column])
+        if not changes:
+            continue
+        # Mesma regra do formulário: despesa não paga não tem data de pagamento
+        is_paid = bool(row[DISPLAY_COLUMNS["is_paid"]])
+        if not is_paid:
+            changes["payment_date"] = None
+        elif pd.isna(row[DISPLAY_COLUMNS["payment_date"]]):
+            changes["payment_date"] = convert_to_datetime(datetime.today().date())
+        if "category" in changes:
+            changes["category"] = normalize_category(changes["category"])
+        if "amount_cents" in changes:
+            # A tabela edita o valor em reais; a despesa guarda centavos
+            changes["amount_cents"] = to_cents(changes["amount_cents"] or 0)
+        updates.append((expenses_by_id[expense_id], changes))
+
+    if st.button(f"Salvar Alterações em Lote ({len(updates)} despesas)", disabled=not updates):
+        updated_count, stale_count = bulk_update_expenses(updates)
+        # A próxima execução recria a tabela a partir dos dados gravados, sem as edições pendentes
+        st.session_state['bulk_editor_round'] = st.session_state.get('bulk_editor_round', 0) + 1
+        if updated_count:
+            st.success(f"{updated_count} despesas editadas com sucesso!")
+        if stale_count:
+            st.warning(
+                f"{stale_count} despesas não foram gravadas porque foram alteradas em outra sessão. "
+                "Recarregue a página e tente novamente."
+            )
 
-# Função para apagar despesas selecionadas
-def delete_selected_expenses(selected_ids):
+# Função para apagar as despesas selecionadas (como foram carregadas) em um único bulk_write.
+# Despesas alteradas por outra sessão desde a leitura não são apagadas.
+def delete_selected_expenses(selected):
     try:
-        # Apagar as despesas que correspondem aos IDs selecionados
-        result = expenses_collection.delete_many({"_id": {"$in": selected_ids}})
-        return result.deleted_count
+        db = get_database()
+        operations = [DeleteOne({"_id": expense["_id"], **version_filter(expense.get("version"))}) for expense in selected]
+        result = db['expenses'].bulk_write(operations, ordered=False)
+
+        deleted = selected
+        if result.deleted_count < len(selected):
+            # Só nos conflitos: as despesas que continuam no banco são as que não foram apagadas
+            remaining = {expense["_id"] for expense in db['expenses'].find({"_id": {"$in": [e["_id"] for e in selected]}}, {"_id": 1})}
+            deleted = [expense for expense in selected if expense["_id"] not in remaining]
+            record_expense_conflicts([expense for expense in selected if expense["_id"] in remaining])
+
+        # Os valores saem dos totais e os anexos são removidos do GridFS
+        record_expense_changes(old_expenses=deleted)
+        attachment_ids = [expense["attachment_id"] for expense in deleted if expense.get("attachment_id")]
+        delete_attachments(db, attachment_ids)
+        for attachment_id in attachment_ids:
+            get_preview_cache().discard(str(attachment_id))
+        return len(deleted)
     except Exception as e:
         st.error(f"Erro ao apagar as despesas: {e}")
         return 0
@@ -416,51 +647,43 @@ def show_delete_page():
 
     # Buscar despesas filtradas por mês e ano
     st.subheader("Selecione as Despesas a serem Apagadas")
-    expenses = get_all_expenses()
+    with timed_section("get_expenses", "consulta"):
+        expenses = get_expenses(year, month, DELETE_FIELDS)
     
     if expenses:
-        df = pd.DataFrame(expenses)
-        df['date'] = pd.to_datetime(df['date']).dt.strftime('%d/%m/%Y')  # Formato brasileiro DD/MM/AAAA
-        df['payment_date'] = pd.to_datetime(df['payment_date'], errors='coerce')  # Corrigir valores nulos
-        df['payment_date'] = df['payment_date'].dt.strftime('%d/%m/%Y')  # Formato DD/MM/AAAA
-
-        df.rename(columns={
-            "name": "Descrição", 
-            "amount": "Valor (R$)", 
-            "category": "Categoria", 
-            "date": "Data", 
-            "is_paid": "Paga", 
-            "payment_date": "Data de Pagamento"
-        }, inplace=True)
-
-        # Filtrando as despesas com base no mês e ano selecionados
-        df['Mês'] = pd.to_datetime(df['Data'], format='%d/%m/%Y').dt.month
-        df['Ano'] = pd.to_datetime(df['Data'], format='%d/%m/%Y').dt.year
-        filtered_df = df[(df['Mês'] == month) & (df['Ano'] == year)]
-
-        if not filtered_df.empty:
-            # Armazenar IDs das despesas selecionadas
-            selected_expenses = []
-            for index, row in filtered_df.iterrows():
-                expense_id = expenses[index]["_id"]  # Obter o ID da despesa original
-                if st.checkbox(f"{row['Descrição']} - R$ {row['Valor (R$)']} - {row['Data']} ({row['Categoria']})", key=expense_id):
-                    selected_expenses.append(expense_id)
-
-            # Botão para apagar despesas selecionadas
-            if selected_expenses:
-                delete_button = st.button("Apagar Despesas Selecionadas")
-                if delete_button:
-                    deleted_count = delete_selected_expenses(selected_expenses)
-                    if deleted_count > 0:
-                        st.success(f"{deleted_count} despesas apagadas com sucesso.")
-                    else:
-                        st.warning("Nenhuma despesa foi apagada.")
-            else:
-                st.warning("Nenhuma despesa selecionada para apagar.")
+        # As despesas já chegam filtradas pelo mês e ano selecionados; cada linha é identificada pelo _id
+        expenses_by_id = {str(expense["_id"]): expense for expense in expenses}
+        with timed_section("Preparo das despesas", "pandas"):
+            editor_df = to_editor_frame(prepare_expenses_frame(expenses, DELETE_FIELDS), DELETE_COLUMNS)
+        editor_df.insert(0, "Apagar", False)
+
+        edited_df = st.data_editor(
+            editor_df,
+            hide_index=True,
+            disabled=list(editor_df.columns[1:]),
+            column_config=DISPLAY_COLUMN_CONFIG,
+            key=f"delete_editor_{year}_{month}_{st.session_state.get('delete_editor_round', 0)}"
+        )
+        selected_expenses = [expenses_by_id[expense_id] for expense_id in edited_df.index[edited_df["Apagar"]]]
+
+        # Botão para apagar despesas selecionadas
+        if selected_expenses:
+            delete_button = st.button(f"Apagar {len(selected_expenses)} Despesas Selecionadas")
+            if delete_button:
+                deleted_count = delete_selected_expenses(selected_expenses)
+                # As marcações são por linha: a tabela é recriada para não marcar as despesas que ficaram
+                st.session_state['delete_editor_round'] = st.session_state.get('delete_editor_round', 0) + 1
+                if deleted_count > 0:
+                    st.success(f"{deleted_count} despesas apagadas com sucesso.")
+                if deleted_count < len(selected_expenses):
+                    st.warning(
+                        f"{len(selected_expenses) - deleted_count} despesas não foram apagadas porque foram alteradas "
+                        "em outra sessão. Recarregue a página e tente novamente."
+                    )
         else:
-            st.write(f"Nenhuma despesa registrada para {month}/{year}.")
+            st.warning("Nenhuma despesa selecionada para apagar.")
     else:
-        st.write("Nenhuma despesa registrada ainda.")
+        st.write(f"Nenhuma despesa registrada para {month}/{year}.")
 
 # Função para análise inteligente anual com gráficos mais claros e aluguel incluso, exceto nas dicas e na categoria mais cara
 
@@ -471,34 +694,36 @@ def show_analysis_page():
     st.subheader("Selecione o Ano para Análise")
     year = st.number_input("Ano", min_value=2000, max_value=2100, value=datetime.today().year)
 
-    # Buscar todas as despesas filtradas pelo ano
-    expenses = get_all_expenses()
-
-    if expenses:
-        df = pd.DataFrame(expenses)
-        df['date'] = pd.to_datetime(df['date'], dayfirst=True).dt.strftime('%d/%m/%Y')  # Formato brasileiro DD/MM/AAAA
-        df['Mês'] = pd.to_datetime(df['date'], format='%d/%m/%Y', dayfirst=True).dt.month
-        df['Ano'] = pd.to_datetime(df['date'], format='%d/%m/%Y', dayfirst=True).dt.year
-
-        # Filtrando as despesas pelo ano selecionado
-        filtered_df = df[df['Ano'] == year]
-
+    # Séries do ano calculadas uma vez por versão dos dados e atualizadas só nos dias alterados (analytics.py),
+    # buscadas em paralelo com a comparação entre anos (warehouse.py), os gastos fora do padrão e a previsão,
+    # que usam todo o histórico
+    results = run_queries({
+        "get_year_analytics": lambda: get_year_analytics(year),
+        "get_multi_year_report": lambda: get_multi_year_report(year),
+        "get_anomalies": get_anomalies,
+        "get_forecast": get_forecast
+    })
+    analytics = results["get_year_analytics"]
+
+    if not analytics.is_empty():
         # 1. Gráfico de comparação mensal (Inclui o Aluguel)
         st.subheader(f"Comparação de Gastos Mensais em {year}")
-        monthly_expenses_incl_rent = filtered_df.groupby('Mês')['amount'].sum()
+        # As séries somam centavos (int64); os gráficos recebem reais
+        monthly_expenses_incl_rent = cents_to_reais(analytics.monthly).rename_axis('Mês')
 
         # Gráfico de barras + tendência
-        fig = px.bar(monthly_expenses_incl_rent, labels={'x': 'Mês', 'y': 'Total (R$)'}, title="Gastos Mensais com Aluguel")
-        fig.add_scatter(x=monthly_expenses_incl_rent.index, y=monthly_expenses_incl_rent, mode='lines+markers', name='Tendência')
-        st.plotly_chart(fig)
+        with timed_section("Gráfico mensal", "plotly"):
+            fig = px.bar(monthly_expenses_incl_rent, labels={'x': 'Mês', 'y': 'Total (R$)'}, title="Gastos Mensais com Aluguel")
+            fig.add_scatter(x=monthly_expenses_incl_rent.index, y=monthly_expenses_incl_rent, mode='lines+markers', name='Tendência')
+            st.plotly_chart(fig)
 
         # Adicionando a Média Mensal
-        monthly_average = monthly_expenses_incl_rent.mean()
-        st.write(f"**Média mensal de gastos:** R$ {monthly_average:.2f}".replace('.', ',').replace(',', '.', 1))
+        monthly_average = analytics.monthly.mean()
+        st.write(f"**Média mensal de gastos:** {format_brl(round(monthly_average))}")
 
         # 2. Gráfico de variação percentual de cada mês (Inclui o Aluguel)
-        monthly_expenses_pct_change = monthly_expenses_incl_rent.pct_change().fillna(0) * 100
-        monthly_expenses_value_change = monthly_expenses_incl_rent.diff().fillna(0)  # Calcula a diferença em valor
+        monthly_expenses_pct_change = analytics.monthly_pct_change
+        monthly_expenses_value_change = analytics.monthly_change  # Diferença em valor
 
         st.subheader("Variação Percentual de Gastos")
 
@@ -508,98 +733,259 @@ def show_analysis_page():
         """)
 
         # Ajustando os labels no gráfico
-        fig_pct = px.bar(monthly_expenses_pct_change, labels={'x': 'Mês', 'y': 'Variação (%)'}, 
-                         title="Variação Percentual Mensal", text=monthly_expenses_pct_change.map("{:.2f}%".format), 
-                         color=monthly_expenses_pct_change, color_continuous_scale="RdYlGn")
+        with timed_section("Gráfico de variação mensal", "plotly"):
+            fig_pct = px.bar(monthly_expenses_pct_change, labels={'x': 'Mês', 'y': 'Variação (%)'}, 
+                             title="Variação Percentual Mensal", text=monthly_expenses_pct_change.map("{:.2f}%".format), 
+                             color=monthly_expenses_pct_change, color_continuous_scale="RdYlGn")
         
-        fig_pct.update_layout(xaxis=dict(tickvals=monthly_expenses_incl_rent.index, ticktext=monthly_expenses_incl_rent.index), 
-                              yaxis_title="Variação (%)", xaxis_title="Mês")
-        st.plotly_chart(fig_pct)
+            fig_pct.update_layout(xaxis=dict(tickvals=monthly_expenses_incl_rent.index, ticktext=monthly_expenses_incl_rent.index), 
+                                  yaxis_title="Variação (%)", xaxis_title="Mês")
+            st.plotly_chart(fig_pct)
 
         # Exibir valores de aumento ou redução abaixo do gráfico com cor apenas no valor
         st.subheader("Aumento ou Redução Mensal em Valor")
         for month, change in zip(monthly_expenses_incl_rent.index, monthly_expenses_value_change):
             if change > 0:
-                st.markdown(f"Mês {month}: ⬆️ Aumento de <span style='color:red'>R$ {change:,.2f}</span>".replace('.', ',').replace(',', '.', 1), unsafe_allow_html=True)
+                st.markdown(f"Mês {month}: ⬆️ Aumento de <span style='color:red'>{format_brl(change)}</span>", unsafe_allow_html=True)
             elif change < 0:
-                st.markdown(f"Mês {month}: ⬇️ Redução de <span style='color:green'>R$ {abs(change):,.2f}</span>".replace('.', ',').replace(',', '.', 1), unsafe_allow_html=True)
+                st.markdown(f"Mês {month}: ⬇️ Redução de <span style='color:green'>{format_brl(abs(change))}</span>", unsafe_allow_html=True)
             else:
                 st.write(f"Mês {month}: Sem variação em relação ao mês anterior.")
 
         # 3. Gráfico de despesas por categoria ao longo do ano (Inclui Aluguel)
         st.subheader(f"Gastos por Categoria em {year}")
-        category_expenses_incl_rent = filtered_df.groupby('category')['amount'].sum().sort_values(ascending=False)
+        category_expenses_incl_rent = cents_to_reais(analytics.categories).rename(index=category_label).rename('amount')
 
         # Gráfico de pizza para destacar as categorias mais caras
-        fig_category = px.pie(category_expenses_incl_rent, values='amount', names=category_expenses_incl_rent.index, 
-                              title="Distribuição de Gastos por Categoria", hole=0.4)
-        st.plotly_chart(fig_category)
+        with timed_section("Gráfico por categoria", "plotly"):
+            fig_category = px.pie(category_expenses_incl_rent, values='amount', names=category_expenses_incl_rent.index, 
+                                  title="Distribuição de Gastos por Categoria", hole=0.4)
+            st.plotly_chart(fig_category)
 
         # Destacar a categoria com maior gasto
         st.write(f"**Categoria com maior gasto:** {category_expenses_incl_rent.idxmax()}")
 
         # 4. Categoria mais cara no ano (Sem Aluguel)
         st.subheader(f"Categoria mais cara no ano de {year}")
-        filtered_df_no_rent = filtered_df[filtered_df['category'] != "Aluguel"]
-        most_expensive_category_no_rent = filtered_df_no_rent.groupby('category')['amount'].sum().idxmax()
-        highest_expense_no_rent = filtered_df_no_rent.groupby('category')['amount'].sum().max()
+        category_expenses_no_rent = analytics.categories.drop(RENT_CATEGORY, errors='ignore')
+        most_expensive_category_no_rent = category_expenses_no_rent.idxmax()
+        highest_expense_no_rent = category_expenses_no_rent.max()
 
-        st.write(f"**Categoria mais cara no ano:** {most_expensive_category_no_rent} - Total Gasto: R$ {highest_expense_no_rent:,.2f}".replace('.', ',').replace(',', '.', 1))
+        st.write(f"**Categoria mais cara no ano:** {category_label(most_expensive_category_no_rent)} - Total Gasto: {format_brl(highest_expense_no_rent)}")
 
         # Dicas de economia baseadas na categoria mais cara, excluindo o aluguel
         st.subheader("Dicas para Economia")
-        if most_expensive_category_no_rent == "Energia":
+        if most_expensive_category_no_rent == "energia":
             st.write("⚡ **Dica:** Para reduzir o consumo de energia, tente desligar dispositivos quando não estiverem em uso ou investir em aparelhos mais eficientes.")
-        elif most_expensive_category_no_rent == "Água":
+        elif most_expensive_category_no_rent == "agua":
             st.write("💧 **Dica:** Considere o uso de redutores de fluxo em torneiras e chuveiros para economizar água.")
-        elif most_expensive_category_no_rent == "Internet":
+        elif most_expensive_category_no_rent == "internet":
             st.write("🌐 **Dica:** Verifique se está pagando por uma velocidade de internet que realmente precisa. Em alguns casos, planos mais baratos podem atender suas necessidades.")
 
         # 5. Gráfico de picos de gastos diários com categorias e cores diferenciadas (Sem Aluguel)
         st.subheader(f"Picos de Gastos Diários em {year}")
 
-        # Criar coluna para o eixo X (dia e mês) e excluir aluguel
-        filtered_df_no_rent['Dia_Mês'] = pd.to_datetime(filtered_df_no_rent['date'], format='%d/%m/%Y').dt.strftime('%d/%m')
+        # Agrupando despesas por dia e categoria (sem aluguel), em ordem cronológica
+        with timed_section("Série diária", "pandas"):
+            daily_expenses_no_rent = cents_to_reais(analytics.daily_without(RENT_CATEGORY)).rename(columns=category_label)
 
-        # Agrupando despesas por dia/mês e categoria (sem aluguel)
-        daily_expenses_no_rent = filtered_df_no_rent.groupby(['Dia_Mês', 'category'])['amount'].sum().unstack().fillna(0)
+            # O eixo X (dia e mês) só é convertido em texto para exibição
+            daily_expenses_no_rent.index = daily_expenses_no_rent.index.strftime('%d/%m').rename('Dia_Mês')
 
         # Gráfico de barras empilhadas com Plotly para identificar picos diários por categoria
-        fig_daily = px.bar(daily_expenses_no_rent.reset_index(), 
-                           x='Dia_Mês', 
-                           y=daily_expenses_no_rent.columns, 
-                           labels={'value': 'Total (R$)', 'Dia_Mês': 'Dia/Mês'},
-                           title="Picos de Gastos Diários por Categoria",
-                           barmode='stack')
-
-        fig_daily.update_layout(xaxis_title='Dia e Mês', yaxis_title='Total Gasto (R$)')
-        st.plotly_chart(fig_daily)
-
-        # Analisando possíveis picos anormais
-        avg_expense = np.mean(daily_expenses_no_rent.sum(axis=1))
-        max_expense = np.max(daily_expenses_no_rent.sum(axis=1))
-        if max_expense > 1.5 * avg_expense:  # Se o maior gasto for 50% maior que a média
-            st.write(f"⚠️ **Alerta:** Houve um pico de gastos no dia com maior despesa. O valor foi R$ {max_expense:,.2f}, bem acima da média diária de R$ {avg_expense:,.2f}. Verifique as despesas deste dia.")
-
-        # Nova funcionalidade: Previsão de Gastos para o Próximo Mês com base na média móvel
-        st.subheader("Previsão de Gastos para o Próximo Mês")
-        if len(monthly_expenses_incl_rent) >= 3:  # Verifica se há dados suficientes para calcular a média móvel
-            # Calculando a média dos últimos 3 meses
-            last_three_months_avg = monthly_expenses_incl_rent.iloc[-3:].mean()
-
-            # Calculando a variação percentual média dos últimos 3 meses
-            pct_change_last_three = monthly_expenses_pct_change.iloc[-3:].mean() / 100
-
-            # Previsão do próximo mês com base na média móvel e variação percentual média
-            predicted_next_month = last_three_months_avg * (1 + pct_change_last_three)
-            st.write(f"**Previsão de gastos para o próximo mês:** R$ {predicted_next_month:.2f}".replace('.', ',').replace(',', '.', 1))
-        else:
-            st.write("Dados insuficientes para prever o próximo mês.")
+        with timed_section("Gráfico diário", "plotly"):
+            fig_daily = px.bar(daily_expenses_no_rent.reset_index(), 
+                               x='Dia_Mês', 
+                               y=daily_expenses_no_rent.columns, 
+                               labels={'value': 'Total (R$)', 'Dia_Mês': 'Dia/Mês'},
+                               title="Picos de Gastos Diários por Categoria",
+                               barmode='stack')
+
+            fig_daily.update_layout(xaxis_title='Dia e Mês', yaxis_title='Total Gasto (R$)')
+            st.plotly_chart(fig_daily)
+
+        # Comparação com o ano anterior e tendência de cada categoria ao longo dos anos
+        show_multi_year_section(year, results["get_multi_year_report"])
+
+        # Gastos fora do padrão de cada categoria, comparados com todo o histórico (anomalies.py)
+        show_anomalies_section(year, *results["get_anomalies"])
+
+        # Previsão dos próximos meses por categoria, com o histórico de todos os anos (forecasting.py)
+        show_forecast_section(*results["get_forecast"])
         
     else:
         st.write(f"Nenhuma despesa registrada para o ano de {year}.")
      
 
+# Função para exibir os relatórios de vários anos: cada mês contra o mesmo mês do ano anterior,
+# o total de cada categoria por ano e os maiores picos diários de todo o histórico
+def show_multi_year_section(year, report):
+    st.subheader(f"Comparação com {year - 1}")
+    year_over_year = report["year_over_year"]
+    if year_over_year["previous_cents"].sum() == 0:
+        st.write(f"Nenhuma despesa registrada em {year - 1} para comparar.")
+    else:
+        total, previous = year_over_year["total_cents"].sum(), year_over_year["previous_cents"].sum()
+        st.write(f"**Total em {year}:** {format_brl(total)} ({(total - previous) / previous:+.1%} em relação a {year - 1}, "
+                 f"que somou {format_brl(previous)})")
+        with timed_section("Gráfico da comparação anual", "plotly"):
+            comparison = pd.DataFrame({
+                str(year): cents_to_reais(year_over_year["total_cents"]).to_numpy(),
+                str(year - 1): cents_to_reais(year_over_year["previous_cents"]).to_numpy()
+            }, index=year_over_year["month"].rename("Mês"))
+            fig_yoy = px.bar(comparison, barmode="group", labels={'value': 'Total (R$)', 'variable': 'Ano'},
+                             title=f"Gastos Mensais: {year} x {year - 1}")
+            st.plotly_chart(fig_yoy)
+
+    st.subheader("Tendência por Categoria")
+    categories = report["categories"]
+    if categories["year"].nunique() < 2:
+        st.write("A tendência por categoria aparece a partir de dois anos com despesas.")
+    else:
+        with timed_section("Gráfico de tendência por categoria", "plotly"):
+            trend = categories.assign(category=categories["category"].map(category_label),
+                                      total=cents_to_reais(categories["total_cents"]))
+            fig_trend = px.line(trend, x="year", y="total", color="category", markers=True,
+                                labels={'year': 'Ano', 'total': 'Total (R$)', 'category': 'Categoria'},
+                                title="Gastos por Categoria ao Longo dos Anos")
+            fig_trend.update_xaxes(dtick=1)
+            st.plotly_chart(fig_trend)
+
+        current = categories[categories["year"] == year]
+        if not current.empty:
+            st.dataframe(
+                current.assign(
+                    category=current["category"].map(category_label),
+                    total_cents=cents_to_reais(current["total_cents"]),
+                    previous_cents=cents_to_reais(current["previous_cents"])
+                ).drop(columns="year"),
+                hide_index=True,
+                column_config={
+                    "category": "Categoria",
+                    "total_cents": st.column_config.NumberColumn(str(year), format="R$ %.2f"),
+                    "previous_cents": st.column_config.NumberColumn(str(year - 1), format="R$ %.2f"),
+                    "change_pct": st.column_config.NumberColumn("Variação", format="%.1f%%")
+                }
+            )
+
+    st.subheader("Maiores Picos Diários de Todos os Anos (Sem Aluguel)")
+    peaks = report["peaks"]
+    st.dataframe(
+        peaks.assign(total_cents=cents_to_reais(peaks["total_cents"]), top_category=peaks["top_category"].map(category_label)),
+        hide_index=True,
+        column_config={
+            "day": st.column_config.DateColumn("Dia", format="DD/MM/YYYY"),
+            "total_cents": st.column_config.NumberColumn("Total do Dia", format="R$ %.2f"),
+            "top_category": "Categoria da Maior Despesa"
+        }
+    )
+
+# Função para exibir as despesas que formaram picos de gasto no ano, com link para a página de edição
+def show_anomalies_section(year, expenses, days):
+    st.subheader("Gastos Fora do Padrão")
+    st.write("""
+    Cada dia é comparado com os últimos dias em que houve gasto na mesma categoria: valores muito acima da mediana recente (pela mediana dos desvios) aparecem abaixo.
+    """)
+    expenses = expenses[expenses["date"].dt.year == year]
+    days = days[days["day"].dt.year == year]
+
+    # Dias em que o total gasto (sem o aluguel) ficou bem acima do esperado, em uma única tabela
+    if not days.empty:
+        st.write(f"⚠️ **Alerta:** {len(days)} dias com total gasto bem acima do esperado para o período. Verifique as despesas destes dias.")
+        st.dataframe(
+            days.head(MAX_ANOMALY_DAYS).assign(
+                total_cents=cents_to_reais(days["total_cents"]),
+                expected_cents=cents_to_reais(days["expected_cents"])
+            ),
+            hide_index=True,
+            column_config={
+                "day": st.column_config.DateColumn("Data", format="DD/MM/YYYY"),
+                "total_cents": st.column_config.NumberColumn("Total do Dia", format="R$ %.2f"),
+                "expected_cents": st.column_config.NumberColumn("Esperado", format="R$ %.2f"),
+                "score": st.column_config.NumberColumn("Desvios", format="%.1f")
+            }
+        )
+        if len(days) > MAX_ANOMALY_DAYS:
+            st.caption(f"Exibindo os {MAX_ANOMALY_DAYS} dias mais recentes.")
+    if expenses.empty:
+        st.write(f"Nenhum gasto fora do padrão em {year}.")
+        return
+
+    # Valores em centavos convertidos para reais só na tabela exibida
+    anomalies_df = expenses.assign(
+        category=expenses["category"].map(category_label),
+        amount_cents=cents_to_reais(expenses["amount_cents"]),
+        total_cents=cents_to_reais(expenses["total_cents"]),
+        expected_cents=cents_to_reais(expenses["expected_cents"])
+    ).drop(columns="_id")
+    st.dataframe(
+        anomalies_df,
+        hide_index=True,
+        column_config={
+            "date": st.column_config.DateColumn("Data", format="DD/MM/YYYY"),
+            "name": "Descrição",
+            "category": "Categoria",
+            "amount_cents": st.column_config.NumberColumn("Valor", format="R$ %.2f"),
+            "total_cents": st.column_config.NumberColumn("Total da Categoria no Dia", format="R$ %.2f"),
+            "expected_cents": st.column_config.NumberColumn("Esperado", format="R$ %.2f"),
+            "score": st.column_config.NumberColumn("Desvios", format="%.1f"),
+            "link": st.column_config.LinkColumn("Editar", display_text="Editar")
+        }
+    )
+
+# Função para exibir a previsão de gastos do mês atual e do próximo, por categoria.
+# Os modelos são ajustados sobre os meses completos e só são refeitos quando algum total mensal muda.
+def show_forecast_section(series, fit):
+    st.subheader("Previsão de Gastos para os Próximos Meses")
+    if fit is None:
+        st.write("Dados insuficientes para prever os próximos meses.")
+        return
+
+    predicted = fit.predict(FORECAST_MONTHS)
+    months = [f"{month:02d}/{year}" for year, month in series.next_months(FORECAST_MONTHS)]
+    for column, month, values in zip(st.columns(FORECAST_MONTHS), months, predicted):
+        column.write(f"**Previsão para {month}:** {format_brl(to_cents(values.sum()))}")
+
+    forecast_df = pd.DataFrame(predicted.T, columns=months)
+    forecast_df.insert(0, "Categoria", [category_label(category) for category in series.categories])
+    forecast_df["Modelo"] = [MODELS[name].label for name in fit.choice]
+    forecast_df = forecast_df[forecast_df[months].sum(axis=1) > 0].sort_values(months[0], ascending=False)
+    st.dataframe(
+        forecast_df,
+        hide_index=True,
+        column_config={month: st.column_config.NumberColumn(format="R$ %.2f") for month in months}
+    )
+
+    error = fit.backtest_error()
+    if error is not None:
+        st.write(f"Com {len(series.months)} meses de histórico, o modelo de cada categoria foi escolhido pelo menor erro "
+                 f"ao prever os últimos {BACKTEST_MONTHS} meses (erro médio de {error:.0%} no total previsto).")
+
+# Função para buscar os bytes de um anexo somente quando ele for exibido
+def get_attachment_data(expense):
+    attachment_id = expense.get("attachment_id")
+    if isinstance(attachment_id, ObjectId):
+        return load_attachment(get_database(), attachment_id)
+    # Anexos antigos, ainda gravados dentro da própria despesa (antes de rodar a migração)
+    legacy = get_expenses_collection().find_one({"_id": expense["_id"]}, {"attachment_data": 1})
+    return legacy.get("attachment_data") if legacy else None
+
+# Função para obter a miniatura de um anexo, gerando-a a partir do arquivo só na primeira vez
+def get_attachment_preview(expense):
+    if not can_preview(expense.get("attachment_type")):
+        return None
+    # Anexos antigos, ainda não migrados para o GridFS, usam o ID da própria despesa como chave
+    attachment_id = expense.get("attachment_id")
+    key = str(attachment_id if isinstance(attachment_id, ObjectId) else expense["_id"])
+    cache = get_preview_cache()
+    preview = cache.get(key)
+    if preview is None:
+        attachment_data = get_attachment_data(expense)
+        if attachment_data:
+            preview = generate_preview(attachment_data, expense.get("attachment_type"))
+            cache.put(key, preview)
+    return preview
+
 # Função para exibir visualização de anexos de forma otimizada com download correto
 def show_view_files_page():
     st.title("Visualizar Anexos das Despesas")
@@ -611,69 +997,198 @@ def show_view_files_page():
 
     # Buscar despesas filtradas por mês e ano
     st.subheader("Despesas com Anexos")
-    expenses = get_all_expenses()
+    with timed_section("get_expenses", "consulta"):
+        expenses = get_expenses(year, month, VIEW_FILES_FIELDS)
 
     if expenses:
-        df = pd.DataFrame(expenses)
-        # Definir `dayfirst=True` explicitamente ao formatar datas
-        df['date'] = pd.to_datetime(df['date'], dayfirst=True).dt.strftime('%d/%m/%Y')  # Formato brasileiro DD/MM/AAAA
-
-        # Filtrar despesas por mês e ano
-        df['Mês'] = pd.to_datetime(df['date'], format='%d/%m/%Y', dayfirst=True).dt.month
-        df['Ano'] = pd.to_datetime(df['date'], format='%d/%m/%Y', dayfirst=True).dt.year
-        filtered_df = df[(df['Mês'] == month) & (df['Ano'] == year)]
+        # As despesas já chegam filtradas pelo mês e ano selecionados
+        with timed_section("Preparo das despesas", "pandas"):
+            filtered_df = prepare_expenses_frame(expenses, VIEW_FILES_FIELDS)
 
         if not filtered_df.empty:
             for index, row in filtered_df.iterrows():
-                st.write(f"### Despesa: {row['name']} - R$ {row['amount']} - {row['date']}")
-                st.write(f"**Categoria:** {row['category']}")
+                st.write(f"### Despesa: {row['name']} - {format_brl(row['amount_cents'])} - {row['date'].strftime(DATE_FORMAT)}")
+                st.write(f"**Categoria:** {category_label(row['category'])}")
                 st.write(f"**Observações:** {row.get('notes', 'Sem observações')}")
 
-                # Se houver um anexo, exibi-lo de forma otimizada
-                if 'attachment_data' in row and row['attachment_data']:
-                    attachment_name = row.get('attachment_name', 'Anexo')
+                # Se houver um anexo, exibir apenas a miniatura; o arquivo completo só é buscado quando pedido
+                attachment_name = row.get('attachment_name')
+                if isinstance(attachment_name, str) and attachment_name:
                     attachment_type = row.get('attachment_type', '')
+                    expense_id = str(row['_id'])
 
                     # Garantir que attachment_type seja uma string antes de fazer a comparação
-                    if isinstance(attachment_type, str):
-                        # Exibir imagem como miniatura clicável
-                        if 'image' in attachment_type:
-                            st.image(row['attachment_data'], caption=attachment_name, width=150)  # Exibindo a imagem em miniatura
-                            if st.button(f"Expandir Imagem {attachment_name}", key=f"expand_{index}"):
-                                st.image(row['attachment_data'], caption=attachment_name)  # Exibir imagem em tamanho real
-
-                        # Forçar o download do PDF
-                        elif 'pdf' in attachment_type:
-                            # Codificar o PDF em base64 para download
-                            base64_pdf = base64.b64encode(row['attachment_data']).decode('utf-8')
-                            href = f'<a href="data:application/octet-stream;base64,{base64_pdf}" download="{attachment_name}">Baixar PDF: {attachment_name}</a>'
-                            st.markdown(href, unsafe_allow_html=True)
-                    else:
+                    if not isinstance(attachment_type, str):
                         st.write(f"Tipo de anexo inválido ou ausente para a despesa: {row['name']}")
+                        continue
+
+                    preview = get_attachment_preview(row)
+                    if preview:
+                        st.image(preview, caption=attachment_name, width=150)  # Exibindo a miniatura
+                    else:
+                        st.write(f"📎 {attachment_name}")
+
+                    if st.button(f"Abrir Anexo {attachment_name}", key=f"show_{expense_id}"):
+                        st.session_state['shown_attachment'] = expense_id
+
+                    if st.session_state.get('shown_attachment') == expense_id:
+                        attachment_data = get_attachment_data(row)
+                        if not attachment_data:
+                            st.write(f"Anexo não encontrado para a despesa: {row['name']}")
+                        else:
+                            # Exibir imagem em tamanho real
+                            if 'image' in attachment_type:
+                                st.image(attachment_data, caption=attachment_name)
+                            st.download_button(
+                                f"Baixar {attachment_name}",
+                                data=attachment_data,
+                                file_name=attachment_name,
+                                mime=attachment_type or "application/octet-stream",
+                                key=f"download_{expense_id}"
+                            )
                 else:
                     st.write("Nenhum anexo disponível para esta despesa.")
         else:
             st.write(f"Nenhuma despesa encontrada para {month}/{year}.")
     else:
-        st.write("Nenhuma despesa registrada ainda.")
+        st.write(f"Nenhuma despesa encontrada para {month}/{year}.")
+
+# Origem dos resultados da busca, exibida abaixo da tabela
+SEARCH_SOURCES = {
+    "texto": "Resultados do índice de texto do MongoDB.",
+    "local": "Resultados da cópia local.",
+    "aproximada": "Nenhum resultado exato: resultados da busca aproximada (tolera erros de digitação)."
+}
+
+# Função para exibir a busca de despesas pela descrição e pelas observações, em todos os meses,
+# das mais relevantes para as menos relevantes, com link para a página de edição
+def show_search_page():
+    st.title("Buscar Despesas")
+    query = st.text_input("Buscar na descrição e nas observações", key="search_query")
+    if not query.strip():
+        st.write("Digite parte da descrição ou das observações (ex.: mercado, farmácia, uber).")
+        return
+
+    # Uma nova busca volta para a primeira página
+    if st.session_state.get('search_signature') != query:
+        st.session_state['search_signature'] = query
+        st.session_state['search_page'] = 0
+    page_number = st.session_state['search_page']
+
+    with timed_section("search_expenses", "consulta"):
+        expenses, total, source = search_expenses(query, page_number)
+    if not total:
+        st.write(f"Nenhuma despesa encontrada para \"{query}\".")
+        return
+
+    with timed_section("Tabela da busca", "pandas"):
+        results_df = prepare_expenses_frame(expenses, SEARCH_FIELDS)
+        display_df = to_display_frame(results_df, SEARCH_FIELDS)
+        display_df["link"] = [edit_link(expense_id) for expense_id in results_df["_id"]]
+        st.dataframe(
+            display_df,
+            hide_index=True,
+            column_config={**DISPLAY_COLUMN_CONFIG, "link": st.column_config.LinkColumn("Editar", display_text="Editar")}
+        )
+
+    previous_col, page_col, next_col = st.columns([1, 2, 1])
+    if previous_col.button("Anterior", disabled=page_number == 0):
+        st.session_state['search_page'] -= 1
+        st.rerun()
+    page_count = -(-total // SEARCH_PAGE_SIZE)
+    page_col.write(f"Página {page_number + 1} de {page_count} ({total} despesas)")
+    if next_col.button("Próxima", disabled=page_number + 1 >= page_count):
+        st.session_state['search_page'] += 1
+        st.rerun()
+    st.caption(SEARCH_SOURCES[source])
+
+# Função para exibir na barra lateral as medições da última execução da página
+def show_instrumentation_panel(measurements):
+    with st.sidebar:
+        st.subheader("Desempenho")
+        st.write(f"**Página:** {measurements['total_ms']:.0f} ms")
+        st.write(f"**MongoDB:** {len(measurements['commands'])} comandos, {measurements['mongo_ms']:.0f} ms, "
+                 f"{measurements['reply_bytes'] / 1024:,.1f} KB recebidos")
+        if measurements["sections"]:
+            st.dataframe(
+                pd.DataFrame(measurements["sections"]).rename(columns={"name": "Trecho", "kind": "Tipo", "ms": "ms"}),
+                hide_index=True
+            )
+        if measurements["commands"]:
+            commands_df = pd.DataFrame(measurements["commands"]).sort_values("ms", ascending=False)
+            st.dataframe(
+                commands_df[["command", "collection", "ms", "reply_bytes"]].rename(columns={
+                    "command": "Comando", "collection": "Coleção", "reply_bytes": "Bytes"
+                }),
+                hide_index=True
+            )
+            for command in commands_df.itertuples():
+                if command.reply_bytes > LARGE_REPLY_BYTES:
+                    st.warning(f"Resposta grande: {command.command} em {command.collection} "
+                               f"({command.reply_bytes / 1024 / 1024:.1f} MB)")
+        else:
+            st.write("Nenhum comando enviado ao MongoDB (tudo veio do cache).")
 
 # Sidebar para navegação
+PAGES = ["Despesas por Mês", "Resumo de Despesas", "Análise Inteligente", "Editar Despesas", "Apagar Despesas", "Visualizar Anexos", "Buscar Despesas"]
+
+# Links como ?pagina=Editar Despesas&despesa=<id> (tabela de gastos fora do padrão) abrem a página e a despesa
+# indicadas. Os parâmetros são lidos uma vez e removidos da URL, para não prender a navegação nessa página.
+if st.query_params.get("pagina") in PAGES:
+    st.session_state["page"] = st.query_params["pagina"]
+    st.session_state["linked_expense"] = st.query_params.get("despesa")
+    st.query_params.clear()
+
 st.sidebar.title("Menu")
-page = st.sidebar.selectbox(
-    "Selecione a página", 
-    ["Despesas por Mês", "Resumo de Despesas", "Análise Inteligente", "Editar Despesas", "Apagar Despesas", "Visualizar Anexos"]
-)
+page = st.sidebar.selectbox("Selecione a página", PAGES, key="page")
+
+# Painel opcional com os tempos da página e os comandos enviados ao MongoDB. Com INSTRUMENTATION_LOG
+# configurado (ambiente ou secrets.toml), cada execução de página também é gravada nesse arquivo JSONL.
+show_debug_panel = st.sidebar.checkbox("Painel de desempenho", key="debug_panel")
+instrumentation_log = get_setting("INSTRUMENTATION_LOG")
+recorder = start_recording(page) if show_debug_panel or instrumentation_log else None
+
+# Função para preparar a página: mostra o estado da cópia local e gera as contas recorrentes vencidas no mês
+# (recurring.py). Sem conexão com o MongoDB, as páginas seguem lendo a cópia local e só as gravações falham.
+def run_startup_tasks():
+    sync = get_expense_sync()
+    last_sync = f"{sync.last_sync:%d/%m/%Y %H:%M:%S}" if sync.last_sync else "-"
+    st.sidebar.caption(f"Cópia local: {sync.mode or 'iniciando'}, última sincronização {last_sync}")
+    if sync.is_online():
+        try:
+            ensure_recurring_expenses()
+            return
+        except PyMongoError as e:
+            sync.last_error = str(e)
+    st.warning(
+        f"Sem conexão com o MongoDB ({sync.last_error}): exibindo a cópia local das despesas. "
+        "As alterações voltam a funcionar quando a conexão for restabelecida."
+    )
 
 # Mostrar a página de acordo com a seleção
-if page == "Despesas por Mês":
-    show_home_page()
-elif page == "Resumo de Despesas":
-    show_summary_page()
-elif page == "Análise Inteligente":
-    show_analysis_page()
-elif page == "Editar Despesas":
-    show_edit_page()
-elif page == "Apagar Despesas":
-    show_delete_page()
-elif page == "Visualizar Anexos":
-    show_view_files_page()
+# A conexão com o MongoDB só é aberta aqui, no primeiro acesso; uma falha aparece na própria página.
+try:
+    run_startup_tasks()
+    if page == "Despesas por Mês":
+        show_home_page()
+    elif page == "Resumo de Despesas":
+        show_summary_page()
+    elif page == "Análise Inteligente":
+        show_analysis_page()
+    elif page == "Editar Despesas":
+        show_edit_page()
+    elif page == "Apagar Despesas":
+        show_delete_page()
+    elif page == "Visualizar Anexos":
+        show_view_files_page()
+    elif page == "Buscar Despesas":
+        show_search_page()
+except ConfigurationError as e:
+    st.error(f"Configuração do MongoDB inválida: {e}")
+except PyMongoError as e:
+    st.error(f"Erro de conexão com o MongoDB: {e}")
+finally:
+    measurements = finish_recording(recorder, instrumentation_log) if recorder else None
+
+if measurements and show_debug_panel:
+    show_instrumentation_panel(measurements)
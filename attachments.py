@@ -0,0 +1,111 @@
+import argparse
+import gridfs
+from pymongo import UpdateOne
+
+from database import DATABASE_NAME, create_client, get_mongodb_uri
+
+# Os binários dos anexos ficam no GridFS; a despesa guarda apenas a referência e os metadados
+ATTACHMENTS_BUCKET = 'attachments'
+
+# Função para obter o bucket do GridFS onde os anexos são gravados
+def get_bucket(db):
+    return gridfs.GridFSBucket(db, bucket_name=ATTACHMENTS_BUCKET)
+
+# Função para gravar um anexo no GridFS e devolver os campos de referência da despesa
+def save_attachment(db, expense_id, name, content_type, data):
+    file_id = get_bucket(db).upload_from_stream(
+        name,
+        data,
+        metadata={"expense_id": expense_id, "content_type": content_type}
+    )
+    return {
+        "attachment_id": file_id,
+        "attachment_name": name,
+        "attachment_type": content_type,
+        "attachment_size": len(data)
+    }
+
+# Função para abrir o anexo como stream (os bytes só trafegam quando lidos)
+def open_attachment(db, file_id):
+    return get_bucket(db).open_download_stream(file_id)
+
+# Função para ler todos os bytes de um anexo
+def load_attachment(db, file_id):
+    with open_attachment(db, file_id) as stream:
+        return stream.read()
+
+# Função para remover anexos do GridFS (ignora os que já não existem)
+def delete_attachments(db, file_ids):
+    bucket = get_bucket(db)
+    for file_id in file_ids:
+        try:
+            bucket.delete(file_id)
+        except gridfs.errors.NoFile:
+            pass
+
+# Função para migrar os anexos gravados dentro das despesas para o GridFS, em lotes
+def migrate_inline_attachments(db, batch_size=50, log=print):
+    expenses = db['expenses']
+    query = {"attachment_data": {"$exists": True}}
+    projection = {"attachment_data": 1, "attachment_name": 1, "attachment_type": 1}
+    migrated = 0
+
+    while True:
+        # Cada lote é buscado de novo: as despesas migradas deixam de casar com o filtro,
+        # então a migração pode ser interrompida e retomada a qualquer momento
+        batch = list(expenses.find(query, projection).limit(batch_size))
+        if not batch:
+            break
+
+        # O filtro confere que o binário lido ainda está na despesa: se ela ganhou outro anexo pelo app
+        # nesse meio tempo, a gravação não casa e o novo anexo não é sobrescrito pelo antigo
+        operations, file_ids = [], []
+        for expense in batch:
+            guard = {"_id": expense["_id"], "attachment_data": {"$exists": True}}
+            data = expense["attachment_data"]
+            if data:
+                reference = save_attachment(
+                    db,
+                    expense["_id"],
+                    expense.get("attachment_name") or "Anexo",
+                    expense.get("attachment_type") or "",
+                    bytes(data)
+                )
+                file_ids.append(reference["attachment_id"])
+                operations.append(UpdateOne(
+                    guard,
+                    {"$set": reference, "$unset": {"attachment_data": ""}, "$inc": {"version": 1}, "$currentDate": {"updated_at": True}}
+                ))
+            else:
+                operations.append(UpdateOne(
+                    guard,
+                    {"$unset": {"attachment_data": "", "attachment_name": "", "attachment_type": ""},
+                     "$inc": {"version": 1}, "$currentDate": {"updated_at": True}}
+                ))
+
+        result = expenses.bulk_write(operations, ordered=False)
+        if result.matched_count < len(operations):
+            # Arquivos gravados para despesas que mudaram antes da gravação ficariam sem referência
+            used = {expense["attachment_id"] for expense in expenses.find({"attachment_id": {"$in": file_ids}}, {"attachment_id": 1})}
+            delete_attachments(db, [file_id for file_id in file_ids if file_id not in used])
+        migrated += result.matched_count
+        log(f"{migrated} despesas migradas...")
+
+    log(f"Migração concluída: {migrated} despesas processadas.")
+    return migrated
+
+# Uso: python attachments.py migrate [--batch-size 50]
+def main():
+    parser = argparse.ArgumentParser(description="Gerenciamento dos anexos das despesas")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    migrate_parser = subparsers.add_parser("migrate", help="Move os anexos das despesas para o GridFS")
+    migrate_parser.add_argument("--batch-size", type=int, default=50)
+    args = parser.parse_args()
+
+    client = create_client(get_mongodb_uri())
+    if args.command == "migrate":
+        migrate_inline_attachments(client[DATABASE_NAME], args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
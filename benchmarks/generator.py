@@ -0,0 +1,108 @@
+import random
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+# Categorias (chaves de categories.py) e pesos aproximados de uma casa: contas fixas aparecem todo mês, o resto varia
+CATEGORY_WEIGHTS = {
+    "agua": 1,
+    "energia": 1,
+    "aluguel": 1,
+    "internet": 1,
+    "alimentacao": 8,
+    "transporte": 5,
+    "saude": 2,
+    "educacao": 1,
+    "lazer": 3,
+    "roupas": 2,
+    "trabalho": 1,
+    "viagem": 1,
+    "outros": 3
+}
+
+# Faixas de valor (R$) por categoria
+AMOUNT_RANGES = {
+    "agua": (60, 180),
+    "energia": (120, 450),
+    "aluguel": (1200, 2500),
+    "internet": (90, 150),
+    "alimentacao": (15, 600),
+    "transporte": (5, 250),
+    "saude": (30, 900),
+    "educacao": (50, 1200),
+    "lazer": (20, 400),
+    "roupas": (40, 600),
+    "trabalho": (20, 800),
+    "viagem": (200, 5000),
+    "outros": (5, 500)
+}
+
+NAMES = {
+    "agua": ["Conta de água"],
+    "energia": ["Conta de luz"],
+    "aluguel": ["Aluguel do apartamento"],
+    "internet": ["Internet fibra"],
+    "alimentacao": ["Mercado", "Padaria", "Restaurante", "Feira", "Delivery"],
+    "transporte": ["Uber", "Combustível", "Ônibus", "Estacionamento"],
+    "saude": ["Farmácia", "Consulta", "Exames"],
+    "educacao": ["Curso online", "Livros", "Mensalidade"],
+    "lazer": ["Cinema", "Streaming", "Show"],
+    "roupas": ["Loja de roupas", "Calçados"],
+    "trabalho": ["Material de escritório", "Coworking"],
+    "viagem": ["Passagem aérea", "Hotel"],
+    "outros": ["Presente", "Diversos"]
+}
+
+ATTACHMENT_TYPES = [("recibo.jpg", "image/jpeg"), ("nota.png", "image/png"), ("boleto.pdf", "application/pdf")]
+
+# Função para gerar despesas sintéticas com o mesmo formato gravado pelo add_expense.
+# inline_attachment_bytes > 0 simula o formato antigo, com o binário do anexo dentro da despesa.
+def generate_expenses(count, seed=42, start=datetime(2020, 1, 1), years=5,
+                      attachment_ratio=0.1, inline_attachment_bytes=0):
+    rng = random.Random(seed)
+    categories = list(CATEGORY_WEIGHTS)
+    weights = list(CATEGORY_WEIGHTS.values())
+    total_days = years * 365
+
+    for index in range(count):
+        category = rng.choices(categories, weights)[0]
+        low, high = AMOUNT_RANGES[category]
+        expense_date = start + timedelta(days=rng.randrange(total_days))
+        is_paid = rng.random() < 0.6
+        expense = {
+            "_id": ObjectId(),
+            "name": f"{rng.choice(NAMES[category])} #{index}",
+            "amount_cents": round(rng.uniform(low, high) * 100),
+            "date": expense_date,
+            "category": category,
+            "notes": rng.choice(["", "", "", "Parcelado", "Compartilhado", "Reembolsável 🙂"]),
+            "is_paid": is_paid,
+            "payment_date": expense_date + timedelta(days=rng.randrange(15)) if is_paid else None
+        }
+
+        if rng.random() < attachment_ratio:
+            attachment_name, attachment_type = rng.choice(ATTACHMENT_TYPES)
+            expense["attachment_name"] = attachment_name
+            expense["attachment_type"] = attachment_type
+            if inline_attachment_bytes:
+                expense["attachment_data"] = rng.getrandbits(8 * inline_attachment_bytes).to_bytes(inline_attachment_bytes, "little")
+            else:
+                expense["attachment_id"] = ObjectId()
+                expense["attachment_size"] = rng.randrange(20_000, 2_000_000)
+
+        yield expense
+
+# Função para gravar as despesas geradas em lotes de insert_many
+def load_expenses(collection, expenses, batch_size=10_000):
+    batch = []
+    inserted = 0
+    for expense in expenses:
+        batch.append(expense)
+        if len(batch) >= batch_size:
+            collection.insert_many(batch, ordered=False)
+            inserted += len(batch)
+            batch = []
+    if batch:
+        collection.insert_many(batch, ordered=False)
+        inserted += len(batch)
+    return inserted
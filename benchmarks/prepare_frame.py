@@ -0,0 +1,63 @@
+import argparse
+import time
+
+import pandas as pd
+
+from benchmarks.generator import generate_expenses
+from frames import SUMMARY_FIELDS, prepare_expenses_frame, to_display_frame
+
+# Preparação antiga das páginas: data vira texto e é convertida de volta duas vezes, valor (float em reais)
+# convertido linha a linha
+def legacy_prepare(rows):
+    df = pd.DataFrame(rows)
+    df['date'] = pd.to_datetime(df['date']).dt.strftime('%d/%m/%Y')
+    df['payment_date'] = pd.to_datetime(df['payment_date'], errors='coerce')
+    df['payment_date'] = df['payment_date'].dt.strftime('%d/%m/%Y')
+    df.rename(columns={
+        "name": "Descrição",
+        "amount": "Valor (R$)",
+        "category": "Categoria",
+        "date": "Data",
+        "is_paid": "Paga",
+        "payment_date": "Data de Pagamento",
+        "notes": "Observações"
+    }, inplace=True)
+    df['Mês'] = pd.to_datetime(df['Data'], format='%d/%m/%Y').dt.month
+    df['Ano'] = pd.to_datetime(df['Data'], format='%d/%m/%Y').dt.year
+    df['Valor (R$)'] = df['Valor (R$)'].apply(lambda x: float(str(x).replace(',', '.')))
+    return df, df['Valor (R$)'].sum()
+
+# Preparação atual: datetime64 mantido (formatado pelo st.dataframe), mês/ano via .dt e soma dos centavos em int64
+def vectorized_prepare(rows):
+    df = prepare_expenses_frame(rows, SUMMARY_FIELDS)
+    return to_display_frame(df, SUMMARY_FIELDS), df['amount_cents'].sum()
+
+# Função para medir o melhor tempo entre várias repetições
+def best_time(function, rows, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(rows)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+# Uso: python -m benchmarks.prepare_frame [--rows 100000] [--repeat 3]
+def main():
+    parser = argparse.ArgumentParser(description="Compara a preparação antiga e a vetorizada do DataFrame de despesas")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rows = list(generate_expenses(args.rows))
+    # A versão antiga recebe o formato antigo, com o valor em reais no campo amount
+    legacy_rows = [{**row, "amount": row["amount_cents"] / 100} for row in rows]
+    legacy = best_time(legacy_prepare, legacy_rows, args.repeat)
+    vectorized = best_time(vectorized_prepare, rows, args.repeat)
+    print(f"Linhas: {args.rows}")
+    print(f"Preparação antiga:     {legacy * 1000:.1f} ms")
+    print(f"Preparação vetorizada: {vectorized * 1000:.1f} ms")
+    print(f"Ganho: {legacy / vectorized:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
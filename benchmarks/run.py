@@ -0,0 +1,240 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+
+from analytics import YearAnalytics
+from anomalies import detect_anomalies
+from benchmarks.generator import generate_expenses, load_expenses
+from categories import RENT_CATEGORY
+from database import ensure_indexes
+from forecasting import MonthlySeries, fit_forecast
+from frames import (
+    DELETE_COLUMNS,
+    DELETE_FIELDS,
+    EDIT_FIELDS,
+    SUMMARY_FIELDS,
+    VIEW_FILES_FIELDS,
+    prepare_expenses_frame,
+    to_display_frame,
+    to_editor_frame,
+)
+from local_store import ExpenseSync, LocalStore
+from queries import get_date_range
+from search import search_local
+from warehouse import Warehouse
+
+BENCHMARK_DATABASE = 'PersonalFinancesBenchmark'
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+DATASET_START = datetime(2020, 1, 1)
+DATASET_YEARS = 5
+
+# Função para abrir o banco usado nas medições: mongomock (em memória) ou um mongod local
+def open_database(backend, uri):
+    if backend == "mongomock":
+        import mongomock
+        client = mongomock.MongoClient()
+    else:
+        from pymongo import MongoClient
+        client = MongoClient(uri)
+    client.drop_database(BENCHMARK_DATABASE)
+    return client[BENCHMARK_DATABASE]
+
+# Preparação da página de análise a partir dos totais do ano na cópia local (mesmas séries do show_analysis_page)
+def prepare_analysis(store, year):
+    analytics = YearAnalytics.from_rollups(store.totals_by_day_and_category(*get_date_range(year)))
+    analytics.monthly_pct_change
+    return analytics.daily_without(RENT_CATEGORY)
+
+# Atualização incremental da análise após a alteração de uma despesa (uma célula dia x categoria)
+def update_analysis(store, analytics, year):
+    key = (datetime(year, 6, 15), "alimentacao")
+    return analytics.with_cells(store.totals_for_cells([key])).daily_without(RENT_CATEGORY)
+
+# Função para montar a cópia local (local_store.py), de onde as páginas leem, a partir das despesas carregadas
+def build_local_store(db, directory):
+    store = LocalStore(os.path.join(directory, "expenses.sqlite3"))
+    store.replace_all([list(db['expenses'].find({}, {"attachment_data": 0}))])
+    return store
+
+# Função para montar o snapshot colunar (warehouse.py) a partir da cópia local
+def build_warehouse(store, directory):
+    warehouse = Warehouse(os.path.join(directory, "analytics"))
+    warehouse.refresh(store)
+    return warehouse
+
+# Gravação na cópia local de despesas alteradas (a cada chamada o valor muda, para que nenhuma seja ignorada
+# como igual à já gravada): linhas, totais mensais e índice de busca, como em cada sincronização
+def make_apply_changes(store, documents):
+    calls = [0]
+
+    def apply_changes():
+        calls[0] += 1
+        store.apply([{**document, "amount_cents": document.get("amount_cents", 0) + calls[0]} for document in documents])
+    return apply_changes
+
+# Operações medidas: as leituras das páginas na cópia local, a sincronização e o preparo de dados de cada página
+def build_targets(db, store, warehouse, year, month):
+    month_range = get_date_range(year, month)
+    analytics = YearAnalytics.from_rollups(store.totals_by_day_and_category(*get_date_range(year)))
+    series_end = datetime(DATASET_START.year + DATASET_YEARS, 1, 1)
+    series = MonthlySeries.from_rollups(store.totals_by_month_and_category(series_end), series_end)
+    # Despesas do mês, usadas para medir a leitura de uma página e a sincronização depois de uma edição em lote
+    edited = store.find_expenses(*month_range)[:50]
+    sync = ExpenseSync(db['expenses'], store)
+    return {
+        "find_expenses": store.find_expenses,
+        "find_expenses_page": lambda: store.find_expenses_page(*month_range, SUMMARY_FIELDS),
+        "find_expenses_page_by_name": lambda: store.find_expenses_page(*month_range, SUMMARY_FIELDS, sort_field="name", descending=False),
+        "expenses_total": lambda: store.expenses_total(*month_range),
+        "month_category_totals": lambda: store.month_category_totals(year, month),
+        "group_expenses_by_month": store.totals_by_month,
+        "group_expenses_by_category": lambda: store.totals_by_category(*month_range),
+        "group_expenses_by_day": lambda: store.totals_by_day(*month_range),
+        "local_store_apply": make_apply_changes(store, edited),
+        "sync_refresh": lambda: sync.refresh(expense["_id"] for expense in edited),
+        "search": lambda: search_local(store, "mercado"),
+        "search_fuzzy": lambda: search_local(store, "mercdo"),
+        "summary_page": lambda: to_display_frame(
+            prepare_expenses_frame(store.find_expenses(*month_range, SUMMARY_FIELDS), SUMMARY_FIELDS),
+            SUMMARY_FIELDS
+        ),
+        "edit_page": lambda: prepare_expenses_frame(store.find_expenses(*month_range, EDIT_FIELDS), EDIT_FIELDS),
+        "delete_page": lambda: to_editor_frame(
+            prepare_expenses_frame(store.find_expenses(*month_range, DELETE_FIELDS), DELETE_FIELDS),
+            DELETE_COLUMNS
+        ),
+        "analysis_page": lambda: prepare_analysis(store, year),
+        "analysis_page_incremental": lambda: update_analysis(store, analytics, year),
+        "anomalies": lambda: detect_anomalies(store.totals_by_day_and_category()),
+        "forecast_fit": lambda: fit_forecast(series.values).predict(2),
+        "view_files_page": lambda: prepare_expenses_frame(
+            store.find_expenses(*month_range, VIEW_FILES_FIELDS),
+            VIEW_FILES_FIELDS
+        ),
+        "warehouse_monthly_totals": warehouse.monthly_totals,
+        "multi_year_report": lambda: (warehouse.year_over_year(year), warehouse.category_totals(), warehouse.daily_peaks()),
+    }
+
+# Função para medir uma operação várias vezes e resumir os tempos em milissegundos
+def measure(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - started) * 1000)
+    return {"best_ms": round(min(timings), 3), "median_ms": round(statistics.median(timings), 3), "repeat": repeat}
+
+# Função para gerar, carregar e medir um conjunto de dados de um tamanho
+def run_size(backend, uri, size, repeat, attachment_ratio, inline_attachment_bytes, targets_filter, log):
+    db = open_database(backend, uri)
+    # O mongomock não usa índices nas consultas e só ficaria mais lento ao mantê-los
+    if backend == "mongod":
+        ensure_indexes(db)
+
+    started = time.perf_counter()
+    load_expenses(db['expenses'], generate_expenses(
+        size,
+        start=DATASET_START,
+        years=DATASET_YEARS,
+        attachment_ratio=attachment_ratio,
+        inline_attachment_bytes=inline_attachment_bytes
+    ))
+    log(f"[{size}] dados carregados em {time.perf_counter() - started:.1f} s")
+
+    # Mês e ano do meio do período gerado
+    year, month = DATASET_START.year + DATASET_YEARS // 2, 6
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        started = time.perf_counter()
+        store = build_local_store(db, directory)
+        log(f"[{size}] cópia local gerada em {time.perf_counter() - started:.1f} s")
+        started = time.perf_counter()
+        warehouse = build_warehouse(store, directory)
+        log(f"[{size}] snapshot colunar gerado em {time.perf_counter() - started:.1f} s")
+        for name, function in build_targets(db, store, warehouse, year, month).items():
+            if targets_filter and name not in targets_filter:
+                continue
+            result = {"size": size, "target": name, **measure(function, repeat)}
+            log(f"[{size}] {name}: {result['best_ms']:.1f} ms")
+            results.append(result)
+    return results
+
+# Função para listar as medições que ficaram mais lentas que a referência além da tolerância
+def find_regressions(results, baseline, tolerance):
+    reference = {(item["size"], item["target"]): item["best_ms"] for item in baseline["results"]}
+    regressions = []
+    for item in results:
+        previous = reference.get((item["size"], item["target"]))
+        if previous and item["best_ms"] > previous * (1 + tolerance):
+            regressions.append({**item, "baseline_ms": previous, "ratio": round(item["best_ms"] / previous, 2)})
+    return regressions
+
+# Função para identificar o commit medido
+def get_git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# Uso: python -m benchmarks.run --sizes 1000 10000 --output resultados.json [--baseline anterior.json]
+def main():
+    parser = argparse.ArgumentParser(description="Mede as consultas e o preparo de dados das páginas do app")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Quantidades de despesas geradas")
+    parser.add_argument("--backend", choices=["mongomock", "mongod"], default="mongomock")
+    parser.add_argument("--uri", default="mongodb://localhost:27017", help="URI do mongod local (backend mongod)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--attachment-ratio", type=float, default=0.1)
+    parser.add_argument("--inline-attachment-bytes", type=int, default=0,
+                        help="Grava anexos dentro das despesas (formato antigo) com este tamanho")
+    parser.add_argument("--targets", nargs="+", help="Mede apenas estas operações")
+    parser.add_argument("--output", help="Arquivo JSON de saída (padrão: stdout)")
+    parser.add_argument("--baseline", help="JSON de uma execução anterior para detectar regressões")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Piora relativa aceita antes de acusar regressão")
+    args = parser.parse_args()
+
+    def log(message):
+        print(message, file=sys.stderr)
+
+    results = []
+    for size in args.sizes:
+        results.extend(run_size(
+            args.backend, args.uri, size, args.repeat,
+            args.attachment_ratio, args.inline_attachment_bytes, args.targets, log
+        ))
+
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_commit": get_git_commit(),
+        "backend": args.backend,
+        "python": platform.python_version(),
+        "results": results
+    }
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            report["regressions"] = find_regressions(results, json.load(file), args.tolerance)
+        for regression in report["regressions"]:
+            log(f"REGRESSÃO [{regression['size']}] {regression['target']}: "
+                f"{regression['baseline_ms']:.1f} ms -> {regression['best_ms']:.1f} ms ({regression['ratio']}x)")
+        exit_code = 1 if report["regressions"] else 0
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output)
+    else:
+        print(output)
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
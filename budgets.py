@@ -0,0 +1,109 @@
+import argparse
+import calendar
+from datetime import datetime
+
+from categories import category_label, normalize_category
+from database import DATABASE_NAME, create_client, ensure_indexes, get_mongodb_uri, get_write_time
+from money import format_brl, to_cents
+
+# Coleção com o limite mensal de cada categoria (um documento por categoria, em centavos)
+BUDGETS_COLLECTION = 'budgets'
+
+# Parcela do limite a partir da qual a categoria pede atenção, mesmo com a projeção dentro do limite
+WARNING_RATIO = 0.8
+
+# Situação de cada categoria, da mais grave para a mais tranquila
+OVER_BUDGET = "estourado"
+PROJECTED_OVER = "vai estourar"
+WARNING = "atenção"
+ON_TRACK = "ok"
+STATUS_ORDER = [OVER_BUDGET, PROJECTED_OVER, WARNING, ON_TRACK]
+
+# Função para gravar (ou trocar) o limite mensal de uma categoria
+def set_budget(db, category, amount):
+    limit_cents = to_cents(amount)
+    if limit_cents <= 0:
+        raise ValueError("O limite deve ser maior que zero")
+    category = normalize_category(category)
+    db[BUDGETS_COLLECTION].update_one(
+        {"category": category},
+        {"$set": {"limit_cents": limit_cents, "updated_at": get_write_time()}},
+        upsert=True
+    )
+    return category, limit_cents
+
+def remove_budget(db, category):
+    return db[BUDGETS_COLLECTION].delete_one({"category": normalize_category(category)}).deleted_count
+
+# Função para ler os limites: {categoria: limite em centavos}
+def load_budgets(db):
+    return {budget["category"]: budget["limit_cents"] for budget in db[BUDGETS_COLLECTION].find({}, {"_id": 0})}
+
+# Função para avaliar os limites de um mês a partir dos totais do mês por categoria ({categoria: (total, contas fixas)}).
+# O ritmo de gasto (burn rate) considera só as despesas variáveis: as contas fixas do mês já estão lançadas
+# (recurring.py) e entram na projeção pelo valor, sem serem extrapoladas até o fim do mês.
+def evaluate_budgets(budgets, totals, year, month, today=None):
+    today = today or datetime.today()
+    days_in_month = calendar.monthrange(year, month)[1]
+    if (year, month) == (today.year, today.month):
+        elapsed = today.day
+    elif (year, month) < (today.year, today.month):
+        elapsed = days_in_month
+    else:
+        elapsed = 0
+    remaining_days = days_in_month - elapsed
+
+    statuses = []
+    for category, limit_cents in budgets.items():
+        spent_cents, fixed_cents = totals.get(category, (0, 0))
+        daily_rate = (spent_cents - fixed_cents) / elapsed if elapsed else 0
+        projected_cents = spent_cents + round(daily_rate * remaining_days)
+        if spent_cents > limit_cents:
+            status = OVER_BUDGET
+        elif projected_cents > limit_cents:
+            status = PROJECTED_OVER
+        elif spent_cents >= WARNING_RATIO * limit_cents:
+            status = WARNING
+        else:
+            status = ON_TRACK
+        statuses.append({
+            "category": category,
+            "limit_cents": limit_cents,
+            "spent_cents": spent_cents,
+            "used": spent_cents / limit_cents,
+            "daily_rate_cents": round(daily_rate),
+            "projected_cents": projected_cents,
+            # Quanto ainda pode ser gasto por dia até o fim do mês sem passar do limite
+            "daily_allowance_cents": max(limit_cents - spent_cents, 0) // remaining_days if remaining_days else 0,
+            "status": status
+        })
+    return sorted(statuses, key=lambda item: (STATUS_ORDER.index(item["status"]), -item["used"]))
+
+# Uso: python budgets.py set alimentacao 1.500,00
+#      python budgets.py remove alimentacao
+#      python budgets.py list
+def main():
+    parser = argparse.ArgumentParser(description="Orçamento mensal por categoria")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    set_parser = subparsers.add_parser("set", help="Define o limite mensal de uma categoria")
+    set_parser.add_argument("category")
+    set_parser.add_argument("amount", help="Limite em reais (ex.: 1500 ou 1.500,00)")
+    remove_parser = subparsers.add_parser("remove", help="Remove o limite de uma categoria")
+    remove_parser.add_argument("category")
+    subparsers.add_parser("list", help="Lista os limites definidos")
+    args = parser.parse_args()
+
+    db = create_client(get_mongodb_uri())[DATABASE_NAME]
+    if args.command == "set":
+        ensure_indexes(db)
+        category, limit_cents = set_budget(db, args.category, args.amount)
+        print(f"Limite de {category_label(category)}: {format_brl(limit_cents)} por mês.")
+    elif args.command == "remove":
+        print("Limite removido." if remove_budget(db, args.category) else "Nenhum limite definido para essa categoria.")
+    else:
+        for category, limit_cents in sorted(load_budgets(db).items()):
+            print(f"{category_label(category):<15} {format_brl(limit_cents):>14}")
+
+
+if __name__ == "__main__":
+    main()
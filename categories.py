@@ -0,0 +1,98 @@
+import argparse
+
+from pymongo import UpdateMany
+
+from database import DATABASE_NAME, create_client, get_mongodb_uri
+
+# Registro das categorias: chave compacta gravada nas despesas -> (nome exibido, emoji do formulário).
+# Os nomes só são aplicados na hora de exibir; o banco guarda sempre a chave.
+CATEGORIES = {
+    "agua": ("Água", "💧"),
+    "energia": ("Energia", "⚡"),
+    "aluguel": ("Aluguel", "🏠"),
+    "internet": ("Internet", "🌐"),
+    "alimentacao": ("Alimentação", "🍔"),
+    "transporte": ("Transporte", "🚌"),
+    "saude": ("Saúde", "🏥"),
+    "educacao": ("Educação", "📚"),
+    "lazer": ("Lazer", "🎉"),
+    "roupas": ("Roupas", "👗"),
+    "trabalho": ("Trabalho", "💼"),
+    "viagem": ("Viagem", "🏖️"),
+    "outros": ("Outros", "")
+}
+DEFAULT_CATEGORY = "outros"
+RENT_CATEGORY = "aluguel"
+CATEGORY_KEYS = list(CATEGORIES)
+CATEGORY_LABELS = {key: label for key, (label, _) in CATEGORIES.items()}
+
+# Índice de busca (em minúsculas) com a chave, o nome e o nome com emoji de cada categoria
+_LOOKUP = {
+    alias: key
+    for key, (label, emoji) in CATEGORIES.items()
+    for alias in (key, label.lower(), f"{emoji} {label}".strip().lower())
+}
+
+# Função para obter a chave gravada a partir de um nome, com ou sem emoji, ou da própria chave.
+# Categorias fora do registro (ex.: criadas em arquivos importados) são gravadas como vieram.
+def normalize_category(category):
+    category = " ".join((category or "").split())
+    if not category:
+        return DEFAULT_CATEGORY
+    key = _LOOKUP.get(category.lower())
+    if key is None and " " in category:
+        # Emoji desconhecido antes do nome: "🐶 Pets" -> "Pets"
+        prefix, rest = category.split(" ", 1)
+        if not prefix.isalnum():
+            category = rest
+            key = _LOOKUP.get(category.lower())
+    return key or category
+
+# Função para exibir o nome de uma categoria gravada
+def category_label(key):
+    return CATEGORY_LABELS.get(key, key)
+
+# Função para exibir a categoria com o emoji, como nas opções do formulário de inclusão
+def category_option(key):
+    label, emoji = CATEGORIES.get(key, (key, ""))
+    return f"{emoji} {label}".strip()
+
+# Função para gravar as categorias existentes como chaves do registro. Como o número de valores
+# distintos é pequeno, cada um vira um UpdateMany, enviados em lotes de bulk_write.
+def migrate_categories(db, batch_size=100, log=print):
+    expenses = db['expenses']
+    operations = []
+    migrated = 0
+    for item in expenses.aggregate([{"$group": {"_id": "$category", "count": {"$sum": 1}}}]):
+        current = item["_id"]
+        key = normalize_category(current if isinstance(current, str) else None)
+        if key == current:
+            continue
+        operations.append(UpdateMany({"category": current}, {
+            "$set": {"category": key}, "$inc": {"version": 1}, "$currentDate": {"updated_at": True}
+        }))
+        migrated += item["count"]
+        log(f"{current!r} -> {key!r}: {item['count']} despesas")
+        if len(operations) >= batch_size:
+            expenses.bulk_write(operations, ordered=False)
+            operations = []
+    if operations:
+        expenses.bulk_write(operations, ordered=False)
+
+    log(f"Migração concluída: {migrated} despesas atualizadas.")
+    return migrated
+
+# Uso: python categories.py migrate
+def main():
+    parser = argparse.ArgumentParser(description="Manutenção das categorias das despesas")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("migrate", help="Grava as categorias existentes como chaves do registro")
+    args = parser.parse_args()
+
+    client = create_client(get_mongodb_uri())
+    if args.command == "migrate":
+        migrate_categories(client[DATABASE_NAME])
+
+
+if __name__ == "__main__":
+    main()
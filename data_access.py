@@ -0,0 +1,390 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import bson
+import streamlit as st
+from bson import ObjectId
+from pymongo.errors import ConnectionFailure, PyMongoError
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+from analytics import AnalyticsStore
+from anomalies import ANOMALY_FIELDS, DEFAULT_METHOD, build_anomaly_table, detect_anomalies, get_anomaly_cells
+from budgets import evaluate_budgets, load_budgets, remove_budget, set_budget
+from categories import migrate_categories
+from forecasting import AUTO_MODEL, fit_forecast, load_monthly_series
+from instrumentation import record_timing, timed_section
+from database import DATABASE_NAME, get_client, get_database, get_setting
+from local_store import DEFAULT_LOCAL_STORE_PATH, ExpenseSync, LocalStore
+from money import migrate_amounts
+from queries import get_date_range
+from recurring import current_period, materialize_due
+from search import SEARCH_FIELDS, SEARCH_PAGE_SIZE, search_local, search_text_index
+from warehouse import DEFAULT_WAREHOUSE_PATH, Warehouse
+
+# Tempo máximo que um resultado fica em cache, caso outra instância do app altere os dados
+CACHE_TTL_SECONDS = 600
+CACHE_MAX_ENTRIES = 256
+
+# Tempo máximo de espera pela primeira cópia local das despesas (só quando ainda não há cópia no disco)
+LOCAL_STORE_FIRST_COPY_TIMEOUT_SECONDS = 300
+
+# Threads usadas para buscar em paralelo as consultas independentes de uma página (menor que o pool do MongoClient)
+QUERY_WORKERS = 8
+
+# Campos aceitos para ordenar a tabela paginada (sempre desempatados pelo _id)
+PAGE_SORT_FIELDS = ("date", "amount_cents", "name")
+
+# Versões dos dados por mês: cada escrita incrementa a versão dos meses afetados, e como a versão
+# faz parte da chave do cache, apenas as consultas desses meses deixam de ser servidas da memória
+class DataVersions:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._months = {}
+        self._global = 0
+
+    def month(self, year, month):
+        return self._months.get((int(year), int(month)), 0)
+
+    def year(self, year):
+        return tuple(self.month(year, month) for month in range(1, 13))
+
+    def all(self):
+        return self._global
+
+    # Soma das versões dos meses anteriores a (ano, mês): muda sempre que um desses meses é alterado
+    def before(self, year, month):
+        return sum(version for key, version in list(self._months.items()) if key < (int(year), int(month)))
+
+    def bump(self, months):
+        with self._lock:
+            for year, month in months:
+                key = (int(year), int(month))
+                self._months[key] = self._months.get(key, 0) + 1
+            self._global += 1
+
+# Versões compartilhadas por todas as sessões do processo
+@st.cache_resource
+def get_data_versions():
+    return DataVersions()
+
+# Análises anuais compartilhadas por todas as sessões do processo
+@st.cache_resource
+def get_analytics_store():
+    return AnalyticsStore(CACHE_TTL_SECONDS)
+
+# Snapshot colunar (warehouse.py) dos relatórios de vários anos, compartilhado por todas as sessões do processo
+@st.cache_resource
+def get_warehouse():
+    return Warehouse(get_setting("ANALYTICS_PATH", DEFAULT_WAREHOUSE_PATH))
+
+# Cópia local das despesas (local_store.py), compartilhada por todas as sessões do processo. A sincronização
+# roda em segundo plano, e cada alteração recebida (deste ou de outro processo) invalida o cache apenas
+# dos meses e células (dia, categoria) afetados.
+@st.cache_resource
+def get_expense_sync():
+    store = LocalStore(get_setting("LOCAL_STORE_PATH", DEFAULT_LOCAL_STORE_PATH))
+    versions = get_data_versions()
+    analytics = get_analytics_store()
+    warehouse = get_warehouse()
+
+    def on_change(cells):
+        if cells is None:
+            # A cópia inteira foi refeita
+            analytics.clear()
+            warehouse.mark_all()
+            st.cache_data.clear()
+            return
+        # As análises anuais atualizam só as células alteradas e o snapshot só os meses alterados;
+        # a ordem importa: as alterações são registradas antes de a versão mudar
+        months = get_months(day for day, _ in cells)
+        analytics.mark_changed(cells)
+        warehouse.mark_changed(months)
+        versions.bump(months)
+
+    use_change_streams = str(get_setting("LOCAL_STORE_CHANGE_STREAMS", "true")).lower() not in ("false", "0", "no")
+    return ExpenseSync(get_client()[DATABASE_NAME]['expenses'], store, on_change, use_change_streams).start()
+
+# Função para obter a cópia local para leitura. Só a primeira execução, sem cópia no disco, espera a cópia inicial;
+# depois disso as páginas leem a cópia mesmo sem conexão com o MongoDB.
+def get_local_store():
+    sync = get_expense_sync()
+    if not sync.ready.is_set():
+        with st.spinner("Copiando as despesas do MongoDB para a cópia local..."):
+            deadline = time.perf_counter() + LOCAL_STORE_FIRST_COPY_TIMEOUT_SECONDS
+            # Sem cópia e sem conexão não há o que mostrar: o erro da sincronização aparece na página
+            while not sync.ready.wait(0.5):
+                if sync.last_error or time.perf_counter() > deadline:
+                    raise ConnectionFailure(f"Cópia local das despesas indisponível: {sync.last_error or 'tempo esgotado'}")
+    return sync.store
+
+# Threads compartilhadas por todas as sessões; o MongoClient é seguro para uso entre threads
+@st.cache_resource
+def get_query_executor():
+    return ThreadPoolExecutor(max_workers=QUERY_WORKERS, thread_name_prefix="consultas")
+
+# Função para executar ao mesmo tempo as leituras independentes de uma página. Recebe {nome: função sem
+# argumentos} e devolve {nome: resultado}; a página espera todas antes de desenhar, e o tempo de espera
+# passa a ser o da consulta mais lenta em vez da soma de todas. O tempo de cada uma vai para o painel
+# de desempenho (instrumentation.py).
+def run_queries(queries):
+    # A cópia local é preparada na thread da página, que é a que exibe os spinners
+    get_local_store()
+    ctx = get_script_run_ctx()
+
+    def timed(function):
+        # O contexto da sessão permite usar o st.cache_data dentro da thread (e atribuir a ela os comandos medidos)
+        add_script_run_ctx(threading.current_thread(), ctx)
+        started = time.perf_counter()
+        return function(), (time.perf_counter() - started) * 1000
+
+    with timed_section(f"run_queries ({len(queries)} em paralelo)", "consulta"):
+        futures = {name: get_query_executor().submit(timed, function) for name, function in queries.items()}
+        results = {}
+        for name, future in futures.items():
+            results[name], elapsed = future.result()
+            record_timing(name, "consulta", elapsed)
+    return results
+
+# Função para obter os meses (ano, mês) de uma lista de datas ou pares (ano, mês)
+def get_months(dates):
+    return {(d.year, d.month) if isinstance(d, datetime) else tuple(d) for d in dates if d is not None}
+
+# Função para invalidar o cache dos meses afetados por uma escrita (recebe datas ou pares (ano, mês)).
+# Usada nas escritas sem a lista de despesas (importação, contas recorrentes, conflitos de versão): a cópia
+# local busca antes as despesas com updated_at recente.
+def invalidate_months(dates):
+    months = get_months(dates)
+    if months:
+        get_expense_sync().catch_up()
+        # Sem saber quais dias mudaram, as análises desses anos são recalculadas por inteiro
+        get_analytics_store().discard({year for year, _ in months})
+        get_data_versions().bump(months)
+
+# Função para registrar uma escrita: atualiza a cópia local, que invalida o cache dos meses afetados.
+# Recebe as despesas como eram antes (old) e como ficaram depois (new) da escrita.
+def record_expense_changes(old_expenses=(), new_expenses=()):
+    old_expenses = [expense for expense in old_expenses if expense]
+    new_expenses = [expense for expense in new_expenses if expense]
+    # As despesas gravadas são lidas de novo pelo _id (as apagadas saem da cópia) antes de a página
+    # recarregar, sem esperar a sincronização em segundo plano
+    get_expense_sync().refresh(expense["_id"] for expense in old_expenses + new_expenses if "_id" in expense)
+
+# Função para registrar um conflito de versão (despesas alteradas ou apagadas por outra sessão): a cópia
+# local lê de novo essas despesas pelo _id, porque quem as alterou pode não ter gravado updated_at, e
+# uma nova tentativa sobre a versão antiga da cópia voltaria a falhar
+def record_expense_conflicts(expenses):
+    expenses = [expense for expense in expenses if expense]
+    get_expense_sync().refresh(expense["_id"] for expense in expenses if "_id" in expense)
+    invalidate_months([expense.get("date") for expense in expenses])
+
+# Uma vez por processo, categorias gravadas antes do registro (nomes, emojis) viram chaves
+@st.cache_resource(show_spinner="Atualizando as categorias...")
+def ensure_categories():
+    if migrate_categories(get_database(), log=lambda message: None):
+        # A cópia local e as consultas já em cache ainda trazem as categorias antigas
+        get_expense_sync().catch_up()
+        st.cache_data.clear()
+        get_analytics_store().clear()
+    return True
+
+# Valores antigos (float em reais) são convertidos em centavos uma vez por processo, antes das categorias
+@st.cache_resource(show_spinner="Convertendo os valores das despesas para centavos...")
+def ensure_amounts():
+    if migrate_amounts(get_database(), log=lambda message: None):
+        get_expense_sync().catch_up()
+        st.cache_data.clear()
+        get_analytics_store().clear()
+    return True
+
+# As contas recorrentes vencidas até o mês atual são geradas uma vez por mês em cada processo
+# (a chave do cache é o período); a geração em si é idempotente, então vários processos não duplicam nada
+@st.cache_resource(show_spinner="Gerando as despesas recorrentes...")
+def _ensure_recurring(period):
+    ensure_amounts()
+    ensure_categories()
+    result = materialize_due(get_database(), period)
+    invalidate_months(result["months"])
+    return result
+
+def ensure_recurring_expenses():
+    return _ensure_recurring(current_period())
+
+# Consultas em cache, todas servidas pela cópia local: o argumento `version` só existe para compor a chave do cache
+@st.cache_data(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def _cached_expenses(year, month, fields, version):
+    period = get_date_range(year, month) if year is not None else (None, None)
+    return get_local_store().find_expenses(*period, fields)
+
+# O cursor da página carrega um ObjectId, que o st.cache_data não sabe hashear sozinho
+@st.cache_data(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, show_spinner=False, hash_funcs={ObjectId: str})
+def _cached_expenses_page(year, month, fields, filters, sort_field, descending, after, page_size, version):
+    return get_local_store().find_expenses_page(
+        *get_date_range(year, month), fields, filters, sort_field, descending, after, page_size
+    )
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def _cached_expenses_total(year, month, filters, version):
+    return get_local_store().expenses_total(*get_date_range(year, month), filters)
+
+# Os gráficos usam os totais agregados na cópia local
+@st.cache_data(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def _cached_expenses_by_month(version):
+    return get_local_store().totals_by_month()
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def _cached_expenses_by_category(month, year, version):
+    return get_local_store().totals_by_category(*get_date_range(year, month))
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def _cached_expenses_by_day(month, year, version):
+    return get_local_store().totals_by_day(*get_date_range(year, month))
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def _cached_monthly_series(end, version):
+    return load_monthly_series(get_local_store(), end)
+
+# O cache usa o conteúdo da matriz de totais como chave: os modelos só são ajustados de novo
+# quando algum total mensal muda (editar a descrição de uma despesa, por exemplo, não refaz o ajuste)
+@st.cache_data(max_entries=16, show_spinner="Ajustando os modelos de previsão...")
+def _cached_forecast_fit(values, model):
+    return fit_forecast(values, model)
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def _cached_anomalies(method, version):
+    store = get_local_store()
+    cells, days = detect_anomalies(store.totals_by_day_and_category(), method)
+    return build_anomaly_table(cells, store.find_expenses_in_cells(get_anomaly_cells(cells), ANOMALY_FIELDS)), days
+
+# Função para ler uma despesa da cópia local (sem os binários de anexos antigos)
+def get_expense(expense_id, fields=None):
+    return get_local_store().find_expense(expense_id, fields)
+
+# Função para listar as despesas de um mês/ano (ou de um ano inteiro) servindo do cache quando possível
+def get_expenses(year=None, month=None, fields=None):
+    versions = get_data_versions()
+    if year is None:
+        version = versions.all()
+    elif month is None:
+        version = versions.year(year)
+    else:
+        version = versions.month(year, month)
+    year = int(year) if year is not None else None
+    month = int(month) if month is not None else None
+    return _cached_expenses(year, month, tuple(fields) if fields else None, version)
+
+# Função para buscar uma página da tabela de despesas de um mês (ver LocalStore.find_expenses_page)
+def get_expenses_page(year, month, fields, filters=None, sort_field="date", descending=True, after=None, page_size=50):
+    if sort_field not in PAGE_SORT_FIELDS:
+        raise ValueError(f"Campo de ordenação inválido: {sort_field}")
+    return _cached_expenses_page(
+        int(year), int(month), tuple(fields), filters, sort_field, bool(descending), after, int(page_size),
+        get_data_versions().month(year, month)
+    )
+
+# Função para obter o total (em centavos) e a quantidade de despesas de um mês com os filtros aplicados
+def get_expenses_total(year, month, filters=None):
+    return _cached_expenses_total(int(year), int(month), filters, get_data_versions().month(year, month))
+
+def group_expenses_by_month():
+    return _cached_expenses_by_month(get_data_versions().all())
+
+def group_expenses_by_category(month, year):
+    return _cached_expenses_by_category(int(month), int(year), get_data_versions().month(year, month))
+
+def group_expenses_by_day(month, year):
+    return _cached_expenses_by_day(int(month), int(year), get_data_versions().month(year, month))
+
+# Função para obter as séries da página de análise de um ano (ver analytics.AnalyticsStore)
+def get_year_analytics(year):
+    year = int(year)
+    store = get_local_store()
+    return get_analytics_store().get(
+        year,
+        lambda: get_data_versions().year(year),
+        lambda year: store.totals_by_day_and_category(*get_date_range(year)),
+        store.totals_for_cells
+    )
+
+# Limites do orçamento. A última leitura fica guardada na cópia local, para a página continuar
+# mostrando o orçamento sem conexão com o MongoDB.
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def get_budgets():
+    store = get_local_store()
+    try:
+        budgets = load_budgets(get_database())
+    except PyMongoError:
+        saved = store.get_state("budgets")
+        return bson.decode(saved) if saved else {}
+    store.set_state("budgets", bson.encode(budgets))
+    return budgets
+
+# Função para gravar ou remover (limite zero) o limite de uma categoria
+def save_budget(category, amount):
+    if amount:
+        set_budget(get_database(), category, amount)
+    else:
+        remove_budget(get_database(), category)
+    get_budgets.clear()
+
+# Totais do mês por categoria, mantidos pela cópia local a cada escrita (sem somar as despesas do mês)
+@st.cache_data(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def _cached_month_category_totals(year, month, version):
+    return get_local_store().month_category_totals(year, month)
+
+# Função para avaliar o orçamento de um mês: gasto, projeção até o fim do mês e situação de cada categoria
+def get_budget_status(year, month):
+    totals = _cached_month_category_totals(int(year), int(month), get_data_versions().month(year, month))
+    return evaluate_budgets(get_budgets(), totals, int(year), int(month))
+
+# Relatórios de vários anos: comparação de cada mês com o ano anterior, total por categoria e ano
+# (tendência) e maiores picos diários de todo o histórico. O snapshot é atualizado antes da consulta,
+# só nos meses alterados desde a última.
+@st.cache_data(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def _cached_multi_year_report(year, version):
+    warehouse = get_warehouse()
+    warehouse.refresh(get_local_store())
+    return {
+        "year_over_year": warehouse.year_over_year(year),
+        "categories": warehouse.category_totals(),
+        "peaks": warehouse.daily_peaks()
+    }
+
+def get_multi_year_report(year):
+    return _cached_multi_year_report(int(year), get_data_versions().all())
+
+# Busca em todos os meses (ver search.py): com conexão, pelo índice de texto do MongoDB; sem conexão, ou
+# quando o índice de texto não encontra nada, pelo índice de trigramas da cópia local (tolera erros de digitação).
+# Devolve (despesas da página, total encontrado, origem: "texto", "local" ou "aproximada").
+@st.cache_data(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def _cached_search(query, page, version):
+    skip = page * SEARCH_PAGE_SIZE
+    if get_expense_sync().is_online():
+        try:
+            expenses, total = search_text_index(get_database()['expenses'], query, SEARCH_FIELDS, skip)
+            if total:
+                return expenses, total, "texto"
+        except PyMongoError:
+            pass
+    expenses, total, fuzzy = search_local(get_local_store(), query, SEARCH_FIELDS, skip)
+    return expenses, total, "aproximada" if fuzzy else "local"
+
+# Função para buscar despesas pela descrição e pelas observações (page começa em 0)
+def search_expenses(query, page=0):
+    return _cached_search(" ".join(query.split()), int(page), get_data_versions().all())
+
+# Função para obter a série mensal por categoria (meses completos, de todos os anos) e os modelos
+# de previsão ajustados a ela (ver forecasting.py). Sem despesas, devolve a série vazia e None.
+def get_forecast(model=AUTO_MODEL):
+    today = datetime.today()
+    end = datetime(today.year, today.month, 1)
+    series = _cached_monthly_series(end, get_data_versions().before(end.year, end.month))
+    if series.is_empty():
+        return series, None
+    return series, _cached_forecast_fit(series.values, model)
+
+# Função para obter os gastos fora do padrão em todo o histórico (ver anomalies.py): a tabela de
+# despesas dos picos por categoria e os dias com total acima do padrão. Recalculados a cada versão dos dados.
+def get_anomalies(method=DEFAULT_METHOD):
+    return _cached_anomalies(method, get_data_versions().all())
@@ -0,0 +1,101 @@
+import os
+from datetime import datetime, timezone
+
+import certifi
+import streamlit as st
+from pymongo import MongoClient, ASCENDING, TEXT
+from pymongo.errors import ConfigurationError
+
+from instrumentation import COMMAND_TIMER
+
+DATABASE_NAME = 'PersonalFinances'
+
+# Valores padrão das configurações de conexão (podem ser sobrescritos no secrets.toml ou no ambiente)
+DEFAULT_MAX_POOL_SIZE = 20
+DEFAULT_SERVER_SELECTION_TIMEOUT_MS = 5000
+DEFAULT_CONNECT_TIMEOUT_MS = 5000
+DEFAULT_SOCKET_TIMEOUT_MS = 20000
+
+# Função para ler uma configuração: variável de ambiente primeiro, depois .streamlit/secrets.toml.
+# Sem secrets.toml (configuração só por ambiente), o st.secrets não é consultado: ao procurar o arquivo,
+# ele mostraria "No secrets found" na página a cada execução.
+def get_setting(name, default=None):
+    value = os.environ.get(name)
+    if value is not None:
+        return value
+    if not st.secrets.load_if_toml_exists():
+        return default
+    value = st.secrets.get(name)
+    return default if value is None else value
+
+# Função para ler a URI do MongoDB
+def get_mongodb_uri():
+    uri = get_setting("MONGODB_URI")
+    if not uri:
+        raise ConfigurationError("MONGODB_URI não configurada no ambiente nem no .streamlit/secrets.toml")
+    return uri
+
+# Função para obter o horário de gravação (updated_at) das despesas inseridas, usado pela cópia local
+# (local_store.py). As atualizações usam {"$currentDate": {"updated_at": True}}, com o relógio do MongoDB.
+def get_write_time():
+    return datetime.now(timezone.utc)
+
+# Função para criar o cliente do MongoDB
+# Usando certifi para garantir o CA SSL correto e adicionando parâmetros para TLS.
+# MONGODB_TLS=false permite testar com um mongod local (replica set sem TLS).
+# Com connect=False nenhuma conexão é aberta aqui: o pool conecta no primeiro comando enviado.
+# O COMMAND_TIMER mede os comandos das páginas com o painel de desempenho ou o log ativado (instrumentation.py).
+def create_client(uri):
+    tls = str(get_setting("MONGODB_TLS", "true")).lower() not in ("false", "0", "no")
+    tls_options = {"tlsCAFile": certifi.where(), "tlsAllowInvalidCertificates": False} if tls else {}
+    return MongoClient(
+        uri,
+        tls=tls,
+        **tls_options,
+        connect=False,
+        maxPoolSize=int(get_setting("MONGODB_MAX_POOL_SIZE", DEFAULT_MAX_POOL_SIZE)),
+        serverSelectionTimeoutMS=int(get_setting("MONGODB_SERVER_SELECTION_TIMEOUT_MS", DEFAULT_SERVER_SELECTION_TIMEOUT_MS)),
+        connectTimeoutMS=int(get_setting("MONGODB_CONNECT_TIMEOUT_MS", DEFAULT_CONNECT_TIMEOUT_MS)),
+        socketTimeoutMS=int(get_setting("MONGODB_SOCKET_TIMEOUT_MS", DEFAULT_SOCKET_TIMEOUT_MS)),
+        event_listeners=[COMMAND_TIMER]
+    )
+
+# Função para garantir os índices usados pelos filtros por intervalo de datas e pela importação
+def ensure_indexes(db):
+    db['expenses'].create_index([("date", ASCENDING)])
+    db['expenses'].create_index([("date", ASCENDING), ("category", ASCENDING)])
+    db['expenses'].create_index([("date", ASCENDING), ("_id", ASCENDING)])  # Paginação por cursor (date, _id)
+    # Despesas importadas de extratos: o hash do conteúdo impede importar a mesma linha duas vezes
+    db['expenses'].create_index([("import_hash", ASCENDING)], unique=True, sparse=True)
+    # Despesas geradas por regras recorrentes: no máximo uma por regra e período
+    db['expenses'].create_index([("recurring_rule_id", ASCENDING), ("recurring_period", ASCENDING)], unique=True, sparse=True)
+    # Polling da cópia local (sem change streams): despesas alteradas desde a última sincronização
+    db['expenses'].create_index([("updated_at", ASCENDING)])
+    # Busca (search.py): índice de texto com radicais do português, com a descrição valendo mais que as observações
+    db['expenses'].create_index([("name", TEXT), ("notes", TEXT)], weights={"name": 3, "notes": 1},
+                                default_language="portuguese", name="expenses_text")
+    # Orçamento: um limite por categoria
+    db['budgets'].create_index([("category", ASCENDING)], unique=True)
+
+# Cliente único por processo, com pool de conexões compartilhado por todas as sessões e reruns
+@st.cache_resource
+def get_client():
+    return create_client(get_mongodb_uri())
+
+# Verificação da conexão e criação dos índices, feitas no primeiro acesso ao banco e não na importação.
+# Se falhar, a exceção chega à página (que mostra o erro) e nada fica em cache: o próximo rerun tenta de novo.
+@st.cache_resource(show_spinner="Conectando ao MongoDB...")
+def ensure_connection():
+    client = get_client()
+    client.admin.command('ping')
+    ensure_indexes(client[DATABASE_NAME])
+    return True
+
+# Função para obter o banco de dados da aplicação
+def get_database():
+    ensure_connection()
+    return get_client()[DATABASE_NAME]
+
+# Função para obter a coleção de despesas
+def get_expenses_collection():
+    return get_database()['expenses']
@@ -0,0 +1,147 @@
+import argparse
+import csv
+import io
+from decimal import Decimal
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from categories import category_label, normalize_category
+from database import DATABASE_NAME, create_client, get_mongodb_uri
+from money import format_decimal, get_amount_cents
+from queries import build_expense_query
+
+EXPORT_BATCH_SIZE = 5000
+
+# Colunas exportadas, na ordem do arquivo. Os nomes do CSV são os mesmos aceitos pelo importer.py,
+# e as categorias saem com o nome exibido no app. O valor é gravado em centavos (amount_cents) e sai
+# em reais exatos: texto "1234.56" no CSV e decimal(18, 2) no Parquet, nunca float.
+EXPORT_FIELDS = ["date", "name", "amount", "category", "is_paid", "payment_date", "notes"]
+CSV_HEADERS = ["Data", "Descrição", "Valor", "Categoria", "Paga", "Data de Pagamento", "Observações"]
+EXPORT_FORMATS = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+
+PARQUET_SCHEMA = pa.schema([
+    ("date", pa.timestamp("ms")),
+    ("name", pa.string()),
+    ("amount", pa.decimal128(18, 2)),
+    ("category", pa.string()),
+    ("is_paid", pa.bool_()),
+    ("payment_date", pa.timestamp("ms")),
+    ("notes", pa.string())
+])
+
+# Função para percorrer as despesas do filtro em lotes, com um único cursor no servidor
+def iter_expense_batches(collection, query, batch_size=EXPORT_BATCH_SIZE):
+    projection = {field: 1 for field in EXPORT_FIELDS if field != "amount"}
+    projection.update({"_id": 0, "amount_cents": 1})
+    cursor = collection.find(query, projection).sort([("date", 1), ("_id", 1)]).batch_size(batch_size)
+    batch = []
+    for expense in cursor:
+        batch.append(expense)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+# Função para converter os centavos de uma despesa em Decimal com duas casas (exato, para o Parquet)
+def to_decimal(expense):
+    return Decimal(get_amount_cents(expense)).scaleb(-2)
+
+# Função para gerar o CSV em pedaços de bytes, um por lote (datas ISO e ponto decimal, para análise offline)
+def iter_csv(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADERS)
+    for batch in batches:
+        for expense in batch:
+            expense_date = expense.get("date")
+            payment_date = expense.get("payment_date")
+            writer.writerow([
+                expense_date.strftime("%Y-%m-%d") if expense_date else "",
+                expense.get("name", ""),
+                format_decimal(get_amount_cents(expense)),
+                category_label(expense.get("category", "")),
+                "sim" if expense.get("is_paid") else "não",
+                payment_date.strftime("%Y-%m-%d") if payment_date else "",
+                expense.get("notes") or ""
+            ])
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+# Destino do ParquetWriter que guarda só os bytes ainda não entregues (um row group por vez)
+class _ParquetSink:
+    def __init__(self):
+        self.closed = False
+        self._position = 0
+        self._pending = []
+
+    def write(self, data):
+        self._pending.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self._pending)
+        self._pending = []
+        return data
+
+# Função para gerar o Parquet em pedaços de bytes: cada lote vira um row group e é entregue em seguida
+def iter_parquet(batches):
+    sink = _ParquetSink()
+    writer = pq.ParquetWriter(sink, PARQUET_SCHEMA)
+    for batch in batches:
+        columns = {field: [expense.get(field) for expense in batch] for field in EXPORT_FIELDS}
+        columns["amount"] = [to_decimal(expense) for expense in batch]
+        columns["is_paid"] = [bool(value) for value in columns["is_paid"]]
+        columns["category"] = [category_label(value) for value in columns["category"]]
+        writer.write_table(pa.table(columns, schema=PARQUET_SCHEMA))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+# Função para exportar as despesas de um filtro (mesmo formato de filtros da tabela do resumo).
+# Devolve um gerador de bytes: a memória usada não depende do tamanho do histórico.
+def export_expenses(collection, file_format, year=None, month=None, filters=None, batch_size=EXPORT_BATCH_SIZE):
+    if file_format not in EXPORT_FORMATS:
+        raise ValueError(f"Formato de exportação inválido: {file_format}")
+    batches = iter_expense_batches(collection, build_expense_query(year, month, filters), batch_size)
+    return iter_csv(batches) if file_format == "csv" else iter_parquet(batches)
+
+# Uso: python export.py despesas.parquet [--year 2024] [--month 3] [--category Alimentação]
+def main():
+    parser = argparse.ArgumentParser(description="Exporta as despesas para CSV ou Parquet")
+    parser.add_argument("output", help="Arquivo de saída (.csv ou .parquet)")
+    parser.add_argument("--year", type=int)
+    parser.add_argument("--month", type=int)
+    parser.add_argument("--category", action="append", help="Pode ser repetido")
+    parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE)
+    args = parser.parse_args()
+    if args.month is not None and args.year is None:
+        parser.error("--month exige --year")
+
+    file_format = args.output.rsplit(".", 1)[-1].lower()
+    collection = create_client(get_mongodb_uri())[DATABASE_NAME]['expenses']
+    filters = (tuple(normalize_category(category) for category in args.category or ()), None, "")
+    written = 0
+    with open(args.output, "wb") as file:
+        for chunk in export_expenses(collection, file_format, args.year, args.month, filters, args.batch_size):
+            file.write(chunk)
+            written += len(chunk)
+    print(f"Exportação concluída: {written / 1024:.0f} KB gravados em {args.output}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+import argparse
+from datetime import datetime
+
+import numpy as np
+
+from categories import category_label
+from local_store import DEFAULT_LOCAL_STORE_PATH, LocalStore
+from money import cents_to_reais
+
+SEASON_LENGTH = 12
+BACKTEST_MONTHS = 12
+AUTO_MODEL = "auto"
+
+# Grades de parâmetros testadas no ajuste. Todas as combinações e todas as categorias são calculadas
+# juntas em matrizes do NumPy: o laço em Python é só sobre os meses da série.
+SMOOTHING_ALPHAS = np.linspace(0.05, 1.0, 20)
+SEASONAL_ALPHAS = np.array([0.05, 0.1, 0.2, 0.3, 0.5, 0.7, 0.9])
+SEASONAL_GAMMAS = np.array([0.0, 0.1, 0.2, 0.3, 0.5])
+
+# Totais mensais por categoria: meses consecutivos (ano, mês) nas linhas, categorias nas colunas.
+# Meses sem despesas em uma categoria valem 0. Os totais somados em centavos viram reais (float) aqui:
+# as previsões são estimativas, e os modelos trabalham com médias e pesos fracionários.
+class MonthlySeries:
+    def __init__(self, months, categories, values):
+        self.months = months
+        self.categories = categories
+        self.values = values
+
+    @classmethod
+    def from_rollups(cls, rows, end=None):
+        if not rows:
+            return cls([], [], np.zeros((0, 0)))
+        first = rows[0]["year"] * 12 + rows[0]["month"] - 1
+        last = max(row["year"] * 12 + row["month"] - 1 for row in rows)
+        if end is not None:
+            last = end.year * 12 + end.month - 2  # Até o mês anterior a end
+        categories = sorted({row["category"] for row in rows}, key=str)
+        columns = {category: index for index, category in enumerate(categories)}
+
+        values = np.zeros((last - first + 1, len(categories)))
+        for row in rows:
+            values[row["year"] * 12 + row["month"] - 1 - first, columns[row["category"]]] += cents_to_reais(row["total_cents"] or 0)
+        months = [divmod(index, 12) for index in range(first, last + 1)]
+        return cls([(year, month + 1) for year, month in months], categories, values)
+
+    def is_empty(self):
+        return not self.months
+
+    # Meses (ano, mês) seguintes ao último mês da série
+    def next_months(self, horizon):
+        year, month = self.months[-1]
+        months = [divmod(year * 12 + month - 1 + step, 12) for step in range(1, horizon + 1)]
+        return [(year, month + 1) for year, month in months]
+
+# Modelo de referência, o cálculo antigo da página de análise: média dos últimos 3 meses
+# corrigida pela variação percentual média desses meses
+class MovingAverageModel:
+    label = "Média móvel (3 meses)"
+    min_months = 1
+
+    def fit(self, values):
+        mean = values[-3:].mean(axis=0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            changes = values[1:] / values[:-1] - 1
+        changes = np.nan_to_num(changes[-3:], nan=0.0, posinf=0.0, neginf=0.0)
+        growth = changes.mean(axis=0) if len(changes) else np.zeros(values.shape[1])
+        return {"level": mean * (1 + growth)}
+
+    def forecast(self, state, horizon):
+        return np.tile(state["level"], (horizon, 1))
+
+# Suavização exponencial simples: o nível acompanha os meses recentes com peso alpha,
+# escolhido por categoria pelo menor erro quadrático das previsões de um passo
+class ExponentialSmoothingModel:
+    label = "Suavização exponencial"
+    min_months = 1
+
+    def fit(self, values):
+        alphas = SMOOTHING_ALPHAS[:, None]
+        level = np.repeat(values[:1], len(SMOOTHING_ALPHAS), axis=0)
+        sse = np.zeros_like(level)
+        for row in values[1:]:
+            error = row - level
+            sse += error ** 2
+            level = level + alphas * error
+        best = sse.argmin(axis=0)
+        columns = np.arange(values.shape[1])
+        return {"alpha": SMOOTHING_ALPHAS[best], "level": level[best, columns]}
+
+    def forecast(self, state, horizon):
+        return np.tile(state["level"], (horizon, 1))
+
+# Suavização exponencial com sazonalidade anual aditiva: nível + efeito de cada mês do ano
+# (ex.: material escolar em fevereiro, IPVA em janeiro). Exige ao menos dois anos de histórico.
+class SeasonalModel:
+    label = "Sazonal (12 meses)"
+    min_months = 2 * SEASON_LENGTH
+
+    def fit(self, values):
+        alphas, gammas = (grid.ravel()[:, None] for grid in np.meshgrid(SEASONAL_ALPHAS, SEASONAL_GAMMAS))
+        first_year = values[:SEASON_LENGTH]
+        level = np.repeat(first_year.mean(axis=0)[None], len(alphas), axis=0)
+        season = np.repeat((first_year - first_year.mean(axis=0))[None], len(alphas), axis=0)
+        sse = np.zeros_like(level)
+        for index in range(SEASON_LENGTH, len(values)):
+            phase = index % SEASON_LENGTH
+            error = values[index] - level - season[:, phase]
+            sse += error ** 2
+            level = level + alphas * error
+            season[:, phase] += gammas * error
+        best = sse.argmin(axis=0)
+        columns = np.arange(values.shape[1])
+        return {
+            "alpha": alphas[best, 0],
+            "gamma": gammas[best, 0],
+            "level": level[best, columns],
+            "season": season[best, :, columns].T,  # (12, categorias)
+            "phase": len(values) % SEASON_LENGTH
+        }
+
+    def forecast(self, state, horizon):
+        phases = (state["phase"] + np.arange(horizon)) % SEASON_LENGTH
+        return state["level"] + state["season"][phases]
+
+# Modelos disponíveis; "auto" escolhe, para cada categoria, o de menor erro no backtest
+MODELS = {
+    "suavizacao": ExponentialSmoothingModel(),
+    "sazonal": SeasonalModel(),
+    "media_movel": MovingAverageModel()
+}
+
+# Função para listar os modelos que podem ser ajustados com a quantidade de meses disponível
+def get_candidate_models(months_count, model=AUTO_MODEL):
+    if model != AUTO_MODEL:
+        if model not in MODELS:
+            raise ValueError(f"Modelo de previsão inválido: {model}")
+        return [model]
+    return [name for name, candidate in MODELS.items() if candidate.min_months <= months_count]
+
+# Função para medir a precisão dos modelos refazendo o ajuste mês a mês nos últimos meses da série:
+# em cada origem o modelo só enxerga os meses anteriores e prevê `horizon` meses à frente.
+# Todos os modelos são avaliados nas mesmas origens, para que os erros sejam comparáveis.
+def backtest(values, models=None, holdout=BACKTEST_MONTHS, horizon=1):
+    models = list(models or MODELS)
+    start = max([MODELS[name].min_months for name in models] + [1, len(values) - horizon + 1 - holdout])
+    origins = range(start, len(values) - horizon + 1)
+    if not origins:
+        return {}
+
+    actual = values[[origin + horizon - 1 for origin in origins]]
+    scores = {}
+    for name in models:
+        model = MODELS[name]
+        predicted = np.array([model.forecast(model.fit(values[:origin]), horizon)[-1] for origin in origins])
+        errors = np.abs(np.maximum(predicted, 0) - actual)
+        scores[name] = {
+            "mae": errors.mean(axis=0),
+            # Erro absoluto ponderado: soma dos erros sobre a soma dos valores reais (não explode em meses zerados)
+            "wape": errors.sum() / actual.sum() if actual.sum() else 0.0,
+            "errors": errors,
+            "actual": actual,
+            "origins": len(origins)
+        }
+    return scores
+
+# Parâmetros ajustados para uma série: um estado por modelo usado e o modelo escolhido por categoria
+class ForecastFit:
+    def __init__(self, states, choice, scores):
+        self.states = states
+        self.choice = choice
+        self.scores = scores
+
+    # Previsões (horizon x categorias) a partir do último mês da série; gastos nunca ficam negativos
+    def predict(self, horizon=1):
+        columns = len(self.choice)
+        predicted = np.zeros((horizon, columns))
+        for name, state in self.states.items():
+            selected = np.array([choice == name for choice in self.choice])
+            predicted[:, selected] = MODELS[name].forecast(state, horizon)[:, selected]
+        return np.maximum(predicted, 0)
+
+    # Erro (WAPE) do backtest com o modelo escolhido para cada categoria, ou None sem meses suficientes
+    def backtest_error(self):
+        if not self.scores:
+            return None
+        errors = np.array([self.scores[name]["errors"][:, index] for index, name in enumerate(self.choice)])
+        actual = next(iter(self.scores.values()))["actual"]
+        return errors.sum() / actual.sum() if actual.sum() else 0.0
+
+# Função para ajustar os modelos a uma matriz de totais mensais (meses x categorias)
+def fit_forecast(values, model=AUTO_MODEL, holdout=BACKTEST_MONTHS):
+    candidates = get_candidate_models(len(values), model)
+    scores = backtest(values, candidates, holdout) if len(candidates) > 1 else {}
+    if scores:
+        mae = np.array([scores[name]["mae"] for name in candidates])
+        choice = [candidates[index] for index in mae.argmin(axis=0)]
+    else:
+        choice = [candidates[0]] * values.shape[1]
+    states = {name: MODELS[name].fit(values) for name in set(choice)}
+    return ForecastFit(states, choice, scores)
+
+# Função para ler a série mensal da cópia local das despesas, até o último mês completo
+def load_monthly_series(store, end=None):
+    today = datetime.today()
+    end = end or datetime(today.year, today.month, 1)
+    return MonthlySeries.from_rollups(store.totals_by_month_and_category(end), end)
+
+# Uso: python forecasting.py backtest [--holdout 12] [--horizon 1] [--store .cache/expenses.sqlite3]
+#      python forecasting.py forecast [--model auto] [--horizon 2] [--store .cache/expenses.sqlite3]
+def main():
+    parser = argparse.ArgumentParser(description="Previsão dos gastos mensais por categoria")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    backtest_parser = subparsers.add_parser("backtest", help="Mede o erro de cada modelo nos últimos meses")
+    backtest_parser.add_argument("--holdout", type=int, default=BACKTEST_MONTHS, help="Meses usados na validação")
+    backtest_parser.add_argument("--horizon", type=int, default=1, help="Meses à frente previstos em cada origem")
+    forecast_parser = subparsers.add_parser("forecast", help="Prevê os próximos meses de cada categoria")
+    forecast_parser.add_argument("--model", choices=[AUTO_MODEL, *MODELS], default=AUTO_MODEL)
+    forecast_parser.add_argument("--horizon", type=int, default=2)
+    for subparser in (backtest_parser, forecast_parser):
+        subparser.add_argument("--store", default=DEFAULT_LOCAL_STORE_PATH, help="Cópia local (python local_store.py sync)")
+    args = parser.parse_args()
+
+    series = load_monthly_series(LocalStore(args.store))
+    if series.is_empty():
+        print("Nenhuma despesa registrada nos meses completos.")
+        return
+    print(f"Série de {len(series.months)} meses ({series.months[0][1]}/{series.months[0][0]} a "
+          f"{series.months[-1][1]}/{series.months[-1][0]}), {len(series.categories)} categorias.")
+
+    if args.command == "backtest":
+        scores = backtest(series.values, get_candidate_models(len(series.months)), args.holdout, args.horizon)
+        if not scores:
+            print("Meses insuficientes para o backtest.")
+            return
+        for name, score in scores.items():
+            print(f"\n{MODELS[name].label}: WAPE {score['wape']:.1%} em {score['origins']} meses")
+            for category, mae in zip(series.categories, score["mae"]):
+                print(f"  {category_label(category):<15} erro médio R$ {mae:,.2f}")
+    else:
+        fit = fit_forecast(series.values, args.model)
+        predicted = fit.predict(args.horizon)
+        for step, (year, month) in enumerate(series.next_months(args.horizon)):
+            print(f"\n{month:02d}/{year}: total previsto R$ {predicted[step].sum():,.2f}")
+            for index, category in enumerate(series.categories):
+                print(f"  {category_label(category):<15} R$ {predicted[step, index]:>10,.2f}  ({MODELS[fit.choice[index]].label})")
+        error = fit.backtest_error()
+        if error is not None:
+            print(f"\nErro (WAPE) no backtest dos últimos {BACKTEST_MONTHS} meses: {error:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import pandas as pd
+import streamlit as st
+
+from categories import CATEGORY_LABELS
+from money import cents_to_reais, format_brl
+
+DATE_FORMAT = '%d/%m/%Y'  # Formato brasileiro DD/MM/AAAA
+
+# Campos lidos por cada página (projeção aplicada aos documentos da cópia local, ver local_store.project)
+SUMMARY_FIELDS = ["name", "amount_cents", "category", "date", "is_paid", "payment_date", "notes"]
+EDIT_FIELDS = ["name", "amount_cents", "category", "date", "is_paid", "payment_date", "notes", "version"]
+DELETE_FIELDS = ["name", "amount_cents", "category", "date", "is_paid", "payment_date", "attachment_id", "version"]
+VIEW_FILES_FIELDS = ["name", "amount_cents", "category", "date", "notes", "attachment_id", "attachment_name", "attachment_type"]
+
+# Colunas exibidas nas tabelas editáveis (edição em lote e exclusão)
+EDITOR_COLUMNS = ["name", "amount_cents", "category", "date", "is_paid", "payment_date", "notes"]
+DELETE_COLUMNS = ["name", "amount_cents", "category", "date", "is_paid", "payment_date"]
+
+# Opções da tabela paginada do resumo
+PAGE_SIZE_OPTIONS = [25, 50, 100, 200]
+SUMMARY_SORT_OPTIONS = {"Data": "date", "Valor": "amount_cents", "Descrição": "name"}
+PAID_FILTER_OPTIONS = {"Todas": None, "Pagas": True, "Não pagas": False}
+
+# Nomes das colunas exibidas nas tabelas
+DISPLAY_COLUMNS = {
+    "name": "Descrição",
+    "amount_cents": "Valor (R$)",
+    "category": "Categoria",
+    "date": "Data",
+    "is_paid": "Paga",
+    "payment_date": "Data de Pagamento",
+    "notes": "Observações"
+}
+
+# Valores usados quando uma coluna não existe em nenhum documento retornado
+COLUMN_DEFAULTS = {
+    "name": "",
+    "amount_cents": 0,
+    "category": "outros",
+    "date": pd.NaT,
+    "is_paid": False,
+    "payment_date": pd.NaT,
+    "notes": ""
+}
+
+# Função para converter os centavos em int64 de forma vetorizada (somas exatas; ausentes valem 0)
+def to_cents_column(values):
+    return pd.to_numeric(values, errors='coerce').fillna(0).astype('int64')
+
+# Função para montar o DataFrame das despesas: datas em datetime64, centavos em int64 e mês/ano derivados uma única vez
+def prepare_expenses_frame(expenses, columns=()):
+    df = pd.DataFrame(expenses)
+    for column in columns:
+        if column not in df.columns:
+            df[column] = COLUMN_DEFAULTS.get(column)
+
+    for column in ("date", "payment_date"):
+        if column in df.columns:
+            df[column] = pd.to_datetime(df[column], errors='coerce')
+    if "amount_cents" in df.columns:
+        df["amount_cents"] = to_cents_column(df["amount_cents"])
+    if "notes" in df.columns:
+        df["notes"] = df["notes"].fillna("")
+    if "date" in df.columns:
+        df["month"] = df["date"].dt.month
+        df["year"] = df["date"].dt.year
+    return df
+
+# Formatação das colunas de data feita pelo próprio st.dataframe, no navegador
+DISPLAY_COLUMN_CONFIG = {
+    DISPLAY_COLUMNS["date"]: st.column_config.DateColumn(format="DD/MM/YYYY"),
+    DISPLAY_COLUMNS["payment_date"]: st.column_config.DateColumn(format="DD/MM/YYYY")
+}
+
+# Função para trocar as chaves de categoria pelos nomes exibidos (categorias fora do registro ficam como estão)
+def to_category_labels(categories):
+    return categories.map(CATEGORY_LABELS).fillna(categories)
+
+# Função para gerar a tabela do st.dataframe (usar com DISPLAY_COLUMN_CONFIG): as datas continuam datetime64
+# e os valores viram texto no padrão brasileiro ("R$ 1.234,56") só aqui
+def to_display_frame(df, columns):
+    display = df[list(columns)].rename(columns=DISPLAY_COLUMNS)
+    if "amount_cents" in columns:
+        display[DISPLAY_COLUMNS["amount_cents"]] = display[DISPLAY_COLUMNS["amount_cents"]].map(format_brl)
+    if "category" in columns:
+        display[DISPLAY_COLUMNS["category"]] = to_category_labels(display[DISPLAY_COLUMNS["category"]])
+    return display
+
+# Função para gerar a tabela do st.data_editor: cada linha é identificada pelo _id da despesa, e não pela posição.
+# O valor fica em reais (número) para poder ser editado; volta a centavos com money.to_cents ao salvar.
+def to_editor_frame(df, columns):
+    editor = to_display_frame(df, columns)
+    if "amount_cents" in columns:
+        editor[DISPLAY_COLUMNS["amount_cents"]] = cents_to_reais(df["amount_cents"]).to_numpy()
+    editor.index = df["_id"].astype(str)
+    return editor
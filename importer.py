@@ -0,0 +1,246 @@
+import argparse
+import csv
+import hashlib
+import io
+import itertools
+import re
+import unicodedata
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from categories import normalize_category
+from database import DATABASE_NAME, create_client, ensure_indexes, get_mongodb_uri, get_write_time
+from money import format_decimal, parse_amount, to_cents
+
+IMPORT_BATCH_SIZE = 5000
+DUPLICATE_KEY_ERROR = 11000
+
+# Nomes de coluna aceitos nos arquivos CSV (comparados sem acentos e em minúsculas)
+CSV_COLUMNS = {
+    "date": ["data", "date", "data lancamento", "data do lancamento", "dt"],
+    "name": ["descricao", "description", "historico", "lancamento", "name", "memo"],
+    "amount": ["valor", "amount", "value", "valor (r$)", "valor r$"],
+    "category": ["categoria", "category"],
+    "notes": ["observacoes", "observacao", "notes", "obs"]
+}
+
+CSV_DATE_FORMATS = ["%d/%m/%Y", "%Y-%m-%d", "%d/%m/%y", "%d-%m-%Y", "%Y/%m/%d"]
+
+# Transação do OFX (SGML ou XML): cada bloco <STMTTRN> tem uma tag por linha ou todas na mesma linha
+OFX_TRANSACTION = re.compile(r"<STMTTRN>(.*?)</STMTTRN>", re.IGNORECASE | re.DOTALL)
+OFX_TAG = re.compile(r"<(\w+)>([^<\r\n]*)")
+OFX_ACCOUNT = re.compile(r"<ACCTID>([^<\r\n]*)", re.IGNORECASE)
+
+class ImportFormatError(ValueError):
+    pass
+
+# Função para comparar nomes de coluna sem acentos, maiúsculas e espaços extras
+def normalize_header(name):
+    name = unicodedata.normalize("NFKD", name or "").encode("ascii", "ignore").decode("ascii")
+    return " ".join(name.lower().replace("_", " ").split())
+
+# Função para converter as datas do CSV, testando primeiro o último formato que funcionou
+def parse_csv_date(text, formats):
+    text = (text or "").strip()
+    for index, date_format in enumerate(formats):
+        try:
+            parsed = datetime.strptime(text, date_format)
+        except ValueError:
+            continue
+        if index:
+            formats.insert(0, formats.pop(index))
+        return parsed
+    raise ValueError(f"data inválida: {text!r}")
+
+# Função para converter datas do OFX (AAAAMMDD, seguidas ou não de horário e fuso)
+def parse_ofx_date(text):
+    return datetime.strptime(text.strip()[:8], "%Y%m%d")
+
+# Função para montar a despesa importada no mesmo formato gravado pelo add_expense.
+# Lançamentos de extrato já aconteceram, então entram como pagos na própria data.
+def build_expense(name, amount_cents, expense_date, category, notes, import_hash):
+    return {
+        "_id": ObjectId(),
+        "name": name,
+        "amount_cents": amount_cents,
+        "date": expense_date,
+        "category": normalize_category(category),
+        "notes": notes,
+        "is_paid": True,
+        "payment_date": expense_date,
+        "import_hash": import_hash,
+        "updated_at": get_write_time()
+    }
+
+# Função para calcular o hash que identifica uma linha importada. Lançamentos idênticos no mesmo
+# arquivo (dois cafés iguais no mesmo dia) são diferenciados pela ordem em que aparecem.
+def compute_import_hash(*parts):
+    return hashlib.sha1("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+# Função para ler um CSV linha a linha, detectando o separador (; , ou tab) pelo cabeçalho.
+# Devolve pares (despesa ou None, erro ou None) para que o chamador conte as linhas ignoradas.
+# Em um extrato, só os débitos (valores negativos) viram despesas: créditos (salário, estornos) são
+# ignorados, para não inflar os gastos. Em uma lista de despesas (expense_list, como o CSV exportado
+# pelo app), os valores positivos são as despesas e os negativos entram com o sinal (devoluções).
+def read_csv_expenses(stream, expense_list=False):
+    header_line = stream.readline()
+    delimiter = max([";", ",", "\t"], key=header_line.count)
+    reader = csv.reader(itertools.chain([header_line], stream), delimiter=delimiter)
+    headers = [normalize_header(name) for name in next(reader)]
+
+    positions = {}
+    for field, aliases in CSV_COLUMNS.items():
+        for alias in aliases:
+            if alias in headers:
+                positions[field] = headers.index(alias)
+                break
+    missing = [field for field in ("date", "name", "amount") if field not in positions]
+    if missing:
+        raise ImportFormatError(f"Colunas obrigatórias não encontradas no CSV: {', '.join(missing)}")
+
+    date_formats = list(CSV_DATE_FORMATS)
+    occurrences = {}
+    for line_number, row in enumerate(reader, start=2):
+        if not any(row):
+            continue
+        values = {field: row[position].strip() if position < len(row) else "" for field, position in positions.items()}
+        try:
+            value = parse_amount(values["amount"])
+            # No extrato os débitos são negativos; a despesa é gravada com o valor positivo
+            if not expense_list:
+                value = -value
+            if not value or (not expense_list and value < 0):
+                continue
+            expense_date = parse_csv_date(values["date"], date_formats)
+        except ValueError as e:
+            yield None, f"linha {line_number}: {e}"
+            continue
+
+        name = values["name"]
+        amount_cents = to_cents(value)
+        # O valor entra no hash como "12.50", o mesmo texto usado antes dos centavos: reimportar não duplica
+        key = (expense_date.date().isoformat(), format_decimal(amount_cents), name.lower())
+        occurrences[key] = occurrences.get(key, 0) + 1
+        import_hash = compute_import_hash("csv", *key, occurrences[key])
+        yield build_expense(name, amount_cents, expense_date, values.get("category"), values.get("notes", ""), import_hash), None
+
+# Função para ler as transações de um OFX em blocos, sem carregar o arquivo inteiro.
+# Só os débitos (valores negativos) viram despesas; o FITID do banco identifica cada transação.
+def read_ofx_expenses(stream, chunk_size=64 * 1024):
+    buffer = ""
+    account = ""
+    occurrences = {}
+    while True:
+        chunk = stream.read(chunk_size)
+        buffer += chunk
+        if not account:
+            match = OFX_ACCOUNT.search(buffer)
+            account = match.group(1).strip() if match else ""
+
+        last_end = 0
+        for match in OFX_TRANSACTION.finditer(buffer):
+            last_end = match.end()
+            tags = {tag.upper(): value.strip() for tag, value in OFX_TAG.findall(match.group(1))}
+            try:
+                value = parse_amount(tags.get("TRNAMT"))
+                expense_date = parse_ofx_date(tags.get("DTPOSTED", ""))
+            except ValueError as e:
+                yield None, f"transação {tags.get('FITID', '?')}: {e}"
+                continue
+            if value >= 0:
+                continue
+
+            name = tags.get("MEMO") or tags.get("NAME") or ""
+            amount_cents = to_cents(abs(value))
+            if tags.get("FITID"):
+                import_hash = compute_import_hash("ofx", account, tags["FITID"])
+            else:
+                key = (expense_date.date().isoformat(), format_decimal(amount_cents), name.lower())
+                occurrences[key] = occurrences.get(key, 0) + 1
+                import_hash = compute_import_hash("ofx", account, *key, occurrences[key])
+            yield build_expense(name, amount_cents, expense_date, None, "", import_hash), None
+
+        buffer = buffer[last_end:]
+        if not chunk:
+            break
+
+# Função para gravar um lote com insert_many(ordered=False): as linhas já importadas antes
+# esbarram no índice único do import_hash e são apenas contadas como duplicadas
+def insert_batch(collection, batch):
+    try:
+        collection.insert_many(batch, ordered=False)
+        return batch, 0
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(error.get("code") != DUPLICATE_KEY_ERROR for error in errors):
+            raise
+        rejected = {error["index"] for error in errors}
+        return [expense for index, expense in enumerate(batch) if index not in rejected], len(rejected)
+
+# Função para importar despesas em lotes.
+# progress(result) é chamada após cada lote; o resultado traz os meses alterados para invalidar o cache.
+def import_expenses(db, rows, batch_size=IMPORT_BATCH_SIZE, progress=None):
+    collection = db['expenses']
+    result = {"read": 0, "inserted": 0, "duplicates": 0, "errors": [], "months": set()}
+
+    def flush(batch):
+        inserted, duplicates = insert_batch(collection, batch)
+        result["inserted"] += len(inserted)
+        result["duplicates"] += duplicates
+        result["months"].update((expense["date"].year, expense["date"].month) for expense in inserted)
+        if progress:
+            progress(result)
+
+    batch = []
+    for expense, error in rows:
+        if error:
+            result["errors"].append(error)
+            continue
+        result["read"] += 1
+        batch.append(expense)
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+    return result
+
+# Função para escolher o leitor pelo tipo do arquivo (extensão .csv ou .ofx)
+def read_expenses_file(stream, filename, expense_list=False):
+    extension = filename.rsplit(".", 1)[-1].lower()
+    if extension == "ofx":
+        return read_ofx_expenses(stream)
+    if extension == "csv":
+        return read_csv_expenses(stream, expense_list)
+    raise ImportFormatError(f"Formato não suportado: .{extension} (use CSV ou OFX)")
+
+# Uso: python importer.py extrato.csv [--encoding latin-1] [--expense-list] [--batch-size 5000]
+def main():
+    parser = argparse.ArgumentParser(description="Importa extratos bancários (CSV ou OFX) como despesas")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--encoding", default="utf-8-sig", help="Codificação dos arquivos (ex.: latin-1)")
+    parser.add_argument("--expense-list", action="store_true",
+                        help="O CSV é uma lista de despesas em valores positivos (ex.: exportado pelo app), e não um extrato")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    db = create_client(get_mongodb_uri())[DATABASE_NAME]
+    ensure_indexes(db)
+    for filename in args.files:
+        with io.open(filename, encoding=args.encoding, newline="") as stream:
+            result = import_expenses(
+                db,
+                read_expenses_file(stream, filename, args.expense_list),
+                args.batch_size,
+                lambda result: print(f"{filename}: {result['inserted']} importadas, {result['duplicates']} já existentes...")
+            )
+        for error in result["errors"]:
+            print(f"{filename}: ignorada {error}")
+        print(f"{filename}: {result['inserted']} despesas importadas, {result['duplicates']} já existentes, "
+              f"{len(result['errors'])} linhas ignoradas.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import bson
+from pymongo import monitoring
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+# Respostas do MongoDB acima deste tamanho são destacadas no painel (documentos grandes demais,
+# consultas sem projeção ou anexos antigos ainda dentro das despesas)
+LARGE_REPLY_BYTES = 1024 * 1024
+
+# Medições de uma execução de página: comandos do MongoDB e trechos cronometrados
+class Recorder:
+    def __init__(self, page):
+        self.page = page
+        self.started = time.perf_counter()
+        self.timestamp = datetime.now(timezone.utc)
+        self.commands = []
+        self.sections = []
+        self._lock = threading.Lock()
+
+    def add_command(self, command):
+        with self._lock:
+            self.commands.append(command)
+
+    def add_section(self, name, kind, elapsed_ms):
+        with self._lock:
+            self.sections.append({"name": name, "kind": kind, "ms": round(elapsed_ms, 3)})
+
+    def to_dict(self):
+        return {
+            "timestamp": self.timestamp.isoformat(),
+            "page": self.page,
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 3),
+            "mongo_ms": round(sum(command["ms"] for command in self.commands), 3),
+            "reply_bytes": sum(command["reply_bytes"] for command in self.commands),
+            "sections": list(self.sections),
+            "commands": list(self.commands)
+        }
+
+# Medição ativa de cada sessão do Streamlit. Os comandos são atribuídos pela sessão da thread que os
+# executa, o que inclui as threads de run_queries (elas recebem o contexto da sessão).
+_recorders = {}
+_log_lock = threading.Lock()
+
+# Função para obter a medição da sessão da thread atual (None fora do Streamlit ou sem medição)
+def current_recorder():
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return _recorders.get(ctx.session_id) if ctx else None
+
+# Função para começar a medir a execução atual de uma página
+def start_recording(page):
+    ctx = get_script_run_ctx(suppress_warning=True)
+    if ctx is None:
+        return None
+    recorder = _recorders[ctx.session_id] = Recorder(page)
+    return recorder
+
+# Função para encerrar a medição da execução atual e, se houver um caminho, acrescentá-la ao log JSONL
+def finish_recording(recorder, log_path=None):
+    ctx = get_script_run_ctx(suppress_warning=True)
+    if ctx is not None and _recorders.get(ctx.session_id) is recorder:
+        del _recorders[ctx.session_id]
+    result = recorder.to_dict()
+    if log_path:
+        line = json.dumps({"session": ctx.session_id if ctx else None, **result}, ensure_ascii=False, default=str)
+        with _log_lock, open(log_path, "a", encoding="utf-8") as file:
+            file.write(line + "\n")
+    return result
+
+# Cronômetro de um trecho de página (consulta, preparo com pandas, gráfico do plotly).
+# Sem medição ativa, não faz nada além de executar o trecho.
+@contextmanager
+def timed_section(name, kind="página"):
+    recorder = current_recorder()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if recorder is not None:
+            recorder.add_section(name, kind, (time.perf_counter() - started) * 1000)
+
+# Função para registrar um tempo já medido (ex.: cada consulta de run_queries)
+def record_timing(name, kind, elapsed_ms):
+    recorder = current_recorder()
+    if recorder is not None:
+        recorder.add_section(name, kind, elapsed_ms)
+
+# Listener registrado no MongoClient: mede cada comando (latência informada pelo driver) e o tamanho
+# da resposta em BSON. Só trabalha quando a sessão que executa o comando está sendo medida.
+class CommandTimer(monitoring.CommandListener):
+    def __init__(self):
+        self._pending = {}
+
+    def started(self, event):
+        if current_recorder() is None:
+            return
+        # No getMore o nome da coleção vem em "collection"; nos demais comandos, no próprio comando
+        target = event.command.get("collection" if event.command_name == "getMore" else event.command_name)
+        self._pending[(event.connection_id, event.request_id)] = target if isinstance(target, str) else None
+
+    def _finish(self, event, reply_bytes, error=None):
+        collection = self._pending.pop((event.connection_id, event.request_id), None)
+        recorder = current_recorder()
+        if recorder is None:
+            return
+        command = {
+            "command": event.command_name,
+            "collection": collection,
+            "database": event.database_name,
+            "ms": round(event.duration_micros / 1000, 3),
+            "reply_bytes": reply_bytes
+        }
+        if error:
+            command["error"] = error
+        recorder.add_command(command)
+
+    def succeeded(self, event):
+        if current_recorder() is None:
+            self._pending.pop((event.connection_id, event.request_id), None)
+            return
+        self._finish(event, len(bson.encode(event.reply)))
+
+    def failed(self, event):
+        self._finish(event, 0, str(event.failure.get("errmsg", event.failure)))
+
+# Listener único, compartilhado por todos os clientes do processo
+COMMAND_TIMER = CommandTimer()
@@ -0,0 +1,676 @@
+import argparse
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from datetime import datetime, timedelta, timezone
+
+import bson
+from pymongo.errors import OperationFailure, PyMongoError
+
+from database import DATABASE_NAME, create_client, ensure_indexes, get_mongodb_uri
+from money import get_amount_cents
+
+# Cópia local (SQLite) da coleção de despesas, sem os binários de anexos antigos. As páginas leem daqui:
+# nenhuma leitura paga a latência até o Atlas, e os dados continuam disponíveis sem conexão.
+DEFAULT_LOCAL_STORE_PATH = os.path.join(".cache", "expenses.sqlite3")
+EXCLUDED_FIELDS = ("attachment_data",)
+SYNC_BATCH_SIZE = 1000
+
+# Sem change streams (servidor sem replica set), a cópia é atualizada consultando o campo updated_at
+# a cada POLL_INTERVAL_SECONDS. A margem cobre relógios diferentes entre as instâncias que gravam
+# updated_at; a reconciliação periódica encontra as despesas apagadas, que o updated_at não mostra.
+POLL_INTERVAL_SECONDS = 5
+POLL_OVERLAP = timedelta(seconds=60)
+RECONCILE_SECONDS = 300
+RETRY_SECONDS = [1, 2, 5, 10, 30]
+
+# Erros do MongoDB: change streams exigem replica set; os demais indicam um resume token que não
+# pode mais ser usado (histórico do oplog perdido), e a cópia é refeita do zero
+CHANGE_STREAMS_UNSUPPORTED = {40573}
+RESUME_TOKEN_LOST = {260, 280, 286}
+
+# Peso da descrição em relação às observações no ranking (BM25) da busca
+SEARCH_NAME_WEIGHT = 3.0
+
+# Datas gravadas como texto ordenável; o dia (AAAA-MM-DD) é o prefixo usado nos totais por dia
+DATE_TEXT_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+# Despesas sem descrição ordenam como texto vazio (antes de todas), como o null no MongoDB: o cursor
+# da página nunca compara com NULL, que não é maior nem menor que nada no SQLite
+SORT_COLUMNS = {"date": "date", "amount_cents": "amount_cents", "name": "IFNULL(name, '')"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS expenses (
+    id TEXT PRIMARY KEY,
+    date TEXT,
+    category TEXT,
+    name TEXT,
+    amount_cents INTEGER NOT NULL DEFAULT 0,
+    is_paid INTEGER NOT NULL DEFAULT 0,
+    version INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT,
+    doc BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS expenses_date ON expenses (date, id);
+CREATE INDEX IF NOT EXISTS expenses_date_category ON expenses (date, category);
+CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value BLOB);
+CREATE TABLE IF NOT EXISTS month_totals (
+    month TEXT NOT NULL,
+    category TEXT NOT NULL,
+    total_cents INTEGER NOT NULL,
+    fixed_cents INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (month, category)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS expense_search USING fts5(name, notes, tokenize = 'trigram');
+"""
+
+# Função para converter uma data em texto ordenável (None fica None)
+def to_date_text(value):
+    return value.strftime(DATE_TEXT_FORMAT) if isinstance(value, datetime) else None
+
+# Função para converter o dia (AAAA-MM-DD) de uma data em texto de volta para datetime
+def to_day(text):
+    return datetime.strptime(text[:10], "%Y-%m-%d")
+
+# Função para comparar a descrição sem diferenciar maiúsculas, como o $regex com a opção "i"
+def contains_text(name, text):
+    return name is not None and text.casefold() in name.casefold()
+
+# Função para montar a linha gravada de uma despesa: colunas usadas nos filtros e o documento inteiro em BSON
+def to_row(document):
+    document = {field: value for field, value in document.items() if field not in EXCLUDED_FIELDS}
+    return (
+        str(document["_id"]),
+        to_date_text(document.get("date")),
+        document.get("category") if isinstance(document.get("category"), str) else None,
+        document.get("name") if isinstance(document.get("name"), str) else None,
+        get_amount_cents(document),
+        1 if document.get("is_paid") is True else 0,
+        int(document.get("version") or 0),
+        to_date_text(document.get("updated_at")),
+        bson.encode(document)
+    )
+
+# Função para normalizar um texto para a busca: minúsculas e sem acentos ("Água" -> "agua")
+def normalize_text(text):
+    if not isinstance(text, str):
+        return ""
+    text = unicodedata.normalize("NFKD", text)
+    return " ".join("".join(char for char in text if not unicodedata.combining(char)).casefold().split())
+
+# Função para obter a chave do total mensal de uma despesa: mês (AAAA-MM) e categoria ("" quando não há)
+def to_month_key(date_text, category):
+    return date_text[:7], category or ""
+
+# Função para saber se uma despesa foi gerada por uma regra de despesa recorrente (conta fixa)
+def is_fixed(document):
+    return document.get("recurring_rule_id") is not None
+
+# Função para devolver só os campos pedidos de um documento (como a projeção do MongoDB, _id sempre incluído)
+def project(document, fields=None):
+    if not fields:
+        return document
+    return {"_id": document["_id"], **{field: document[field] for field in fields if field in document}}
+
+# Função para montar o filtro SQL do período e dos filtros de coluna (mesmo formato do queries.build_expense_query)
+def build_where(start=None, end=None, filters=None):
+    clauses, params = [], []
+    if start is not None:
+        clauses.append("date >= ? AND date < ?")
+        params += [to_date_text(start), to_date_text(end)]
+    categories, is_paid, name_contains = filters or (None, None, None)
+    if categories:
+        clauses.append(f"category IN ({', '.join('?' * len(categories))})")
+        params += list(categories)
+    if is_paid is not None:
+        clauses.append("is_paid = 1" if is_paid else "is_paid = 0")
+    if name_contains:
+        clauses.append("contains_text(name, ?)")
+        params.append(name_contains)
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+class LocalStore:
+    def __init__(self, path=DEFAULT_LOCAL_STORE_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(SCHEMA)
+        # Cópias criadas antes dos totais mensais ou do índice de busca: são calculados uma vez
+        if self.get_state("month_totals") is None:
+            with self._write_lock, connection:
+                self._rebuild_month_totals(connection)
+        if self.get_state("search_index") is None:
+            with self._write_lock, connection:
+                self._rebuild_search_index(connection)
+
+    # Uma conexão por thread (páginas e threads do run_queries leem ao mesmo tempo; o WAL permite
+    # ler enquanto a sincronização grava, sempre vendo a última transação completa)
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.create_function("contains_text", 2, contains_text, deterministic=True)
+            self._local.connection = connection
+        return connection
+
+    def get_state(self, key, default=None):
+        row = self._connection().execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_state(self, key, value):
+        with self._write_lock, self._connection() as connection:
+            if value is None:
+                connection.execute("DELETE FROM sync_state WHERE key = ?", (key,))
+            else:
+                connection.execute("INSERT OR REPLACE INTO sync_state VALUES (?, ?)", (key, value))
+
+    # Soma (ou subtrai, com sign=-1) uma despesa no total do mês e da categoria dela
+    def _add_to_month_total(self, connection, date_text, category, amount_cents, fixed, sign=1):
+        if not date_text:
+            return
+        connection.execute(
+            "INSERT INTO month_totals VALUES (?, ?, ?, ?, ?) ON CONFLICT (month, category) DO UPDATE SET "
+            "total_cents = total_cents + excluded.total_cents, fixed_cents = fixed_cents + excluded.fixed_cents, "
+            "count = count + excluded.count",
+            (*to_month_key(date_text, category), sign * amount_cents, sign * amount_cents if fixed else 0, sign)
+        )
+
+    # Recalcula os totais mensais a partir de todas as despesas da cópia (cópia completa ou cópia antiga)
+    def _rebuild_month_totals(self, connection):
+        totals = {}
+        for date_text, category, amount_cents, doc in connection.execute(
+            "SELECT date, category, amount_cents, doc FROM expenses WHERE date IS NOT NULL"
+        ):
+            total = totals.setdefault(to_month_key(date_text, category), [0, 0, 0])
+            total[0] += amount_cents
+            total[1] += amount_cents if is_fixed(bson.decode(doc)) else 0
+            total[2] += 1
+        connection.execute("DELETE FROM month_totals")
+        connection.executemany("INSERT INTO month_totals VALUES (?, ?, ?, ?, ?)", [(*key, *total) for key, total in totals.items()])
+        connection.execute("INSERT OR REPLACE INTO sync_state VALUES ('month_totals', 1)")
+
+    # Índice de busca (FTS5 com trigramas) da descrição e das observações, normalizadas. A linha do índice
+    # tem o mesmo rowid da despesa, que não muda quando a despesa é atualizada.
+    def _index_search(self, connection, key, document):
+        connection.execute("DELETE FROM expense_search WHERE rowid = ?", (key,))
+        connection.execute(
+            "INSERT INTO expense_search (rowid, name, notes) VALUES (?, ?, ?)",
+            (key, normalize_text(document.get("name")), normalize_text(document.get("notes")))
+        )
+
+    def _rebuild_search_index(self, connection):
+        connection.execute("DELETE FROM expense_search")
+        connection.executemany(
+            "INSERT INTO expense_search (rowid, name, notes) VALUES (?, ?, ?)",
+            (
+                (key, normalize_text(name), normalize_text(bson.decode(doc).get("notes")))
+                for key, name, doc in connection.cursor().execute("SELECT rowid, name, doc FROM expenses")
+            )
+        )
+        connection.execute("INSERT OR REPLACE INTO sync_state VALUES ('search_index', 1)")
+
+    # Grava e apaga despesas em uma única transação. Devolve as células (dia, categoria) que mudaram,
+    # antes e depois da escrita; documentos iguais aos já gravados são ignorados. Os totais por mês e
+    # categoria são ajustados pela diferença de cada despesa, sem somar o mês de novo.
+    def apply(self, documents=(), deleted_ids=()):
+        changed = set()
+        with self._write_lock, self._connection() as connection:
+            for document in documents:
+                row = to_row(document)
+                old = connection.execute(
+                    "SELECT date, category, doc, amount_cents, rowid FROM expenses WHERE id = ?", (row[0],)
+                ).fetchone()
+                if old is not None and old[2] == row[-1]:
+                    continue
+                if old is None:
+                    key = connection.execute("INSERT INTO expenses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", row).lastrowid
+                else:
+                    # UPDATE (e não REPLACE) para manter o rowid usado pelo índice de busca
+                    key = old[4]
+                    connection.execute(
+                        "UPDATE expenses SET date = ?, category = ?, name = ?, amount_cents = ?, is_paid = ?, "
+                        "version = ?, updated_at = ?, doc = ? WHERE rowid = ?",
+                        (*row[1:], key)
+                    )
+                    self._add_to_month_total(connection, old[0], old[1], old[3], is_fixed(bson.decode(old[2])), -1)
+                self._add_to_month_total(connection, row[1], row[2], row[4], is_fixed(document))
+                self._index_search(connection, key, document)
+                cells = [old[:2], row[1:3]] if old is not None else [row[1:3]]
+                changed |= {(to_day(date), category) for date, category in cells if date}
+            for expense_id in deleted_ids:
+                old = connection.execute(
+                    "SELECT date, category, doc, amount_cents, rowid FROM expenses WHERE id = ?", (str(expense_id),)
+                ).fetchone()
+                if old is None:
+                    continue
+                connection.execute("DELETE FROM expenses WHERE rowid = ?", (old[4],))
+                connection.execute("DELETE FROM expense_search WHERE rowid = ?", (old[4],))
+                self._add_to_month_total(connection, old[0], old[1], old[3], is_fixed(bson.decode(old[2])), -1)
+                if old[0]:
+                    changed.add((to_day(old[0]), old[1]))
+        return changed
+
+    # Substitui toda a cópia pelos documentos recebidos (em lotes), em uma única transação:
+    # quem lê continua vendo a cópia anterior até o fim
+    def replace_all(self, batches):
+        count = 0
+        with self._write_lock, self._connection() as connection:
+            connection.execute("DELETE FROM expenses")
+            for batch in batches:
+                connection.executemany("INSERT OR REPLACE INTO expenses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", map(to_row, batch))
+                count += len(batch)
+            self._rebuild_month_totals(connection)
+            self._rebuild_search_index(connection)
+        return count
+
+    def count(self):
+        return self._connection().execute("SELECT COUNT(*) FROM expenses").fetchone()[0]
+
+    # Versão e updated_at de cada despesa, usados na reconciliação com o MongoDB
+    def document_versions(self):
+        return {row[0]: (row[1], row[2]) for row in self._connection().execute("SELECT id, version, updated_at FROM expenses")}
+
+    def _documents(self, sql, params, fields=None):
+        return [project(bson.decode(row[0]), fields) for row in self._connection().execute(sql, params)]
+
+    # Despesas de um intervalo [início, fim) (ou todas), das mais recentes para as mais antigas
+    def find_expenses(self, start=None, end=None, fields=None):
+        where, params = build_where(start, end)
+        return self._documents(f"SELECT doc FROM expenses{where} ORDER BY date DESC, id DESC", params, fields)
+
+    def find_expense(self, expense_id, fields=None):
+        documents = self._documents("SELECT doc FROM expenses WHERE id = ?", [str(expense_id)], fields)
+        return documents[0] if documents else None
+
+    # Página de despesas com cursor por chave (keyset) em (campo de ordenação, _id). `after` é o par (valor, _id)
+    # da última linha da página anterior; devolve as linhas e o cursor da próxima página. O valor do cursor é
+    # o da coluna ordenada, como gravado na cópia (datas em texto, descrição ausente como texto vazio).
+    def find_expenses_page(self, start, end, fields, filters=None, sort_field="date", descending=True, after=None, page_size=50):
+        column = SORT_COLUMNS[sort_field]
+        where, params = build_where(start, end, filters)
+        if after is not None:
+            value, last_id = after
+            operator = "<" if descending else ">"
+            where += f"{' AND' if where else ' WHERE'} ({column} {operator} ? OR ({column} = ? AND id {operator} ?))"
+            params += [value, value, str(last_id)]
+        direction = "DESC" if descending else "ASC"
+        # Uma linha a mais indica se existe próxima página, sem precisar contar
+        rows = self._connection().execute(
+            f"SELECT doc, {column} FROM expenses{where} ORDER BY {column} {direction}, id {direction} LIMIT ?",
+            params + [page_size + 1]
+        ).fetchall()
+        next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            next_cursor = (rows[-1][1], bson.decode(rows[-1][0])["_id"])
+        return [project(bson.decode(row[0]), list(fields) + [sort_field]) for row in rows], next_cursor
+
+    # Total (centavos) e quantidade das despesas de um filtro
+    def expenses_total(self, start, end, filters=None):
+        where, params = build_where(start, end, filters)
+        total, count = self._connection().execute(f"SELECT COALESCE(SUM(amount_cents), 0), COUNT(*) FROM expenses{where}", params).fetchone()
+        return total, count
+
+    # Despesas de algumas células (dia, categoria), com uma única consulta
+    def find_expenses_in_cells(self, keys, fields=None):
+        keys = list(keys)
+        if not keys:
+            return []
+        where = " OR ".join(["(date >= ? AND date < ? AND category IS ?)"] * len(keys))
+        params = [value for day, category in keys for value in (to_date_text(day), to_date_text(day + timedelta(days=1)), category)]
+        return self._documents(f"SELECT doc FROM expenses WHERE {where}", params, fields)
+
+    # Totais em centavos por dia e categoria de um intervalo (day, category, total_cents)
+    def totals_by_day_and_category(self, start=None, end=None):
+        where, params = build_where(start, end)
+        where = where + (" AND" if where else " WHERE") + " date IS NOT NULL"
+        rows = self._connection().execute(
+            f"SELECT substr(date, 1, 10) AS day, category, SUM(amount_cents) FROM expenses{where} GROUP BY day, category ORDER BY day",
+            params
+        )
+        return [{"day": to_day(day), "category": category, "total_cents": total} for day, category, total in rows]
+
+    # Total atual de algumas células (dia, categoria); células sem despesas valem 0
+    def totals_for_cells(self, keys):
+        keys = list(keys)
+        cells = dict.fromkeys(keys, 0)
+        for day, category in keys:
+            cells[(day, category)] = self._connection().execute(
+                "SELECT COALESCE(SUM(amount_cents), 0) FROM expenses WHERE date >= ? AND date < ? AND category IS ?",
+                (to_date_text(day), to_date_text(day + timedelta(days=1)), category)
+            ).fetchone()[0]
+        return cells
+
+    # Totais por mês ("mês/ano", em ordem cronológica)
+    def totals_by_month(self):
+        rows = self._connection().execute(
+            "SELECT substr(date, 1, 7) AS month, SUM(amount_cents) FROM expenses WHERE date IS NOT NULL GROUP BY month ORDER BY month"
+        )
+        return {f"{int(month[5:7])}/{int(month[:4])}": total for month, total in rows}
+
+    # Totais por mês e categoria até `end` (exclusive): year, month, category, total_cents
+    def totals_by_month_and_category(self, end=None):
+        where, params = ("WHERE date IS NOT NULL", [])
+        if end is not None:
+            where, params = ("WHERE date < ?", [to_date_text(end)])
+        rows = self._connection().execute(
+            f"SELECT substr(date, 1, 7) AS month, category, SUM(amount_cents) FROM expenses {where} GROUP BY month, category ORDER BY month",
+            params
+        )
+        return [
+            {"year": int(month[:4]), "month": int(month[5:7]), "category": category, "total_cents": total}
+            for month, category, total in rows
+        ]
+
+    # Filtro da busca: termos do FTS5 (`match`) e palavras curtas demais para o índice, procuradas no texto
+    def _search_where(self, match, short_words):
+        clauses, params = [], []
+        if match:
+            clauses.append("expense_search MATCH ?")
+            params.append(match)
+        for word in short_words:
+            clauses.append("(expense_search.name LIKE ? OR expense_search.notes LIKE ?)")
+            params += [f"%{word}%"] * 2
+        return " AND ".join(clauses) or "1", params
+
+    def count_search(self, match, short_words=()):
+        where, params = self._search_where(match, short_words)
+        return self._connection().execute(f"SELECT COUNT(*) FROM expense_search WHERE {where}", params).fetchone()[0]
+
+    # Despesas encontradas, das mais relevantes (BM25, com peso maior para a descrição) para as menos relevantes
+    def find_search(self, match, short_words=(), fields=None, limit=20, offset=0):
+        where, params = self._search_where(match, short_words)
+        order = f"bm25(expense_search, {SEARCH_NAME_WEIGHT}, 1.0), " if match else ""
+        return self._documents(
+            f"SELECT expenses.doc FROM expense_search JOIN expenses ON expenses.rowid = expense_search.rowid "
+            f"WHERE {where} ORDER BY {order}expenses.date DESC LIMIT ? OFFSET ?",
+            params + [limit, offset],
+            fields
+        )
+
+    # Total do mês por categoria, mantido a cada escrita: {categoria: (total, parte em contas fixas)}
+    def month_category_totals(self, year, month):
+        rows = self._connection().execute(
+            "SELECT category, total_cents, fixed_cents FROM month_totals WHERE month = ? AND count > 0",
+            (f"{int(year):04d}-{int(month):02d}",)
+        )
+        return {category or None: (total, fixed) for category, total, fixed in rows}
+
+    def totals_by_category(self, start, end):
+        where, params = build_where(start, end)
+        return dict(self._connection().execute(f"SELECT category, SUM(amount_cents) FROM expenses{where} GROUP BY category", params))
+
+    def totals_by_day(self, start, end):
+        where, params = build_where(start, end)
+        rows = self._connection().execute(
+            f"SELECT CAST(substr(date, 9, 2) AS INTEGER) AS day, SUM(amount_cents) FROM expenses{where} GROUP BY day ORDER BY day",
+            params
+        )
+        return dict(rows)
+
+    # Assinatura de cada mês ("AAAA-MM": quantidade, soma, soma das versões e maior updated_at), para saber
+    # quais meses de um snapshot (warehouse.py) ficaram diferentes da cópia sem comparar despesa por despesa
+    def month_signatures(self, months=None):
+        where, params = "WHERE date IS NOT NULL", []
+        if months is not None:
+            months = [f"{year:04d}-{month:02d}" for year, month in months]
+            if not months:
+                return {}
+            where += f" AND substr(date, 1, 7) IN ({', '.join('?' * len(months))})"
+            params = months
+        rows = self._connection().execute(
+            f"SELECT substr(date, 1, 7) AS month, COUNT(*), SUM(amount_cents), SUM(version), MAX(updated_at) "
+            f"FROM expenses {where} GROUP BY month",
+            params
+        )
+        return {month: list(signature) for month, *signature in rows}
+
+    # Colunas das despesas de um intervalo [início, fim), sem decodificar os documentos
+    def find_rows(self, start, end):
+        where, params = build_where(start, end)
+        return self._connection().execute(
+            f"SELECT id, date, category, name, amount_cents, is_paid FROM expenses{where} ORDER BY date, id", params
+        ).fetchall()
+
+# Sincronização em segundo plano da cópia local com a coleção de despesas. Com replica set, acompanha
+# os change streams e guarda o resume token na própria cópia (reiniciar o app continua de onde parou);
+# sem replica set, consulta as despesas com updated_at recente. `on_change` recebe as células
+# (dia, categoria) alteradas, ou None quando a cópia inteira foi refeita.
+class ExpenseSync:
+    def __init__(self, collection, store, on_change=None, use_change_streams=True, poll_interval=POLL_INTERVAL_SECONDS):
+        self.collection = collection
+        self.store = store
+        self.on_change = on_change
+        self.use_change_streams = use_change_streams
+        self.poll_interval = poll_interval
+        self.mode = None
+        self.last_sync = None
+        self.last_error = None
+        # A cópia já feita em uma execução anterior pode ser lida antes da primeira sincronização
+        self.ready = threading.Event()
+        if store.get_state("copied_at"):
+            self.ready.set()
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_reconcile = time.monotonic()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="sincronizacao-local", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def is_online(self):
+        return self.last_error is None
+
+    # Laço principal: em caso de erro de conexão, tenta de novo com espera crescente, sem perder a cópia local
+    def run(self):
+        attempt = 0
+        while not self._stop.is_set():
+            try:
+                if self.use_change_streams:
+                    self.watch()
+                else:
+                    self.poll()
+            except PyMongoError as e:
+                self.last_error = str(e)
+                self._stop.wait(RETRY_SECONDS[min(attempt, len(RETRY_SECONDS) - 1)])
+                attempt += 1
+            else:
+                attempt = 0
+
+    def _notify(self, changed):
+        self.last_sync = datetime.now()
+        self.last_error = None
+        if self.on_change and (changed is None or changed):
+            self.on_change(changed)
+
+    # Marca d'água do updated_at: o maior valor já copiado (o polling busca a partir dela, menos a margem)
+    def _advance_mark(self, documents):
+        marks = [to_date_text(document["updated_at"]) for document in documents if isinstance(document.get("updated_at"), datetime)]
+        current = self.store.get_state("updated_mark")
+        if marks and (current is None or max(marks) > current):
+            self.store.set_state("updated_mark", max(marks))
+
+    # Cópia completa da coleção (primeira execução ou resume token perdido)
+    def copy_all(self):
+        mark = datetime.now(timezone.utc).replace(tzinfo=None)
+        projection = {field: 0 for field in EXCLUDED_FIELDS}
+        cursor = self.collection.find({}, projection).batch_size(SYNC_BATCH_SIZE)
+
+        def batches():
+            batch = []
+            for document in cursor:
+                batch.append(document)
+                if len(batch) >= SYNC_BATCH_SIZE:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+
+        count = self.store.replace_all(batches())
+        self.store.set_state("updated_mark", to_date_text(mark))
+        self.store.set_state("copied_at", to_date_text(mark))
+        self.ready.set()
+        self._notify(None)
+        return count
+
+    # Busca de novo algumas despesas pelo _id (ex.: logo após uma escrita do próprio app); as que não
+    # existem mais são apagadas da cópia
+    def refresh(self, ids):
+        ids = list({expense_id for expense_id in ids if expense_id is not None})
+        if not ids:
+            return set()
+        documents = list(self.collection.find({"_id": {"$in": ids}}, {field: 0 for field in EXCLUDED_FIELDS}))
+        found = {document["_id"] for document in documents}
+        changed = self.store.apply(documents, [expense_id for expense_id in ids if expense_id not in found])
+        self._advance_mark(documents)
+        self._notify(changed)
+        return changed
+
+    # Copia as despesas com updated_at a partir da marca d'água (menos a margem)
+    def catch_up(self):
+        mark = self.store.get_state("updated_mark")
+        if mark is None:
+            return self.copy_all()
+        since = datetime.strptime(mark, DATE_TEXT_FORMAT) - POLL_OVERLAP
+        documents = list(self.collection.find({"updated_at": {"$gte": since}}, {field: 0 for field in EXCLUDED_FIELDS}))
+        changed = self.store.apply(documents)
+        self._advance_mark(documents)
+        self._notify(changed)
+        return changed
+
+    # Compara versão e updated_at de todas as despesas com a cópia: encontra as apagadas e as
+    # alteradas por quem não grava updated_at (scripts antigos, edições manuais)
+    def reconcile(self):
+        remote = {
+            document["_id"]: (int(document.get("version") or 0), to_date_text(document.get("updated_at")))
+            for document in self.collection.find({}, {"version": 1, "updated_at": 1})
+        }
+        local = self.store.document_versions()
+        changed_ids = [expense_id for expense_id, state in remote.items() if local.get(str(expense_id)) != state]
+        deleted_ids = set(local) - {str(expense_id) for expense_id in remote}
+        changed = self.store.apply(deleted_ids=deleted_ids)
+        changed |= self.refresh(changed_ids) if changed_ids else set()
+        self._last_reconcile = time.monotonic()
+        self._notify(changed)
+        return changed
+
+    # Modo polling: atualização pelo updated_at a cada poll_interval e reconciliação a cada RECONCILE_SECONDS
+    def poll(self):
+        self.mode = "polling"
+        if not self.store.get_state("copied_at"):
+            self.copy_all()
+        while not self._stop.is_set():
+            self.catch_up()
+            if time.monotonic() - self._last_reconcile > RECONCILE_SECONDS:
+                self.reconcile()
+            self._stop.wait(self.poll_interval)
+
+    # Modo change streams: o stream é aberto antes da cópia completa, então nenhuma alteração feita
+    # durante a cópia se perde (reaplicar um documento já copiado não muda nada)
+    def watch(self):
+        token = self.store.get_state("resume_token")
+        copied = self.store.get_state("copied_at") and token is not None
+        pipeline = [{"$project": {f"fullDocument.{field}": 0 for field in EXCLUDED_FIELDS}}]
+        try:
+            stream = self.collection.watch(
+                pipeline,
+                full_document="updateLookup",
+                resume_after=bson.decode(token) if copied else None,
+                max_await_time_ms=1000
+            )
+        except OperationFailure as e:
+            if e.code in CHANGE_STREAMS_UNSUPPORTED:
+                self.use_change_streams = False
+                return
+            if e.code in RESUME_TOKEN_LOST:
+                self.store.set_state("resume_token", None)
+                return
+            raise
+
+        self.mode = "change streams"
+        with stream:
+            if not copied:
+                self.copy_all()
+            while not self._stop.is_set() and stream.alive:
+                documents, deleted_ids = {}, set()
+                change = stream.try_next()
+                while change is not None:
+                    operation = change["operationType"]
+                    if operation in ("insert", "update", "replace"):
+                        expense_id = change["documentKey"]["_id"]
+                        if change.get("fullDocument") is not None:
+                            documents[expense_id] = change["fullDocument"]
+                            deleted_ids.discard(expense_id)
+                        else:
+                            # Apagada antes da leitura do documento completo
+                            documents.pop(expense_id, None)
+                            deleted_ids.add(expense_id)
+                    elif operation == "delete":
+                        documents.pop(change["documentKey"]["_id"], None)
+                        deleted_ids.add(change["documentKey"]["_id"])
+                    elif operation in ("drop", "rename", "dropDatabase", "invalidate"):
+                        # A coleção foi trocada: a cópia é refeita em uma nova execução do watch
+                        self.store.set_state("resume_token", None)
+                        return
+                    if len(documents) + len(deleted_ids) >= SYNC_BATCH_SIZE:
+                        break
+                    change = stream.try_next()
+
+                changed = self.store.apply(list(documents.values()), deleted_ids) if documents or deleted_ids else set()
+                self._advance_mark(list(documents.values()))
+                if stream.resume_token is not None:
+                    self.store.set_state("resume_token", bson.encode(stream.resume_token))
+                self._notify(changed)
+
+# Uso: python local_store.py sync [--path .cache/expenses.sqlite3] [--poll]
+#      python local_store.py status [--path .cache/expenses.sqlite3]
+def main():
+    parser = argparse.ArgumentParser(description="Cópia local (SQLite) das despesas, sincronizada com o MongoDB")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    sync_parser = subparsers.add_parser("sync", help="Sincroniza a cópia local e continua acompanhando as alterações")
+    sync_parser.add_argument("--path", default=DEFAULT_LOCAL_STORE_PATH)
+    sync_parser.add_argument("--poll", action="store_true", help="Usa o polling pelo updated_at mesmo com replica set")
+    status_parser = subparsers.add_parser("status", help="Mostra o estado da cópia local")
+    status_parser.add_argument("--path", default=DEFAULT_LOCAL_STORE_PATH)
+    args = parser.parse_args()
+
+    store = LocalStore(args.path)
+    if args.command == "status":
+        print(f"{store.count()} despesas na cópia local ({args.path}).")
+        print(f"Cópia completa em: {store.get_state('copied_at') or 'nunca'}")
+        print(f"Última alteração copiada (updated_at): {store.get_state('updated_mark') or '-'}")
+        print(f"Resume token do change stream: {'sim' if store.get_state('resume_token') else 'não'}")
+        return
+
+    db = create_client(get_mongodb_uri())[DATABASE_NAME]
+    ensure_indexes(db)
+    sync = ExpenseSync(
+        db['expenses'], store,
+        lambda changed: print(f"{'Cópia completa' if changed is None else f'{len(changed)} células alteradas'} "
+                              f"({store.count()} despesas)"),
+        use_change_streams=not args.poll
+    )
+    try:
+        sync.start()
+        while True:
+            time.sleep(1)
+            if sync.last_error:
+                print(f"Erro de sincronização: {sync.last_error}")
+                sync.last_error = None
+    except KeyboardInterrupt:
+        sync.stop()
+        print(f"Sincronização encerrada ({sync.mode}).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import argparse
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+from pymongo import UpdateOne
+
+from database import DATABASE_NAME, create_client, get_mongodb_uri
+
+# Os valores são gravados em centavos inteiros (amount_cents) e somados como inteiros no MongoDB e no
+# pandas (int64): somas exatas, sem o erro acumulado do float. Reais só aparecem na hora de exibir.
+MIGRATION_BATCH_SIZE = 1000
+
+# Função para converter valores como "1.234,56", "-45.90" ou "R$ 12,00" em Decimal (sem passar por float)
+def parse_amount(text):
+    text = (text or "").replace("R$", "").replace(" ", "").strip()
+    if "," in text and "." in text:
+        if text.rfind(",") > text.rfind("."):
+            text = text.replace(".", "").replace(",", ".")
+        else:
+            text = text.replace(",", "")
+    else:
+        text = text.replace(",", ".")
+    try:
+        value = Decimal(text)
+    except InvalidOperation:
+        raise ValueError(f"valor inválido: {text!r}")
+    if not value.is_finite():
+        raise ValueError(f"valor inválido: {text!r}")
+    return value
+
+# Função para converter um valor em reais (float do st.number_input, texto de dados antigos ou Decimal)
+# em centavos inteiros, arredondando meio centavo para cima como no arredondamento comercial
+def to_cents(value):
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        value = parse_amount(value)
+    elif isinstance(value, float):
+        # O texto de um float é o menor que o representa: 0.1 vira "0.1", e não 0.1000000000000000055...
+        value = Decimal(str(float(value)))
+    else:
+        value = Decimal(int(value)) if not isinstance(value, Decimal) else value
+    if not value.is_finite():
+        raise ValueError(f"valor inválido: {value}")
+    return int((value * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+# Função para obter o valor de uma despesa em centavos (aceita documentos ainda não migrados)
+def get_amount_cents(expense):
+    if expense.get("amount_cents") is not None:
+        return int(expense["amount_cents"])
+    return to_cents(expense.get("amount"))
+
+# Função para converter centavos em reais (números, arrays do NumPy ou colunas do pandas), para gráficos e campos numéricos
+def cents_to_reais(cents):
+    return cents / 100
+
+# Função para escrever centavos como texto decimal exato com ponto ("1234.56"), para arquivos e hashes
+def format_decimal(cents):
+    reais, remainder = divmod(abs(int(cents)), 100)
+    return f"{'-' if cents < 0 else ''}{reais}.{remainder:02d}"
+
+# Função para formatar centavos em reais no padrão brasileiro ("R$ 1.234,56")
+def format_brl(cents):
+    reais, remainder = divmod(abs(int(cents)), 100)
+    return f"{'-' if cents < 0 else ''}R$ {reais:,}".replace(",", ".") + f",{remainder:02d}"
+
+# Função para converter o campo antigo `amount` (float ou texto) em `amount_cents` nas despesas e nas
+# regras de despesas recorrentes, em lotes de bulk_write. Cada UpdateOne só vale enquanto o documento
+# ainda tem o valor lido, então uma edição feita no meio da migração não é sobrescrita.
+def migrate_amounts(db, batch_size=MIGRATION_BATCH_SIZE, log=print):
+    migrated = 0
+    for collection_name in ("expenses", "recurring_rules"):
+        collection = db[collection_name]
+        operations = []
+        cursor = collection.find({"amount": {"$exists": True}}, {"amount": 1}).batch_size(batch_size)
+        for document in cursor:
+            try:
+                cents = to_cents(document["amount"])
+            except (TypeError, ValueError):
+                log(f"{collection_name} {document['_id']}: valor inválido {document['amount']!r}, gravado como 0")
+                cents = 0
+            update = {"$set": {"amount_cents": cents}, "$unset": {"amount": ""}}
+            if collection_name == "expenses":
+                update["$inc"] = {"version": 1}
+                update["$currentDate"] = {"updated_at": True}
+            operations.append(UpdateOne({"_id": document["_id"], "amount": document["amount"]}, update))
+            if len(operations) >= batch_size:
+                migrated += collection.bulk_write(operations, ordered=False).modified_count
+                operations = []
+        if operations:
+            migrated += collection.bulk_write(operations, ordered=False).modified_count
+    log(f"Migração concluída: {migrated} documentos convertidos para centavos.")
+    return migrated
+
+# Uso: python money.py migrate [--batch-size 1000]
+def main():
+    parser = argparse.ArgumentParser(description="Manutenção dos valores das despesas")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    migrate_parser = subparsers.add_parser("migrate", help="Converte os valores antigos (float) em centavos inteiros")
+    migrate_parser.add_argument("--batch-size", type=int, default=MIGRATION_BATCH_SIZE)
+    args = parser.parse_args()
+
+    client = create_client(get_mongodb_uri())
+    if args.command == "migrate":
+        migrate_amounts(client[DATABASE_NAME], args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import io
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+# A pré-visualização de PDFs é opcional: sem o pypdfium2 os PDFs aparecem apenas com o botão de download
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
+THUMBNAIL_SIZE = (300, 300)  # O dobro da largura exibida, para telas de alta densidade
+THUMBNAIL_QUALITY = 80
+PREVIEW_CACHE_DIR = os.path.join(".cache", "previews")
+
+# Função para saber se é possível gerar miniatura para o tipo do anexo
+def can_preview(content_type):
+    if not isinstance(content_type, str):
+        return False
+    return 'image' in content_type or ('pdf' in content_type and pdfium is not None)
+
+# Função para gerar a miniatura JPEG de uma imagem ou da primeira página de um PDF
+def generate_preview(data, content_type):
+    try:
+        if content_type and 'image' in content_type:
+            image = Image.open(io.BytesIO(data))
+        elif content_type and 'pdf' in content_type and pdfium is not None:
+            document = pdfium.PdfDocument(data)
+            try:
+                page = document[0]
+                # Renderiza em uma escala que já deixa a página próxima do tamanho da miniatura
+                scale = THUMBNAIL_SIZE[1] / page.get_height()
+                image = page.render(scale=scale).to_pil()
+            finally:
+                document.close()
+        else:
+            return None
+
+        image.thumbnail(THUMBNAIL_SIZE)
+        buffer = io.BytesIO()
+        image.convert("RGB").save(buffer, format="JPEG", quality=THUMBNAIL_QUALITY)
+        return buffer.getvalue()
+    except Exception:
+        # Arquivo corrompido ou formato não suportado: a página mostra apenas o download
+        return None
+
+# Cache de miniaturas: LRU limitado em memória, com cópia em disco que sobrevive aos reinícios.
+# A cópia em disco também é um LRU, com limite próprio: o horário de modificação de cada arquivo
+# marca o último uso, e os arquivos usados há mais tempo são apagados quando o limite é passado.
+class PreviewCache:
+    def __init__(self, directory=PREVIEW_CACHE_DIR, max_bytes=32 * 1024 * 1024, max_disk_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._items = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._files, self._disk_size = self._scan_files()
+        with self._lock:
+            self._evict_files()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.jpg")
+
+    # Lista os arquivos já gravados (de execuções anteriores), do usado há mais tempo para o mais recente
+    def _scan_files(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(".jpg"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name[:-len(".jpg")], stat.st_size))
+        files = OrderedDict((key, size) for _, key, size in sorted(entries))
+        return files, sum(files.values())
+
+    def _remember(self, key, data):
+        if key in self._items:
+            self._size -= len(self._items.pop(key))
+        self._items[key] = data
+        self._size += len(data)
+        # Remove as miniaturas usadas há mais tempo até voltar ao limite de memória
+        while self._size > self.max_bytes and len(self._items) > 1:
+            _, evicted = self._items.popitem(last=False)
+            self._size -= len(evicted)
+
+    def _forget_file(self, key):
+        self._disk_size -= self._files.pop(key, 0)
+
+    # Apaga os arquivos usados há mais tempo até voltar ao limite do disco
+    def _evict_files(self):
+        while self._disk_size > self.max_disk_bytes and len(self._files) > 1:
+            key, size = self._files.popitem(last=False)
+            self._disk_size -= size
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def get(self, key):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return self._items[key]
+        try:
+            with open(self._path(key), "rb") as file:
+                data = file.read()
+            os.utime(self._path(key))
+        except OSError:
+            return None
+        with self._lock:
+            self._remember(key, data)
+            if key in self._files:
+                self._files.move_to_end(key)
+        return data
+
+    def put(self, key, data):
+        if not data:
+            return
+        with self._lock:
+            self._remember(key, data)
+        try:
+            with open(self._path(key), "wb") as file:
+                file.write(data)
+        except OSError:
+            return  # O disco é apenas uma cópia de apoio; a memória continua válida
+        with self._lock:
+            self._forget_file(key)
+            self._files[key] = len(data)
+            self._disk_size += len(data)
+            self._evict_files()
+
+    def discard(self, key):
+        with self._lock:
+            if key in self._items:
+                self._size -= len(self._items.pop(key))
+            self._forget_file(key)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
@@ -0,0 +1,29 @@
+import re
+from datetime import datetime
+
+# Filtros das despesas por período, sem dependência do Streamlit: usados pelo app (data_access.py)
+# e pelos scripts de linha de comando (export.py, benchmarks)
+
+# Função para calcular o intervalo [início, fim) de um mês ou, sem mês, de um ano inteiro
+def get_date_range(year, month=None):
+    if month is None:
+        return datetime(year, 1, 1), datetime(year + 1, 1, 1)
+    start = datetime(year, month, 1)
+    end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    return start, end
+
+# Função para montar o filtro do MongoDB a partir do período e dos filtros de coluna.
+# filters = (categorias, situação de pagamento, texto da descrição); None ou vazio significa sem filtro.
+def build_expense_query(year=None, month=None, filters=None):
+    query = {}
+    if year is not None:
+        start, end = get_date_range(int(year), int(month) if month is not None else None)
+        query["date"] = {"$gte": start, "$lt": end}
+    categories, is_paid, name_contains = filters or (None, None, None)
+    if categories:
+        query["category"] = {"$in": list(categories)}
+    if is_paid is not None:
+        query["is_paid"] = True if is_paid else {"$ne": True}
+    if name_contains:
+        query["name"] = {"$regex": re.escape(name_contains), "$options": "i"}
+    return query
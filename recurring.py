@@ -0,0 +1,182 @@
+import argparse
+import calendar
+from datetime import datetime
+
+from pymongo import UpdateMany, UpdateOne
+
+from categories import category_label, normalize_category
+from database import DATABASE_NAME, create_client, ensure_indexes, get_mongodb_uri, get_write_time
+from money import format_brl, get_amount_cents, to_cents
+
+# Coleção com as regras das contas fixas (água, energia, aluguel, internet...). Cada regra gera
+# uma despesa por período (mês "AAAA-MM"), identificada por (recurring_rule_id, recurring_period).
+RECURRING_COLLECTION = 'recurring_rules'
+
+# Função para converter "AAAA-MM" em um índice de mês (ano * 12 + mês - 1) e vice-versa
+def period_index(period):
+    try:
+        year, month = (int(part) for part in period.split("-"))
+    except (AttributeError, ValueError):
+        raise ValueError(f"Período inválido: {period!r} (use AAAA-MM)")
+    if not 1 <= month <= 12:
+        raise ValueError(f"Período inválido: {period!r} (use AAAA-MM)")
+    return year * 12 + month - 1
+
+def index_period(index):
+    year, month = divmod(index, 12)
+    return f"{year:04d}-{month + 1:02d}"
+
+# Função para obter o período do mês atual
+def current_period():
+    today = datetime.today()
+    return f"{today.year:04d}-{today.month:02d}"
+
+# Função para montar uma regra de despesa recorrente (ainda não gravada)
+def build_rule(name, amount, category, day, start, end=None, every=1, notes=""):
+    if not 1 <= day <= 31:
+        raise ValueError("O dia de vencimento deve estar entre 1 e 31")
+    if every < 1:
+        raise ValueError("O intervalo deve ser de pelo menos 1 mês")
+    if end is not None and period_index(end) < period_index(start):
+        raise ValueError("O último período não pode ser anterior ao primeiro")
+    return {
+        "name": name,
+        "amount_cents": to_cents(amount),
+        "category": normalize_category(category),
+        "day": int(day),
+        "start": index_period(period_index(start)),
+        "end": index_period(period_index(end)) if end else None,
+        "every": int(every),
+        "notes": notes,
+        "active": True
+    }
+
+# Função para listar os índices dos períodos em que uma regra vence dentro do intervalo [first, last]
+def due_periods(rule, first, last):
+    start = period_index(rule["start"])
+    end = period_index(rule["end"]) if rule.get("end") else last
+    every = rule.get("every") or 1
+    # Primeiro vencimento a partir de first que respeita o intervalo da regra
+    begin = max(first, start)
+    begin += (start - begin) % every
+    return range(begin, min(last, end) + 1, every)
+
+# Função para montar a despesa de uma regra em um período; dias que não existem no mês (31 em
+# fevereiro, por exemplo) caem no último dia do mês
+def build_occurrence(rule, index):
+    year, month = divmod(index, 12)
+    month += 1
+    day = min(rule["day"], calendar.monthrange(year, month)[1])
+    return {
+        "name": rule["name"],
+        "amount_cents": get_amount_cents(rule),
+        "date": datetime(year, month, day),
+        "category": rule["category"],
+        "notes": rule.get("notes", ""),
+        "is_paid": False,
+        "payment_date": None,
+        "recurring_rule_id": rule["_id"],
+        "recurring_period": index_period(index),
+        "updated_at": get_write_time()
+    }
+
+# Função para gerar as despesas das regras ativas nos períodos [first, last] (AAAA-MM) com um único
+# bulk_write de upserts. O $setOnInsert só age quando a ocorrência ainda não existe: rodar de novo não
+# duplica nada e não desfaz edições (valor, pagamento) feitas nas despesas já geradas.
+def materialize(db, first, last, rules=None):
+    first, last = period_index(first), period_index(last)
+    rules = list(db[RECURRING_COLLECTION].find({"active": True})) if rules is None else rules
+    operations = []
+    occurrences = []
+    for rule in rules:
+        for index in due_periods(rule, first, last):
+            occurrence = build_occurrence(rule, index)
+            key = {"recurring_rule_id": rule["_id"], "recurring_period": occurrence["recurring_period"]}
+            operations.append(UpdateOne(key, {"$setOnInsert": occurrence}, upsert=True))
+            occurrences.append(occurrence)
+
+    result = {"due": len(operations), "inserted": 0, "months": set()}
+    if not operations:
+        return result
+    upserted = db['expenses'].bulk_write(operations, ordered=False).upserted_ids
+    inserted = [{**occurrences[index], "_id": expense_id} for index, expense_id in upserted.items()]
+    result["inserted"] = len(inserted)
+    result["months"] = {(expense["date"].year, expense["date"].month) for expense in inserted}
+    return result
+
+# Função para gerar as ocorrências vencidas até o período informado (por padrão, o mês atual).
+# Cada regra guarda até onde já foi gerada (materialized_until): uma ocorrência apagada de propósito
+# não volta na próxima execução; para refazer um intervalo antigo, use materialize diretamente.
+def materialize_due(db, until=None):
+    until = until or current_period()
+    until_index = period_index(until)
+    pending = [
+        rule for rule in db[RECURRING_COLLECTION].find({"active": True})
+        if period_index(rule.get("materialized_until") or rule["start"]) <= until_index
+    ]
+    result = {"due": 0, "inserted": 0, "months": set()}
+    if not pending:
+        return result
+
+    # Regras com o mesmo ponto de partida são geradas juntas; normalmente é um único grupo
+    groups = {}
+    for rule in pending:
+        groups.setdefault(rule.get("materialized_until") or rule["start"], []).append(rule)
+    for first, rules in groups.items():
+        partial = materialize(db, first, until, rules)
+        result["due"] += partial["due"]
+        result["inserted"] += partial["inserted"]
+        result["months"] |= partial["months"]
+
+    next_period = index_period(until_index + 1)
+    db[RECURRING_COLLECTION].bulk_write([
+        UpdateMany({"_id": {"$in": [rule["_id"] for rule in pending]}}, {"$set": {"materialized_until": next_period}})
+    ])
+    return result
+
+# Uso: python recurring.py add "Aluguel" 1800 --category aluguel --day 5 --start 2024-01
+#      python recurring.py list
+#      python recurring.py materialize [--start 2020-01 --end 2024-12]
+def main():
+    parser = argparse.ArgumentParser(description="Despesas recorrentes (contas fixas)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    add_parser = subparsers.add_parser("add", help="Cadastra uma regra de despesa recorrente")
+    add_parser.add_argument("name")
+    add_parser.add_argument("amount", help="Valor em reais (ex.: 1800 ou 1.800,00)")
+    add_parser.add_argument("--category", default="")
+    add_parser.add_argument("--day", type=int, required=True, help="Dia do vencimento (1 a 31)")
+    add_parser.add_argument("--start", default=current_period(), help="Primeiro período (AAAA-MM)")
+    add_parser.add_argument("--end", help="Último período (AAAA-MM); sem ele a regra não termina")
+    add_parser.add_argument("--every", type=int, default=1, help="Intervalo em meses")
+    add_parser.add_argument("--notes", default="")
+
+    subparsers.add_parser("list", help="Lista as regras cadastradas")
+
+    materialize_parser = subparsers.add_parser("materialize", help="Gera as despesas das regras")
+    materialize_parser.add_argument("--start", help="Primeiro período (AAAA-MM); sem ele, gera só o que está pendente")
+    materialize_parser.add_argument("--end", default=current_period(), help="Último período (AAAA-MM)")
+    args = parser.parse_args()
+
+    db = create_client(get_mongodb_uri())[DATABASE_NAME]
+    if args.command == "add":
+        rule = build_rule(args.name, args.amount, args.category, args.day, args.start, args.end, args.every, args.notes)
+        rule_id = db[RECURRING_COLLECTION].insert_one(rule).inserted_id
+        print(f"Regra cadastrada: {rule_id}")
+    elif args.command == "list":
+        for rule in db[RECURRING_COLLECTION].find().sort("name", 1):
+            period = f"{rule['start']} a {rule['end'] or '...'}"
+            print(f"{rule['_id']}  {rule['name']:<20} {format_brl(get_amount_cents(rule)):>13}  {category_label(rule['category']):<12} "
+                  f"dia {rule['day']:>2}, a cada {rule.get('every', 1)} mês(es), {period}"
+                  f"{'' if rule.get('active', True) else ' (inativa)'}")
+    else:
+        ensure_indexes(db)
+        if args.start:
+            result = materialize(db, args.start, args.end)
+        else:
+            result = materialize_due(db, args.end)
+        print(f"{result['inserted']} despesas geradas ({result['due'] - result['inserted']} já existiam).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import argparse
+from datetime import datetime
+
+from categories import category_label
+from database import DATABASE_NAME, create_client, get_mongodb_uri
+from local_store import DEFAULT_LOCAL_STORE_PATH, LocalStore, normalize_text
+from money import format_brl, get_amount_cents
+
+# Busca por descrição e observações em todos os meses. Com conexão, usa o índice de texto do MongoDB
+# (com radicais do português: "mercados" encontra "mercado"); sem conexão, ou quando o índice de texto
+# não encontra nada, usa o índice de trigramas da cópia local (local_store.py), que encontra trechos
+# de palavras e tolera erros de digitação.
+SEARCH_PAGE_SIZE = 20
+SEARCH_FIELDS = ("name", "amount_cents", "date", "category", "notes", "is_paid")
+
+# Na busca aproximada, as MAX_CANDIDATES despesas com mais trigramas em comum são reordenadas pela
+# semelhança, e só entram as que têm pelo menos MIN_SIMILARITY (0 a 1) em relação à busca
+MAX_CANDIDATES = 500
+MIN_SIMILARITY = 0.3
+# Uma semelhança encontrada só nas observações vale menos que a mesma semelhança na descrição
+NOTES_SIMILARITY_WEIGHT = 0.8
+
+# Função para obter os trigramas de uma palavra, com as bordas marcadas ("  pao " -> "  p", " pa", "pao", "ao ")
+def word_trigrams(word):
+    padded = f"  {word} "
+    return {padded[index:index + 3] for index in range(len(padded) - 2)}
+
+# Função para medir a semelhança (0 a 1) entre a busca e um texto: para cada palavra buscada, a maior
+# semelhança de trigramas (Jaccard) com alguma palavra do texto, na média das palavras buscadas
+def text_similarity(query_words, text):
+    text_trigrams = [word_trigrams(word) for word in normalize_text(text).split()]
+    if not query_words or not text_trigrams:
+        return 0.0
+    total = 0.0
+    for word in query_words:
+        trigrams = word_trigrams(word)
+        total += max(len(trigrams & other) / len(trigrams | other) for other in text_trigrams)
+    return total / len(query_words)
+
+# Função para escrever um termo entre aspas na sintaxe do FTS5 (aspas internas são duplicadas)
+def quote_term(term):
+    return '"' + term.replace('"', '""') + '"'
+
+# Função para montar a consulta do FTS5: termos exatos (trechos de pelo menos 3 letras, todos obrigatórios)
+# ou, na busca aproximada, qualquer trigrama das palavras buscadas
+def build_match_query(words, fuzzy=False):
+    if fuzzy:
+        terms = {word[index:index + 3] for word in words for index in range(len(word) - 2)}
+        return " OR ".join(quote_term(term) for term in sorted(terms))
+    return " AND ".join(quote_term(word) for word in words if len(word) >= 3)
+
+# Função para buscar na cópia local: primeiro pelos trechos exatos (ranking BM25, com a descrição valendo
+# mais que as observações); sem resultados, pela semelhança de trigramas. Devolve (despesas, total, aproximada).
+def search_local(store, query, fields=SEARCH_FIELDS, skip=0, limit=SEARCH_PAGE_SIZE):
+    words = normalize_text(query).split()
+    if not words:
+        return [], 0, False
+    # Palavras com menos de 3 letras não cabem no índice de trigramas e são conferidas uma a uma
+    short_words = [word for word in words if len(word) < 3]
+    match = build_match_query(words)
+    total = store.count_search(match, short_words)
+    if total or len(words) == len(short_words):
+        return store.find_search(match, short_words, fields, limit, skip), total, False
+
+    candidates = store.find_search(build_match_query(words, fuzzy=True), (), list(fields) + ["notes"], MAX_CANDIDATES)
+    scored = []
+    for expense in candidates:
+        similarity = max(text_similarity(words, expense.get("name")),
+                         text_similarity(words, expense.get("notes")) * NOTES_SIMILARITY_WEIGHT)
+        if similarity >= MIN_SIMILARITY:
+            scored.append((similarity, expense))
+    # Mais semelhantes primeiro; entre as igualmente semelhantes, as mais recentes
+    scored.sort(key=lambda item: item[1].get("date") or datetime.min, reverse=True)
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return [expense for _, expense in scored[skip:skip + limit]], len(scored), True
+
+# Função para buscar no índice de texto do MongoDB, das despesas mais relevantes para as menos relevantes
+def search_text_index(collection, query, fields=SEARCH_FIELDS, skip=0, limit=SEARCH_PAGE_SIZE):
+    text_filter = {"$text": {"$search": query}}
+    projection = {field: 1 for field in fields}
+    projection["score"] = {"$meta": "textScore"}
+    expenses = list(
+        collection.find(text_filter, projection)
+        .sort([("score", {"$meta": "textScore"}), ("date", -1)])
+        .skip(skip)
+        .limit(limit)
+    )
+    total = collection.count_documents(text_filter) if expenses or skip else 0
+    return expenses, total
+
+# Uso: python search.py "mercado" [--page 1] [--local] [--store .cache/expenses.sqlite3]
+def main():
+    parser = argparse.ArgumentParser(description="Busca despesas pela descrição e pelas observações")
+    parser.add_argument("query")
+    parser.add_argument("--page", type=int, default=1)
+    parser.add_argument("--local", action="store_true", help="Busca só na cópia local (trigramas)")
+    parser.add_argument("--store", default=DEFAULT_LOCAL_STORE_PATH)
+    args = parser.parse_args()
+
+    skip = (args.page - 1) * SEARCH_PAGE_SIZE
+    expenses, total, source = [], 0, "índice de texto"
+    if not args.local:
+        collection = create_client(get_mongodb_uri())[DATABASE_NAME]['expenses']
+        expenses, total = search_text_index(collection, args.query, skip=skip)
+    if not total:
+        expenses, total, fuzzy = search_local(LocalStore(args.store), args.query, skip=skip)
+        source = "busca aproximada" if fuzzy else "cópia local"
+    for expense in expenses:
+        print(f"{expense['date']:%d/%m/%Y}  {expense.get('name', ''):<30} {format_brl(get_amount_cents(expense)):>14}  "
+              f"{category_label(expense.get('category'))}")
+    print(f"{total} despesas encontradas ({source}).")
+
+
+if __name__ == "__main__":
+    main()
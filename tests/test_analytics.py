@@ -0,0 +1,101 @@
+import random
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from analytics import AnalyticsStore, YearAnalytics
+
+CATEGORIES = ["mercado", "lazer", "aluguel"]
+
+
+def make_cells(count=300, seed=1):
+    rng = random.Random(seed)
+    cells = {}
+    for _ in range(count):
+        key = (datetime(2025, 1, 1) + timedelta(days=rng.randint(0, 364)), rng.choice(CATEGORIES))
+        cells[key] = cells.get(key, 0) + rng.randint(1, 9999)
+    return cells
+
+
+def to_rollups(cells):
+    return [{"day": day, "category": category, "total_cents": total} for (day, category), total in cells.items() if total]
+
+
+def assert_same(analytics, expected):
+    pd.testing.assert_frame_equal(analytics.daily, expected.daily, check_names=False, check_freq=False, check_like=True)
+    pd.testing.assert_series_equal(analytics.monthly, expected.monthly, check_names=False, check_index_type=False)
+    pd.testing.assert_series_equal(analytics.categories.sort_index(), expected.categories.sort_index(), check_names=False)
+
+
+def test_with_cells_matches_a_full_recompute():
+    rng = random.Random(2)
+    cells = make_cells()
+    analytics = YearAnalytics.from_rollups(to_rollups(cells))
+
+    for _ in range(20):
+        changes = {}
+        for _ in range(rng.randint(1, 5)):
+            key = rng.choice(list(cells)) if rng.random() < 0.6 else (datetime(2025, rng.randint(1, 12), rng.randint(1, 28)), rng.choice(CATEGORIES))
+            changes[key] = 0 if rng.random() < 0.3 else rng.randint(1, 9999)
+        cells.update(changes)
+        analytics = analytics.with_cells(changes)
+        assert_same(analytics, YearAnalytics.from_rollups(to_rollups(cells)))
+
+
+def test_with_cells_drops_emptied_days_and_categories():
+    day = datetime(2025, 4, 10)
+    analytics = YearAnalytics.from_rollups(to_rollups({(day, "lazer"): 500, (datetime(2025, 5, 1), "mercado"): 300}))
+
+    updated = analytics.with_cells({(day, "lazer"): 0})
+
+    assert "lazer" not in updated.daily.columns
+    assert pd.Timestamp(day) not in updated.daily.index
+    assert 4 not in updated.monthly.index
+    # O objeto anterior continua igual para quem ainda o está exibindo
+    assert analytics.daily.at[pd.Timestamp(day), "lazer"] == 500
+
+
+def test_daily_without_skips_days_with_only_that_category():
+    analytics = YearAnalytics.from_rollups(to_rollups({
+        (datetime(2025, 1, 5), "aluguel"): 150000,
+        (datetime(2025, 1, 6), "aluguel"): 100,
+        (datetime(2025, 1, 6), "mercado"): 200
+    }))
+    daily = analytics.daily_without("aluguel")
+    assert list(daily.index) == [pd.Timestamp(2025, 1, 6)]
+    assert list(daily.columns) == ["mercado"]
+
+
+def test_store_reads_only_the_changed_cells_after_a_write():
+    cells = make_cells()
+    state = {"version": 1, "year_loads": 0, "cell_loads": []}
+
+    def load_year(year):
+        state["year_loads"] += 1
+        return to_rollups(cells)
+
+    def load_cells(keys):
+        state["cell_loads"].append(set(keys))
+        return {key: cells.get(key, 0) for key in keys}
+
+    def read():
+        return store.get(2025, lambda: state["version"], load_year, load_cells)
+
+    store = AnalyticsStore(ttl_seconds=3600)
+    first = read()
+    assert read() is first
+
+    key = (datetime(2025, 6, 1), "mercado")
+    cells[key] = cells.get(key, 0) + 1234
+    store.mark_changed([key])
+    state["version"] += 1
+
+    assert_same(read(), YearAnalytics.from_rollups(to_rollups(cells)))
+    assert state["year_loads"] == 1
+    assert state["cell_loads"] == [{key}]
+
+    # Sem as células alteradas (ex.: importação em massa), o ano é recalculado
+    store.discard([2025])
+    state["version"] += 1
+    read()
+    assert state["year_loads"] == 2
@@ -0,0 +1,70 @@
+import mongomock
+import pytest
+from bson import ObjectId
+
+import attachments
+from attachments import migrate_inline_attachments
+
+
+@pytest.fixture
+def db():
+    db = mongomock.MongoClient()["test"]
+    db["expenses"].insert_many([
+        {"_id": 1, "version": 2, "attachment_data": b"antigo", "attachment_name": "nota.jpg", "attachment_type": "image/jpeg"},
+        {"_id": 2, "attachment_data": b""}
+    ])
+    return db
+
+
+# GridFS simulado em um dicionário (o mongomock não implementa o GridFSBucket da versão atual do pymongo)
+@pytest.fixture
+def files(monkeypatch):
+    files = {}
+
+    def save_attachment(db, expense_id, name, content_type, data):
+        file_id = ObjectId()
+        files[file_id] = data
+        return {"attachment_id": file_id, "attachment_name": name, "attachment_type": content_type, "attachment_size": len(data)}
+
+    def delete_attachments(db, file_ids):
+        for file_id in file_ids:
+            files.pop(file_id, None)
+
+    monkeypatch.setattr(attachments, "save_attachment", save_attachment)
+    monkeypatch.setattr(attachments, "delete_attachments", delete_attachments)
+    return files
+
+
+def test_migration_moves_blobs_out_of_the_expenses(db, files):
+    assert migrate_inline_attachments(db, log=lambda message: None) == 2
+
+    first, second = db["expenses"].find().sort("_id", 1)
+    assert "attachment_data" not in first
+    assert files == {first["attachment_id"]: b"antigo"}
+    assert first["version"] == 3
+    assert second == {"_id": 2, "version": 1, "updated_at": second["updated_at"]}
+
+
+# O usuário troca o anexo pelo app depois que a migração leu o binário antigo e antes da gravação
+def test_migration_keeps_an_attachment_replaced_meanwhile(db, files, monkeypatch):
+    save_attachment = attachments.save_attachment
+    replaced = {}
+
+    def save_and_replace(db, expense_id, name, content_type, data):
+        reference = save_attachment(db, expense_id, name, content_type, data)
+        if not replaced:
+            replaced.update(save_attachment(db, expense_id, "nova.jpg", "image/jpeg", b"novo"))
+            db["expenses"].update_one(
+                {"_id": expense_id},
+                {"$set": replaced, "$unset": {"attachment_data": ""}, "$inc": {"version": 1}}
+            )
+        return reference
+
+    monkeypatch.setattr(attachments, "save_attachment", save_and_replace)
+    assert migrate_inline_attachments(db, log=lambda message: None) == 1
+
+    expense = db["expenses"].find_one({"_id": 1})
+    assert expense["attachment_id"] == replaced["attachment_id"]
+    assert expense["version"] == 3
+    # O arquivo do binário antigo, gravado pela migração, não fica órfão
+    assert files == {replaced["attachment_id"]: b"novo"}
@@ -0,0 +1,86 @@
+from datetime import datetime
+
+import mongomock
+import pytest
+
+from budgets import (ON_TRACK, OVER_BUDGET, PROJECTED_OVER, WARNING, evaluate_budgets, load_budgets, remove_budget,
+                     set_budget)
+from database import ensure_indexes
+from local_store import LocalStore
+
+# 10 de abril de 2025: 10 dias decorridos e 20 restantes
+TODAY = datetime(2025, 4, 10)
+
+
+@pytest.fixture
+def db():
+    db = mongomock.MongoClient()["test"]
+    ensure_indexes(db)
+    return db
+
+
+def by_category(statuses):
+    return {status["category"]: status for status in statuses}
+
+
+def test_set_budget_normalizes_category_and_amount(db):
+    assert set_budget(db, "Água", "1.500,00") == ("agua", 150000)
+    set_budget(db, "agua", 200)
+    set_budget(db, "mercado", 800.5)
+
+    assert load_budgets(db) == {"agua": 20000, "mercado": 80050}
+    assert remove_budget(db, "💧 Água") == 1
+    assert remove_budget(db, "agua") == 0
+    assert load_budgets(db) == {"mercado": 80050}
+
+
+def test_set_budget_rejects_non_positive_limits(db):
+    with pytest.raises(ValueError):
+        set_budget(db, "mercado", "0")
+    assert load_budgets(db) == {}
+
+
+def test_statuses_of_the_current_month():
+    budgets = {"mercado": 100000, "lazer": 100000, "aluguel": 200000, "agua": 10000, "energia": 10000}
+    totals = {"mercado": (110000, 0), "lazer": (40000, 0), "aluguel": (180000, 180000), "agua": (1000, 0)}
+
+    statuses = evaluate_budgets(budgets, totals, 2025, 4, TODAY)
+    result = by_category(statuses)
+
+    assert [status["status"] for status in statuses] == [OVER_BUDGET, PROJECTED_OVER, WARNING, ON_TRACK, ON_TRACK]
+    assert result["mercado"]["status"] == OVER_BUDGET
+    assert result["lazer"]["daily_rate_cents"] == 4000
+    assert result["lazer"]["projected_cents"] == 120000
+    # A conta fixa já lançada não é extrapolada até o fim do mês
+    assert result["aluguel"]["status"] == WARNING
+    assert result["aluguel"]["projected_cents"] == 180000
+    assert result["agua"]["daily_allowance_cents"] == 450
+    assert result["energia"]["spent_cents"] == 0
+
+
+def test_past_and_future_months_are_not_projected():
+    budgets = {"lazer": 100000}
+    totals = {"lazer": (40000, 0)}
+
+    past = evaluate_budgets(budgets, totals, 2025, 3, TODAY)[0]
+    future = evaluate_budgets(budgets, totals, 2025, 5, TODAY)[0]
+
+    assert (past["projected_cents"], past["daily_allowance_cents"], past["status"]) == (40000, 0, ON_TRACK)
+    assert (future["daily_rate_cents"], future["projected_cents"]) == (0, 40000)
+    assert future["daily_allowance_cents"] == 60000 // 31
+
+
+def test_month_totals_from_the_local_copy_separate_fixed_bills(tmp_path):
+    store = LocalStore(str(tmp_path / "expenses.sqlite3"))
+    store.apply([
+        {"_id": 1, "date": datetime(2025, 4, 1), "category": "aluguel", "amount_cents": 180000, "recurring_rule_id": 7},
+        {"_id": 2, "date": datetime(2025, 4, 3), "category": "lazer", "amount_cents": 20000},
+        {"_id": 3, "date": datetime(2025, 4, 8), "category": "lazer", "amount_cents": 20000},
+        {"_id": 4, "date": datetime(2025, 5, 1), "category": "lazer", "amount_cents": 99999}
+    ])
+    totals = store.month_category_totals(2025, 4)
+    assert totals == {"aluguel": (180000, 180000), "lazer": (40000, 0)}
+
+    result = by_category(evaluate_budgets({"aluguel": 200000, "lazer": 100000}, totals, 2025, 4, TODAY))
+    assert result["aluguel"]["status"] == WARNING
+    assert result["lazer"]["status"] == PROJECTED_OVER
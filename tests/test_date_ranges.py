@@ -0,0 +1,79 @@
+from datetime import datetime
+
+import mongomock
+import pytest
+
+from database import ensure_indexes
+from local_store import LocalStore
+from queries import build_expense_query, get_date_range
+
+# Despesas nas bordas dos meses: o último instante de um mês não pode cair no seguinte, e a meia-noite
+# do dia 1 não pode ficar no mês anterior
+BOUNDARY_EXPENSES = [
+    {"_id": 1, "date": datetime(2024, 12, 31, 23, 59, 59, 999000), "category": "mercado", "amount_cents": 100},
+    {"_id": 2, "date": datetime(2025, 1, 1), "category": "mercado", "amount_cents": 200},
+    {"_id": 3, "date": datetime(2025, 1, 31, 23, 59, 59, 999000), "category": "lazer", "amount_cents": 400},
+    {"_id": 4, "date": datetime(2025, 2, 1), "category": "lazer", "amount_cents": 800},
+    {"_id": 5, "date": datetime(2025, 2, 28, 23, 59, 59, 999000), "category": "mercado", "amount_cents": 1600},
+    {"_id": 6, "date": datetime(2025, 3, 1), "category": "mercado", "amount_cents": 3200},
+    {"_id": 7, "date": datetime(2025, 12, 31, 23, 59, 59, 999000), "category": "lazer", "amount_cents": 6400},
+    {"_id": 8, "date": datetime(2026, 1, 1), "category": "lazer", "amount_cents": 12800},
+]
+
+MONTHS = [((2025, 1), {2, 3}), ((2025, 2), {4, 5}), ((2025, 3), {6}), ((2025, 12), {7}), ((2026, 1), {8})]
+
+
+@pytest.fixture
+def db():
+    db = mongomock.MongoClient()["test"]
+    db["expenses"].insert_many([dict(expense) for expense in BOUNDARY_EXPENSES])
+    return db
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = LocalStore(str(tmp_path / "expenses.sqlite3"))
+    store.apply([dict(expense) for expense in BOUNDARY_EXPENSES])
+    return store
+
+
+def test_date_range_is_half_open():
+    assert get_date_range(2025, 1) == (datetime(2025, 1, 1), datetime(2025, 2, 1))
+    assert get_date_range(2025, 12) == (datetime(2025, 12, 1), datetime(2026, 1, 1))
+    assert get_date_range(2025) == (datetime(2025, 1, 1), datetime(2026, 1, 1))
+
+
+@pytest.mark.parametrize("period, ids", MONTHS)
+def test_month_query_keeps_boundary_expenses_in_their_month(db, period, ids):
+    found = {expense["_id"] for expense in db["expenses"].find(build_expense_query(*period))}
+    assert found == ids
+
+
+def test_year_query_keeps_boundary_expenses_in_their_year(db):
+    found = {expense["_id"] for expense in db["expenses"].find(build_expense_query(2025))}
+    assert found == {2, 3, 4, 5, 6, 7}
+
+
+@pytest.mark.parametrize("period, ids", MONTHS)
+def test_local_totals_keep_boundary_expenses_in_their_month(store, period, ids):
+    expenses = [expense for expense in BOUNDARY_EXPENSES if expense["_id"] in ids]
+    start, end = get_date_range(*period)
+
+    assert store.expenses_total(start, end) == (sum(expense["amount_cents"] for expense in expenses), len(expenses))
+
+    by_category = {}
+    by_day = {}
+    for expense in expenses:
+        by_category[expense["category"]] = by_category.get(expense["category"], 0) + expense["amount_cents"]
+        by_day[expense["date"].day] = by_day.get(expense["date"].day, 0) + expense["amount_cents"]
+    assert store.totals_by_category(start, end) == by_category
+    assert store.totals_by_day(start, end) == by_day
+    assert store.month_category_totals(*period) == {category: (total, 0) for category, total in by_category.items()}
+
+
+def test_indexes_cover_month_queries():
+    db = mongomock.MongoClient()["test"]
+    ensure_indexes(db)
+    keys = [index["key"] for index in db["expenses"].index_information().values()]
+    assert [("date", 1)] in keys
+    assert [("date", 1), ("category", 1)] in keys
@@ -0,0 +1,68 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from forecasting import AUTO_MODEL, MODELS, MonthlySeries, backtest, fit_forecast, get_candidate_models
+
+# Quatro anos de uma categoria com efeito anual forte (ex.: IPVA em janeiro) e outra constante
+SEASON = np.array([900, 100, 100, 100, 100, 100, 100, 100, 100, 100, 100, 400], dtype=float)
+
+
+def seasonal_values(years=4):
+    return np.column_stack([np.tile(SEASON, years), np.full(12 * years, 250.0)])
+
+
+def test_series_fills_missing_months_with_zero():
+    rows = [
+        {"year": 2024, "month": 11, "category": "mercado", "total_cents": 10000},
+        {"year": 2025, "month": 1, "category": "lazer", "total_cents": 2550},
+        {"year": 2025, "month": 1, "category": "mercado", "total_cents": 5000}
+    ]
+    series = MonthlySeries.from_rollups(rows, end=datetime(2025, 3, 1))
+
+    assert series.months == [(2024, 11), (2024, 12), (2025, 1), (2025, 2)]
+    assert series.categories == ["lazer", "mercado"]
+    np.testing.assert_allclose(series.values, [[0, 100], [0, 0], [25.5, 50], [0, 0]])
+    assert series.next_months(2) == [(2025, 3), (2025, 4)]
+
+
+def test_empty_series():
+    series = MonthlySeries.from_rollups([])
+    assert series.is_empty()
+    assert series.values.shape == (0, 0)
+
+
+def test_seasonal_model_needs_two_years():
+    assert "sazonal" not in get_candidate_models(23)
+    assert "sazonal" in get_candidate_models(24)
+    assert get_candidate_models(3, "media_movel") == ["media_movel"]
+    with pytest.raises(ValueError):
+        get_candidate_models(24, "inexistente")
+
+
+def test_auto_picks_the_seasonal_model_for_a_seasonal_series():
+    fit = fit_forecast(seasonal_values(), AUTO_MODEL)
+
+    assert fit.choice[0] == "sazonal"
+    predicted = fit.predict(12)
+    assert predicted.shape == (12, 2)
+    np.testing.assert_allclose(predicted[:, 0], SEASON, rtol=0.05)
+    np.testing.assert_allclose(predicted[:, 1], 250.0, rtol=0.05)
+    assert fit.backtest_error() < 0.05
+
+
+def test_predictions_never_go_negative():
+    values = np.linspace(1000, 0, 30)[:, None]
+    for model in MODELS:
+        assert (fit_forecast(values, model).predict(6) >= 0).all()
+
+
+def test_backtest_uses_the_same_origins_for_every_model():
+    values = seasonal_values(3)
+    scores = backtest(values, list(MODELS), holdout=6)
+
+    assert set(scores) == set(MODELS)
+    assert {score["origins"] for score in scores.values()} == {6}
+    assert scores["sazonal"]["wape"] < scores["media_movel"]["wape"]
+    assert backtest(values[:5], ["sazonal"]) == {}
@@ -0,0 +1,70 @@
+import random
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from local_store import LocalStore
+
+FIELDS = ["name", "amount_cents", "date"]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalStore(str(tmp_path / "expenses.sqlite3"))
+
+
+# Despesas de março/2025 com descrições repetidas, ausentes e fora do padrão (número), e valores repetidos
+def make_expenses(count=500, seed=1):
+    rng = random.Random(seed)
+    expenses = []
+    for index in range(count):
+        expense = {
+            "_id": ObjectId(),
+            "amount_cents": rng.choice([100, 250, 999, rng.randint(1, 50000)]),
+            "date": datetime(2025, 3, rng.randint(1, 31), rng.randint(0, 23)),
+            "category": rng.choice(["alimentacao", "transporte", None]),
+        }
+        draw = rng.random()
+        if draw < 0.15:
+            pass
+        elif draw < 0.2:
+            expense["name"] = 42
+        else:
+            expense["name"] = rng.choice(["Mercado", "Uber", "Farmácia", f"Despesa {index}"])
+        expenses.append(expense)
+    return expenses
+
+
+def walk_pages(store, sort_field, descending, page_size=37):
+    seen, after = [], None
+    while True:
+        rows, after = store.find_expenses_page(
+            datetime(2025, 3, 1), datetime(2025, 4, 1), FIELDS, None, sort_field, descending, after, page_size
+        )
+        seen += [row["_id"] for row in rows]
+        if after is None:
+            return seen
+
+
+@pytest.mark.parametrize("sort_field", ["date", "amount_cents", "name"])
+@pytest.mark.parametrize("descending", [True, False])
+def test_pages_cover_every_expense_once(store, sort_field, descending):
+    expenses = make_expenses()
+    store.apply(expenses)
+
+    seen = walk_pages(store, sort_field, descending)
+
+    assert len(seen) == len(expenses)
+    assert set(seen) == {expense["_id"] for expense in expenses}
+
+
+def test_missing_names_sort_first(store):
+    expenses = make_expenses(50)
+    store.apply(expenses)
+
+    rows, _ = store.find_expenses_page(datetime(2025, 3, 1), datetime(2025, 4, 1), FIELDS, sort_field="name", descending=False)
+
+    unnamed = sum(1 for expense in expenses if not isinstance(expense.get("name"), str))
+    assert all(not isinstance(row.get("name"), str) for row in rows[:unnamed])
+    assert all(isinstance(row.get("name"), str) for row in rows[unnamed:])
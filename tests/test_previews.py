@@ -0,0 +1,44 @@
+import os
+
+from previews import PreviewCache
+
+
+def disk_keys(directory):
+    return {name[:-len(".jpg")] for name in os.listdir(directory)}
+
+
+def test_disk_copy_keeps_the_most_recently_used_files(tmp_path):
+    cache = PreviewCache(str(tmp_path), max_bytes=1024, max_disk_bytes=250)
+    for key in ("a", "b"):
+        cache.put(key, b"x" * 100)
+    # Ler "a" do disco (fora da memória) faz dele o mais recente
+    cache._items.clear()
+    cache._size = 0
+    assert cache.get("a") == b"x" * 100
+
+    cache.put("c", b"x" * 100)
+
+    assert disk_keys(tmp_path) == {"a", "c"}
+    assert cache.get("b") is None
+
+
+def test_existing_files_are_trimmed_on_start(tmp_path):
+    for index in range(5):
+        path = tmp_path / f"{index}.jpg"
+        path.write_bytes(b"x" * 100)
+        os.utime(path, (index, index))
+
+    PreviewCache(str(tmp_path), max_disk_bytes=250)
+
+    assert disk_keys(tmp_path) == {"3", "4"}
+
+
+def test_discard_frees_disk_space(tmp_path):
+    cache = PreviewCache(str(tmp_path), max_disk_bytes=250)
+    cache.put("a", b"x" * 100)
+    cache.put("b", b"x" * 100)
+    cache.discard("a")
+
+    cache.put("c", b"x" * 100)
+
+    assert disk_keys(tmp_path) == {"b", "c"}
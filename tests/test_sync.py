@@ -0,0 +1,135 @@
+import random
+from datetime import datetime, timezone
+from unittest import mock
+
+import mongomock
+import pytest
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+
+from local_store import ExpenseSync, LocalStore
+
+
+def expense(day, category, amount_cents, **fields):
+    return {"_id": ObjectId(), "date": datetime(2025, 3, day, 12), "category": category, "amount_cents": amount_cents,
+            "version": 1, "updated_at": datetime(2025, 3, day, 12), **fields}
+
+
+@pytest.fixture
+def collection():
+    return mongomock.MongoClient()["test"]["expenses"]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalStore(str(tmp_path / "expenses.sqlite3"))
+
+
+@pytest.fixture
+def changes():
+    return []
+
+
+@pytest.fixture
+def sync(collection, store, changes):
+    return ExpenseSync(collection, store, on_change=changes.append, use_change_streams=False)
+
+
+def test_copy_all_skips_attachment_data(collection, store, sync, changes):
+    collection.insert_many([expense(1, "mercado", 100, attachment_data=b"x" * 10), expense(2, "lazer", 200)])
+
+    assert sync.copy_all() == 2
+    assert store.count() == 2
+    assert all("attachment_data" not in document for document in store.find_expenses())
+    assert changes == [None]
+    assert sync.ready.is_set()
+
+
+def test_refresh_applies_updates_and_deletes(collection, store, sync):
+    kept, deleted = expense(1, "mercado", 100), expense(2, "lazer", 200)
+    collection.insert_many([kept, deleted])
+    sync.copy_all()
+
+    collection.update_one({"_id": kept["_id"]}, {"$set": {"amount_cents": 150, "date": datetime(2025, 3, 5, 12)}})
+    collection.delete_one({"_id": deleted["_id"]})
+    changed = sync.refresh([kept["_id"], deleted["_id"]])
+
+    assert changed == {(datetime(2025, 3, 1), "mercado"), (datetime(2025, 3, 5), "mercado"), (datetime(2025, 3, 2), "lazer")}
+    assert store.find_expense(kept["_id"])["amount_cents"] == 150
+    assert store.find_expense(deleted["_id"]) is None
+    assert store.month_category_totals(2025, 3) == {"mercado": (150, 0)}
+
+
+def test_catch_up_copies_recently_updated_expenses(collection, store, sync):
+    sync.copy_all()
+    new = expense(3, "mercado", 300, updated_at=datetime.now(timezone.utc).replace(tzinfo=None))
+    collection.insert_one(new)
+
+    assert sync.catch_up() == {(datetime(2025, 3, 3), "mercado")}
+    assert store.find_expense(new["_id"])["amount_cents"] == 300
+
+
+# Escritas que não gravam updated_at (scripts antigos, conflitos de versão) só aparecem na reconciliação
+def test_reconcile_finds_changes_without_updated_at(collection, store, sync):
+    changed_by_script, removed = expense(1, "mercado", 100), expense(2, "lazer", 200)
+    collection.insert_many([changed_by_script, removed])
+    sync.copy_all()
+
+    collection.update_one({"_id": changed_by_script["_id"]}, {"$set": {"amount_cents": 999}, "$inc": {"version": 1}})
+    collection.delete_one({"_id": removed["_id"]})
+
+    assert sync.catch_up() == set()
+    sync.reconcile()
+
+    assert store.find_expense(changed_by_script["_id"])["amount_cents"] == 999
+    assert store.find_expense(removed["_id"]) is None
+    assert store.month_category_totals(2025, 3) == {"mercado": (999, 0)}
+
+
+def test_watch_falls_back_to_polling_without_replica_set(collection, store):
+    sync = ExpenseSync(collection, store)
+    with mock.patch.object(mongomock.Collection, "watch", create=True, side_effect=OperationFailure("", code=40573)):
+        sync.watch()
+    assert sync.use_change_streams is False
+
+
+# Os totais mensais mantidos a cada escrita devem ser iguais aos recalculados do zero
+def test_month_totals_deltas_match_a_full_rebuild(store):
+    rng = random.Random(3)
+    documents = {}
+    for _ in range(2000):
+        operation = rng.random()
+        if operation < 0.5 or not documents:
+            document = {
+                "_id": ObjectId(),
+                "date": datetime(2025, rng.randint(1, 3), rng.randint(1, 28)),
+                "category": rng.choice(["mercado", "lazer", None]),
+                "amount_cents": rng.randint(1, 9999),
+                **({"recurring_rule_id": 1} if rng.random() < 0.2 else {})
+            }
+            documents[document["_id"]] = document
+            store.apply([document])
+        elif operation < 0.8:
+            document = dict(documents[rng.choice(list(documents))])
+            document.update(amount_cents=rng.randint(1, 9999), category=rng.choice(["mercado", "lazer", None]),
+                            date=datetime(2025, rng.randint(1, 3), 5))
+            documents[document["_id"]] = document
+            store.apply([document])
+        else:
+            expense_id = rng.choice(list(documents))
+            del documents[expense_id]
+            store.apply(deleted_ids=[expense_id])
+
+    incremental = {month: store.month_category_totals(2025, month) for month in (1, 2, 3)}
+    connection = store._connection()
+    with connection:
+        store._rebuild_month_totals(connection)
+    rebuilt = {month: store.month_category_totals(2025, month) for month in (1, 2, 3)}
+
+    assert incremental == rebuilt
+    expected = {}
+    for document in documents.values():
+        total = expected.setdefault(document["date"].month, {}).setdefault(document["category"], [0, 0])
+        total[0] += document["amount_cents"]
+        total[1] += document["amount_cents"] if "recurring_rule_id" in document else 0
+    assert incremental == {month: {category: tuple(total) for category, total in totals.items()} for month, totals in expected.items()}
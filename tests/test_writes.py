@@ -0,0 +1,52 @@
+import mongomock
+import pytest
+
+from writes import update_expenses, version_filter
+
+
+@pytest.fixture
+def collection():
+    collection = mongomock.MongoClient()["test"]["expenses"]
+    collection.insert_many([
+        {"_id": 1, "name": "mercado", "version": 3},
+        {"_id": 2, "name": "farmácia", "version": 3},
+        {"_id": 3, "name": "antiga"}
+    ])
+    return collection
+
+
+def test_all_edits_are_written(collection):
+    loaded = list(collection.find())
+    applied, stale = update_expenses(collection, [(expense, {"name": "nova"}) for expense in loaded])
+
+    assert [expense["_id"] for expense, _ in applied] == [1, 2, 3]
+    assert stale == []
+    assert [(expense["name"], expense["version"]) for expense in collection.find()] == [("nova", 4), ("nova", 4), ("nova", 1)]
+
+
+# Outra sessão editou a despesa uma vez depois da leitura: a versão no banco também é a carregada + 1,
+# mas a edição desta sessão não foi gravada
+def test_edit_by_another_session_is_reported_as_a_conflict(collection):
+    loaded = list(collection.find())
+    collection.update_one({"_id": 1}, {"$set": {"name": "other"}, "$inc": {"version": 1}})
+
+    applied, stale = update_expenses(collection, [(expense, {"name": "nova"}) for expense in loaded])
+
+    assert [expense["_id"] for expense, _ in applied] == [2, 3]
+    assert [expense["_id"] for expense in stale] == [1]
+    assert collection.find_one({"_id": 1})["name"] == "other"
+
+
+def test_deleted_expense_is_reported_as_a_conflict(collection):
+    loaded = collection.find_one({"_id": 2})
+    collection.delete_one({"_id": 2})
+
+    applied, stale = update_expenses(collection, [(loaded, {"name": "nova"})])
+
+    assert applied == []
+    assert stale == [loaded]
+
+
+def test_version_filter_treats_missing_version_as_zero(collection):
+    assert [expense["_id"] for expense in collection.find(version_filter(None))] == [3]
+    assert [expense["_id"] for expense in collection.find(version_filter(3))] == [1, 2]
@@ -0,0 +1,208 @@
+import argparse
+import glob
+import json
+import os
+import shutil
+import threading
+from datetime import datetime
+
+import duckdb
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from categories import RENT_CATEGORY, category_label
+from local_store import DATE_TEXT_FORMAT, DEFAULT_LOCAL_STORE_PATH, LocalStore
+from money import format_brl
+
+# Snapshot colunar das despesas para os relatórios de vários anos: um arquivo Parquet por mês
+# (year=AAAA/month=M/data.parquet), consultado com SQL pelo DuckDB. Só os meses alterados são
+# regravados, e cada consulta lê apenas as colunas e partições de que precisa.
+DEFAULT_WAREHOUSE_PATH = os.path.join(".cache", "analytics")
+MANIFEST_FILE = "manifest.json"
+DEFAULT_PEAKS = 10
+
+COLUMNS = ["id", "date", "category", "name", "amount_cents", "is_paid"]
+SCHEMA = pa.schema([
+    ("id", pa.string()),
+    ("date", pa.timestamp("us")),
+    ("category", pa.string()),
+    ("name", pa.string()),
+    ("amount_cents", pa.int64()),
+    ("is_paid", pa.bool_()),
+])
+
+class Warehouse:
+    def __init__(self, path=DEFAULT_WAREHOUSE_PATH):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        # Escritas e consultas não se cruzam: uma consulta nunca lê um mês pela metade
+        self._lock = threading.Lock()
+        self._connection = duckdb.connect()
+        # None: comparar todos os meses com a cópia local na próxima atualização (início ou cópia refeita)
+        self._pending = None
+
+    # Registra os meses (ano, mês) alterados; são regravados na próxima atualização
+    def mark_changed(self, months):
+        with self._lock:
+            if self._pending is not None:
+                self._pending |= {(int(year), int(month)) for year, month in months}
+
+    def mark_all(self):
+        with self._lock:
+            self._pending = None
+
+    def _load_manifest(self):
+        try:
+            with open(os.path.join(self.path, MANIFEST_FILE), encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self, manifest):
+        path = os.path.join(self.path, MANIFEST_FILE)
+        with open(path + ".tmp", "w", encoding="utf-8") as file:
+            json.dump(manifest, file)
+        os.replace(path + ".tmp", path)
+
+    def _month_directory(self, year, month):
+        return os.path.join(self.path, f"year={year}", f"month={month}")
+
+    # Grava o arquivo de um mês a partir da cópia local (ou o remove, se o mês ficou sem despesas)
+    def _write_month(self, store, year, month):
+        directory = self._month_directory(year, month)
+        end = datetime(year + month // 12, month % 12 + 1, 1)
+        rows = store.find_rows(datetime(year, month, 1), end)
+        if not rows:
+            shutil.rmtree(directory, ignore_errors=True)
+            return
+        df = pd.DataFrame(rows, columns=COLUMNS)
+        df["date"] = pd.to_datetime(df["date"], format=DATE_TEXT_FORMAT)
+        df["is_paid"] = df["is_paid"].astype(bool)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, "data.parquet")
+        pq.write_table(pa.Table.from_pandas(df, schema=SCHEMA, preserve_index=False), path + ".tmp")
+        os.replace(path + ".tmp", path)
+
+    # Atualiza o snapshot com a cópia local: só os meses marcados ou, sem marcação, os meses cuja
+    # assinatura (quantidade, soma, versões, updated_at) mudou desde a última gravação
+    def refresh(self, store):
+        with self._lock:
+            manifest = self._load_manifest()
+            if self._pending is None:
+                signatures = store.month_signatures()
+                months = {month for month in set(signatures) | set(manifest) if signatures.get(month) != manifest.get(month)}
+            else:
+                signatures = store.month_signatures(self._pending)
+                months = {f"{year:04d}-{month:02d}" for year, month in self._pending}
+            if months:
+                for month in sorted(months):
+                    self._write_month(store, int(month[:4]), int(month[5:7]))
+                    if month in signatures:
+                        manifest[month] = signatures[month]
+                    else:
+                        manifest.pop(month, None)
+                self._save_manifest(manifest)
+            self._pending = set()
+            return len(months)
+
+    # Executa uma consulta sobre o snapshot; `{expenses}` no SQL é a leitura de todos os arquivos mensais
+    def _query(self, sql, params=(), columns=()):
+        with self._lock:
+            source = os.path.join(self.path, "year=*", "month=*", "data.parquet")
+            if not glob.glob(source):
+                return pd.DataFrame(columns=list(columns))
+            source = source.replace("'", "''")
+            sql = sql.format(expenses=f"read_parquet('{source}', hive_partitioning = true)")
+            return self._connection.cursor().execute(sql, list(params)).df()
+
+    # Total por ano e mês, de todos os anos
+    def monthly_totals(self):
+        return self._query(
+            "SELECT year, month, SUM(amount_cents)::BIGINT AS total_cents FROM {expenses} GROUP BY year, month ORDER BY year, month",
+            columns=["year", "month", "total_cents"]
+        )
+
+    # Total de cada mês do ano ao lado do mesmo mês do ano anterior, com a variação em %
+    def year_over_year(self, year):
+        return self._query(
+            """
+            WITH monthly AS (
+                SELECT year, month, SUM(amount_cents)::BIGINT AS total_cents FROM {expenses}
+                WHERE year IN (?, ?) GROUP BY year, month
+            ), paired AS (
+                SELECT month,
+                       COALESCE(SUM(total_cents) FILTER (WHERE year = ?), 0)::BIGINT AS total_cents,
+                       COALESCE(SUM(total_cents) FILTER (WHERE year = ?), 0)::BIGINT AS previous_cents
+                FROM monthly GROUP BY month
+            )
+            SELECT month, total_cents, previous_cents,
+                   (total_cents - previous_cents) * 100.0 / NULLIF(previous_cents, 0) AS change_pct
+            FROM paired ORDER BY month
+            """,
+            [year, year - 1, year, year - 1],
+            ["month", "total_cents", "previous_cents", "change_pct"]
+        )
+
+    # Total de cada categoria por ano, com o total do ano anterior e a variação em % (tendência por categoria)
+    def category_totals(self):
+        return self._query(
+            """
+            WITH yearly AS (
+                SELECT year, category, SUM(amount_cents)::BIGINT AS total_cents FROM {expenses} GROUP BY year, category
+            )
+            SELECT this_year.year, this_year.category, this_year.total_cents,
+                   COALESCE(previous.total_cents, 0) AS previous_cents,
+                   (this_year.total_cents - previous.total_cents) * 100.0 / NULLIF(previous.total_cents, 0) AS change_pct
+            FROM yearly AS this_year
+            LEFT JOIN yearly AS previous
+                ON previous.category IS NOT DISTINCT FROM this_year.category AND previous.year = this_year.year - 1
+            ORDER BY this_year.year, this_year.total_cents DESC
+            """,
+            columns=["year", "category", "total_cents", "previous_cents", "change_pct"]
+        )
+
+    # Dias com maior total gasto (sem uma categoria, ex.: aluguel) e a categoria da maior despesa de cada dia
+    def daily_peaks(self, limit=DEFAULT_PEAKS, exclude=RENT_CATEGORY):
+        return self._query(
+            """
+            SELECT date_trunc('day', date) AS day, SUM(amount_cents)::BIGINT AS total_cents,
+                   arg_max(category, amount_cents) AS top_category
+            FROM {expenses} WHERE category IS DISTINCT FROM ?
+            GROUP BY day ORDER BY total_cents DESC, day DESC LIMIT ?
+            """,
+            [exclude, limit],
+            ["day", "total_cents", "top_category"]
+        )
+
+# Uso: python warehouse.py build [--path .cache/analytics] [--store .cache/expenses.sqlite3]
+#      python warehouse.py report --year 2024 [--path .cache/analytics]
+def main():
+    parser = argparse.ArgumentParser(description="Snapshot colunar (Parquet + DuckDB) para os relatórios de vários anos")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="Atualiza o snapshot a partir da cópia local das despesas")
+    build_parser.add_argument("--path", default=DEFAULT_WAREHOUSE_PATH)
+    build_parser.add_argument("--store", default=DEFAULT_LOCAL_STORE_PATH, help="Cópia local (python local_store.py sync)")
+    report_parser = subparsers.add_parser("report", help="Comparação com o ano anterior e tendência por categoria")
+    report_parser.add_argument("--path", default=DEFAULT_WAREHOUSE_PATH)
+    report_parser.add_argument("--year", type=int, default=datetime.today().year)
+    args = parser.parse_args()
+
+    warehouse = Warehouse(args.path)
+    if args.command == "build":
+        print(f"{warehouse.refresh(LocalStore(args.store))} meses gravados em {args.path}.")
+        return
+
+    for row in warehouse.year_over_year(args.year).itertuples():
+        change = "-" if pd.isna(row.change_pct) else f"{row.change_pct:+.1f}%"
+        print(f"{row.month:02d}/{args.year}  {format_brl(row.total_cents):>14}  {args.year - 1}: {format_brl(row.previous_cents):>14}  {change}")
+    categories = warehouse.category_totals()
+    for row in categories[categories["year"] == args.year].itertuples():
+        change = "-" if pd.isna(row.change_pct) else f"{row.change_pct:+.1f}%"
+        print(f"{category_label(row.category):<15} {format_brl(row.total_cents):>14}  {args.year - 1}: {format_brl(row.previous_cents):>14}  {change}")
+    for row in warehouse.daily_peaks().itertuples():
+        print(f"{row.day:%d/%m/%Y}  {format_brl(row.total_cents):>14}  (maior despesa: {category_label(row.top_category)})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+import uuid
+
+from pymongo import UpdateOne
+
+# Gravações em lote com concorrência otimista, sem dependência do Streamlit (usadas pelo app.py)
+
+# Filtro de concorrência otimista: despesas antigas, sem o campo version, equivalem à versão 0
+def version_filter(version):
+    version = int(version or 0)
+    return {"version": {"$in": [None, 0]}} if version == 0 else {"version": version}
+
+# Função para gravar várias edições em um único bulk_write. Recebe pares (despesa como foi carregada,
+# campos alterados) e devolve (gravadas, alteradas por outra sessão desde a leitura, que não foram gravadas).
+# Cada gravação leva um token próprio em last_write: a versão sozinha não mostra quem gravou, já que uma
+# edição de outra sessão também deixa a despesa na versão carregada + 1.
+def update_expenses(collection, updates):
+    if not updates:
+        return [], []
+    token = uuid.uuid4().hex
+    operations = [
+        UpdateOne(
+            {"_id": expense["_id"], **version_filter(expense.get("version"))},
+            {"$set": {**changes, "last_write": token}, "$inc": {"version": 1}, "$currentDate": {"updated_at": True}}
+        )
+        for expense, changes in updates
+    ]
+    result = collection.bulk_write(operations, ordered=False)
+    if result.matched_count == len(updates):
+        return updates, []
+
+    # Só nos conflitos: uma consulta a mais descobre quais despesas receberam esta gravação
+    ids = [expense["_id"] for expense, _ in updates]
+    written = {expense["_id"] for expense in collection.find({"_id": {"$in": ids}, "last_write": token}, {"_id": 1})}
+    applied = [(expense, changes) for expense, changes in updates if expense["_id"] in written]
+    stale = [expense for expense, _ in updates if expense["_id"] not in written]
+    return applied, stale